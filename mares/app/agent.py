@@ -12,15 +12,95 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os
 import json
-from typing import Dict, Any, AsyncGenerator
+import logging
+import os
+from collections.abc import AsyncGenerator
+from typing import Any
+
 import google.auth
-from google.adk.agents import LlmAgent, SequentialAgent, BaseAgent, LoopAgent
+from google.adk.agents import (
+    BaseAgent,
+    LlmAgent,
+    ParallelAgent,
+    SequentialAgent,
+)
 from google.adk.agents.invocation_context import InvocationContext
-from google.adk.events import Event, EventActions
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.events import Event
+
+from .config import config, pipeline_config
 from .google_docs_connector import google_docs_toolset
 from .google_drive_connector import google_drive_toolset
+from .llm import generate_text, pipeline_model, stage_model_callbacks
+from .stages import (
+    WARM_START_OFFER_KEY,
+    BriefCompactionAgent,
+    BriefReuseAgent,
+    DuplicateCollapseAgent,
+    EpicPartitionAgent,
+    EstimationReuseAgent,
+    FindingsMergeAgent,
+    IncrementalDevelopmentAgent,
+    MapReduceAnalysisAgent,
+    MapReduceDecompositionAgent,
+    OutputRepairAgent,
+    ReportAssemblerAgent,
+    ShardedEstimationAgent,
+    SpeculativeDevelopmentAgent,
+    StoryMergeAgent,
+    StreamingEstimationAgent,
+    accepts_warm_start,
+    add_agent_callbacks,
+    analysis_digest,
+    await_warm_start_answer,
+    changed_sections,
+    finding_key,
+    prompt_budget,
+    readiness_precheck,
+    record_brief,
+    record_estimations,
+    require_analysis_complete,
+    skip_passed_dimension,
+    skip_reused_analysis,
+    skip_unassigned_slice,
+    slice_key,
+    slice_output_key,
+    start_pipeline_deadline,
+    start_stage_deadline,
+    state_event,
+    stories_to_estimate,
+    user_text,
+    validated_digest,
+)
+from .utils.checkpoints import SESSION_SCOPE_KEY, CheckpointStore, session_scope
+from .utils.digest import build_digest, count_tokens, fill_prompt
+from .utils.readiness import (
+    DOR_DIMENSIONS,
+    ReadinessDimension,
+    render_checklist,
+    weak_dimensions,
+)
+from .utils.refinement import (
+    NOTHING_MISSING,
+    apply_refinements,
+    elements_key,
+    parse_form_answers,
+    pending_elements,
+    render_refinement_form,
+)
+from .utils.report import estimation_metrics
+from .utils.speculation import speculator
+from .utils.stories import (
+    collapse_duplicates,
+    compact_stories,
+    load_estimations,
+    load_story_artifacts,
+    render_duplicates,
+    render_estimations,
+    render_story_artifacts,
+)
+from .utils.typing import EpicPlan, Estimations, StoryArtifacts
 
 _, project_id = google.auth.default()
 os.environ.setdefault("GOOGLE_CLOUD_PROJECT", project_id)
@@ -34,13 +114,15 @@ class AnalystValidationAgent(BaseAgent):
     and processes the validation result.
     """
 
-    def __init__(self):
+    def __init__(self) -> None:
         super().__init__(
             name="AnalystValidator",
-            description="Validates analyst output and determines if brief is complete"
+            description="Validates analyst output and determines if brief is complete",
         )
 
-    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
         """Check if analyst marked the brief as complete."""
         # Get the analyst's response from state
         analyst_response = ctx.session.state.get("analyst_output", "{}")
@@ -50,165 +132,372 @@ class AnalystValidationAgent(BaseAgent):
             status = response_data.get("status", "ERROR")
 
             if status == "COMPLETE":
-                # Save the validated brief to state
-                validated_brief = response_data.get("validated_brief", "")
-                ctx.session.state["validated_brief"] = validated_brief
-                ctx.session.state["analysis_complete"] = True
-
-                # Escalate to exit the loop
-                yield Event(
-                    author=self.name,
-                    content=f"✅ Brief validation complete",
-                    actions=EventActions(escalate=True)
+                # Save the validated brief to state and escalate to exit the loop
+                yield state_event(
+                    self,
+                    ctx,
+                    {
+                        "validated_brief": response_data.get("validated_brief", ""),
+                        "analysis_complete": True,
+                    },
+                    "✅ Brief validation complete",
+                    escalate=True,
                 )
             elif status == "INCOMPLETE":
                 # Extract questions and save to state for user interaction
                 questions = response_data.get("questions", [])
-                ctx.session.state["pending_questions"] = questions
-                ctx.session.state["analysis_complete"] = False
-
-                yield Event(
-                    author=self.name,
-                    content=f"❗ Additional information needed: {len(questions)} questions"
+                yield state_event(
+                    self,
+                    ctx,
+                    {"pending_questions": questions, "analysis_complete": False},
+                    f"❗ Additional information needed: {len(questions)} questions",
                 )
             else:
-                yield Event(
-                    author=self.name,
-                    content=f"❌ Error in analyst response: {response_data.get('error', 'Unknown error')}"
+                yield state_event(
+                    self,
+                    ctx,
+                    {},
+                    f"❌ Error in analyst response: {response_data.get('error', 'Unknown error')}",
                 )
         except json.JSONDecodeError as e:
-            yield Event(
-                author=self.name,
-                content=f"❌ Failed to parse analyst response: {str(e)}"
+            yield state_event(
+                self, ctx, {}, f"❌ Failed to parse analyst response: {e!s}"
             )
 
 
+# Appended to the BusinessAnalyst prompts when only the sections that differ
+# from a brief validated before are checked.
+CHANGED_SECTIONS_NOTE = """
+    Only the sections below differ from a brief that was validated before; the
+    other sections of the brief meet the checklist. Only list the elements missing
+    from these sections.
+    """
+
+
+def analysis_prompt(instruction: str, state: Any, **values: Any) -> str:
+    """A BusinessAnalyst prompt on the sections of `project_brief` still to
+    check."""
+    if changed_sections(state) is not None:
+        instruction += CHANGED_SECTIONS_NOTE
+    return fill_prompt(
+        instruction,
+        analysis_digest(state),
+        prompt_budget("BusinessAnalyst"),
+        **values,
+    )
+
+
 # Define the three main agents using LlmAgent
-def create_analyst_agent():
+def create_analyst_agent() -> LlmAgent:
     """Create the Business Analyst agent."""
-    instruction = """
-    You are an expert, skeptical Senior Business Analyst with 15+ years of experience 
-    in requirements gathering and validation. Your role is to ensure project briefs are 
+    instruction = (
+        """
+    You are an expert, skeptical Senior Business Analyst with 15+ years of experience
+    in requirements gathering and validation. Your role is to ensure project briefs are
     complete and unambiguous before they proceed to development.
 
-    You task is to look through the supplied brief by the user and validate if it meets all the criteria as stated 
+    You task is to look through the supplied brief by the user and validate if it meets all the criteria as stated
 
     <DEFINITION OF READY CHECKLIST>
-    1. Goal & Metrics: Clear business objectives and measurable success criteria
-    2. Users/Actors: Well-defined user roles and stakeholders
-    3. Scope: Clear boundaries of what's included and excluded
-    4. Functional Requirements: Detailed features and capabilities
-    5. Data Requirements: Data sources, formats, and storage needs
-    6. Non-Functional Requirements:
-       - Security: Authentication, authorization, data protection
-       - Performance: Response times, throughput, scalability
-       - Usability: User experience requirements
-       - Compliance: Regulatory or policy requirements
+{checklist}
     </DEFINITION OF READY CHECKLIST>
 
     TASK:
     Analyze the provided project brief against the Definition of Ready checklist.
-    The brief is in {project_brief} 
+    The brief is given below as a digest, one [section-id] block per section.
+
+    PROJECT BRIEF:
+    {brief}
 
-    When you have gathered all the missing elements of the brief, you summarize you findings towards the user
-    and then hand back over to the coordinator to dispatch to the next agent.
+    OUTPUT FORMAT:
+    List every missing element of the brief as one bullet point ("- ..."), most important first.
+    If the brief meets all the criteria, reply with exactly: """
+        + NOTHING_MISSING
+        + """
     """
+    )
+
+    def provide_instruction(context: ReadonlyContext) -> str:
+        # The brief is re-validated every refinement round, send it compacted.
+        dimensions = list(DOR_DIMENSIONS)
+        if pipeline_config.dor_precheck and context.state.get("dor_scores"):
+            # Areas that passed the local pre-check are not checked again
+            dimensions = (
+                weak_dimensions(
+                    context.state["dor_scores"], pipeline_config.dor_pass_threshold
+                )
+                or dimensions
+            )
+        return analysis_prompt(
+            instruction, context.state, checklist=render_checklist(dimensions)
+        )
 
     return LlmAgent(
         name="BusinessAnalyst",
-        model="gemini-2.5-pro",
-        instruction=instruction,
+        model=pipeline_model(config.critic_model),
+        instruction=provide_instruction,
         description="Analyzes project briefs and identifies ambiguities",
         # Saves output to state['missing_elements']
-        output_key="missing_elements"
+        output_key="missing_elements",
+        before_agent_callback=(
+            [readiness_precheck] if pipeline_config.dor_precheck else None
+        ),
+        **stage_model_callbacks(),
     )
 
 
-def create_refinement_agent():
-    """Create the Brief Refinement agent."""
-    instruction = """
-    You are an expert, skeptical, but friendly product owner. Your task is to look at the first point of the 
-    {missing_elements} and ask the user for refinement input. DO NOT apply refinements themselves, it is something 
-    that the user should input. DO NOT ask which point to tackle first, just start with what is at the top of the list.
+def create_dimension_analyst_agent(dimension: ReadinessDimension) -> LlmAgent:
+    """Create the Business Analyst worker for one Definition-of-Ready area."""
+    instruction = (
+        """
+    You are an expert, skeptical Senior Business Analyst. Your role is to ensure
+    project briefs are complete and unambiguous before they proceed to development.
+    You only check one area of the Definition of Ready; colleagues check the others.
 
-    IF that is done correctly, you update the {project_brief} with the refinement that was inputted buy the user and update the {missing_elements} 
-    list, by taking off the point you covered. Then you revert the user back to the create_refinement_validator_agent agent.
+    <DEFINITION OF READY AREA>
+{checklist}
+    </DEFINITION OF READY AREA>
+
+    TASK:
+    Analyze the provided project brief against this area only.
+    The brief is given below as a digest, one [section-id] block per section.
+
+    PROJECT BRIEF:
+    {brief}
+
+    OUTPUT FORMAT:
+    List every missing element of the brief for this area as one bullet point ("- ..."),
+    most important first.
+    If the brief meets the criteria of this area, reply with exactly: """
+        + NOTHING_MISSING
+        + """
     """
+    )
+
+    def provide_instruction(context: ReadonlyContext) -> str:
+        return analysis_prompt(
+            instruction, context.state, checklist=render_checklist([dimension])
+        )
 
     return LlmAgent(
-        name="RefinementAgent",
-        model="gemini-2.5-pro",
-        instruction=instruction,
-        description="Gathers additional information to update the brief.",
-        output_key="analyst_output"  # Saves output to state['analyst_output']
+        name=f"BusinessAnalyst_{dimension.id}",
+        model=pipeline_model(config.worker_model),
+        instruction=provide_instruction,
+        description=f"Checks the {dimension.id} area of the Definition of Ready",
+        output_key=finding_key(dimension.id),
+        disallow_transfer_to_parent=True,
+        disallow_transfer_to_peers=True,
+        before_agent_callback=(
+            skip_passed_dimension(dimension.id)
+            if pipeline_config.dor_precheck
+            else None
+        ),
+        **stage_model_callbacks(),
     )
 
 
-refinement = create_refinement_agent()
+def create_parallel_analyst_agent() -> SequentialAgent:
+    """
+    Create the parallel Business Analyst stage.
 
+    Every Definition-of-Ready area is checked by its own worker on the fast
+    model, and the findings are merged locally into `missing_elements`.
+    """
+    return SequentialAgent(
+        name="BusinessAnalyst",
+        description="Analyzes project briefs and identifies ambiguities",
+        sub_agents=[
+            ParallelAgent(
+                name="DimensionAnalysts",
+                description="Business Analyst workers, one per checklist area",
+                sub_agents=[
+                    create_dimension_analyst_agent(dimension)
+                    for dimension in DOR_DIMENSIONS
+                ],
+            ),
+            FindingsMergeAgent(
+                name="FindingsMerger",
+                description="Merges the per-area findings into the missing elements",
+                dimensions=[dimension.id for dimension in DOR_DIMENSIONS],
+            ),
+        ],
+        before_agent_callback=(
+            [readiness_precheck] if pipeline_config.dor_precheck else None
+        ),
+    )
 
-def create_refinement_validator_agent():
-    """Create the Brief Refinement validator agent."""
-    instruction = """
-    You are an expert product owner. Your task is to look that the {missing_elements} to see if there is still 
-    anything on there. 
 
-    IF there are still elements on the {missing_elements} list you say "Next point" and revert the user to the refinement dub-agent.
+REFINEMENT_INSTRUCTION = """
+    You are an expert, skeptical, but friendly product owner. Your task is to look at the first point of the
+    missing elements below and ask the user for refinement input. DO NOT apply refinements themselves, it is something
+    that the user should input. DO NOT ask which point to tackle first, just start with what is at the top of the list.
+
+    The answer of the user is added to the project brief below and the brief is validated again
+    automatically, so only ask the question.
+
+    MISSING ELEMENTS:
+    {missing}
 
-    IF all point have been covered, you revert the user back to the coordinator to dispatch to the next agent.
+    PROJECT BRIEF (digest):
+    {brief}
     """
 
-    return LlmAgent(
-        name="RefinementsValidationAgent",
-        model="gemini-2.5-flash",
-        instruction=instruction,
-        description="Checks if all missing elements have been dealt with.",
-        sub_agents=[refinement],
-        output_key="analyst_output"  # Saves output to state['analyst_output']
+
+def refinement_prompt(project_brief: str, missing: Any) -> str:
+    """The RefinementAgent instruction for a brief and its missing elements."""
+    return fill_prompt(
+        REFINEMENT_INSTRUCTION,
+        build_digest(project_brief),
+        prompt_budget("RefinementAgent"),
+        missing=missing,
     )
 
 
-# def create_refinement_loop_agent():
-#     return LoopAgent(
-#         name="RefinementLoop",
-#         # Agent order is crucial: Critique first, then Refine/Exit
-#         sub_agents=[refinement],
-#         max_iterations=10  # Limit loops
-#     )
+def create_refinement_agent() -> LlmAgent:
+    """Create the Brief Refinement agent."""
 
+    def provide_instruction(context: ReadonlyContext) -> str:
+        return refinement_prompt(
+            str(context.state.get("project_brief", "")),
+            context.state.get("missing_elements", ""),
+        )
 
-def create_scripter_agent():
-    """Create the Product Owner/Scripter agent."""
-    instruction = """You are an expert Agile Product Owner with extensive experience in 
-    decomposing business requirements into actionable development artifacts.
+    return LlmAgent(
+        name="RefinementAgent",
+        model=pipeline_model(config.critic_model),
+        instruction=provide_instruction,
+        description="Gathers additional information to update the brief.",
+        # Routing back to the validator is deterministic
+        disallow_transfer_to_parent=True,
+        disallow_transfer_to_peers=True,
+        output_key="analyst_output",  # Saves output to state['analyst_output']
+        **stage_model_callbacks(cached=False),
+    )
 
-    TASK:
-    Take the validated requirements brief from {validated_brief} and generate comprehensive 
-    development artifacts that will guide the implementation team.
 
-    OUTPUT FORMAT:
-    Generate clean Markdown output with the following sections:
+class RefinementsValidationAgent(BaseAgent):
+    """
+    Custom agent that checks if all missing elements have been dealt with,
+    and hands over to the refinement agent when they have not.
 
-    ## Actors
-    List all user roles and system actors identified in the requirements.
+    In batched mode, all missing elements are asked at once in a single form
+    instead of one question per turn by the refinement agent.
 
-    ## Use Cases
-    For each actor, define their high-level goals and interactions with the system.
+    With prefetching, the question on the next missing element is drafted in
+    the background while the user answers the current one. The draft is
+    served on the next turn if the answer only resolved the current element,
+    and dropped if it changed the rest of the list or a new brief was
+    submitted.
+    """
 
-    ## User Stories
-    Create detailed user stories following this format:
-    **As a** [ROLE], **I want** [ACTION], **so that** [BENEFIT]
+    batched: bool = False
+    prefetch: bool = False
+    speculative_stage: SpeculativeDevelopmentAgent | None = None
+    """Started in the background when few elements are left to refine."""
+
+    @staticmethod
+    def _draft_key(ctx: InvocationContext, elements: list[str]) -> str:
+        """Identifies a question on `elements` of the submitted brief, so that
+        a new brief with the same gaps is asked its own question."""
+        brief = str(ctx.session.state.get("submitted_brief", ""))
+        return f"{brief}\n{elements_key(elements)}"
+
+    def _prefetch(self, ctx: InvocationContext, upcoming: list[str]) -> None:
+        """Drafts the question on the first of the `upcoming` elements."""
+        project_brief = str(ctx.session.state.get("project_brief", ""))
+        instruction = refinement_prompt(
+            project_brief, "\n".join(f"- {item}" for item in upcoming)
+        )
+        speculator.start(
+            f"{session_scope(ctx.session)}/question",
+            self._draft_key(ctx, upcoming),
+            lambda: generate_text(config.critic_model, instruction, "RefinementAgent"),
+        )
 
-    Number each story (e.g., US-001, US-002) for easy reference.
+    async def _take_draft(self, ctx: InvocationContext, pending: list[str]) -> str:
+        """The question drafted for `pending`, or "" when there is none or the
+        brief or the list changed since it was drafted."""
+        speculation = speculator.take(f"{session_scope(ctx.session)}/question")
+        if speculation is None:
+            return ""
+        if speculation.key != self._draft_key(ctx, pending):
+            speculation.task.cancel()
+            logging.info("Brief or missing elements changed, dropped the draft")
+            return ""
+        try:
+            return (await speculation.task).strip()
+        except Exception as e:
+            logging.warning(f"Drafting the refinement question failed: {e!r}")
+            return ""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Route to the refinement agent while elements are missing."""
+        pending = pending_elements(ctx.session.state.get("missing_elements"))
+        if (
+            pending
+            and self.speculative_stage is not None
+            and len(pending) <= pipeline_config.speculation_pending
+        ):
+            # Write the stories while the user answers the last questions
+            self.speculative_stage.speculate(ctx)
+        if not pending:
+            status = {
+                "status": "COMPLETE",
+                "validated_brief": ctx.session.state.get("project_brief", ""),
+            }
+            yield state_event(self, ctx, {"analyst_output": json.dumps(status)})
+            return
+
+        status = {"status": "INCOMPLETE", "questions": pending}
+        state_delta = {
+            "analyst_output": json.dumps(status),
+            "refinement_batched": self.batched,
+        }
+        if self.batched:
+            yield state_event(self, ctx, state_delta, render_refinement_form(pending))
+            return
+
+        refinement_agent = self.sub_agents[0]
+        yield state_event(self, ctx, {}, transfer_to_agent=refinement_agent.name)
+        draft = await self._take_draft(ctx, pending) if self.prefetch else ""
+        if draft:
+            yield state_event(refinement_agent, ctx, {}, draft)
+        else:
+            async for event in refinement_agent.run_async(ctx):
+                yield event
+        if self.prefetch and len(pending) > 1:
+            # Ask the next question while the user answers this one
+            self._prefetch(ctx, pending[1:])
+        yield state_event(self, ctx, state_delta)
+
+
+def create_refinement_validator_agent() -> RefinementsValidationAgent:
+    """Create the Brief Refinement validator agent."""
+    return RefinementsValidationAgent(
+        name="RefinementsValidationAgent",
+        description="Checks if all missing elements have been dealt with.",
+        sub_agents=[create_refinement_agent()],
+        batched=pipeline_config.batched_refinement,
+        prefetch=pipeline_config.question_prefetch,
+    )
 
-    ## Acceptance Criteria
-    For each user story, write acceptance criteria in Gherkin syntax:
 
-    **GIVEN** [initial context]
-    **WHEN** [action or event]
-    **THEN** [expected outcome]
+# Output fields and guidelines shared by all ProductOwner prompts.
+STORY_OUTPUT_FORMAT = """    OUTPUT FORMAT:
+    Return the following fields:
 
-    Include multiple scenarios where appropriate to cover edge cases.
+    - actors: all user roles and system actors identified in the requirements.
+    - use_cases: for each actor, their high-level goals and interactions with the system.
+    - stories: detailed user stories following the format
+      "As a [role], I want [action], so that [benefit]".
+      Number each story (e.g., US-001, US-002) in its id for easy reference.
+      For each story, write acceptance_criteria in Gherkin syntax:
+      GIVEN [initial context], WHEN [action or event], THEN [expected outcome].
+      Include multiple scenarios where appropriate to cover edge cases.
+      List in sections the ids of the brief sections ([section-id]) the story is
+      derived from.
 
     GUIDELINES:
     - Be comprehensive but concise
@@ -217,27 +506,225 @@ def create_scripter_agent():
     - Focus on testable, measurable criteria
     - Consider both happy path and edge cases"""
 
+
+# Prompt of the single-pass ProductOwner, and of the speculative one.
+PRODUCT_OWNER_INSTRUCTION = (
+    """You are an expert Agile Product Owner with extensive experience in
+    decomposing business requirements into actionable development artifacts.
+
+    TASK:
+    Take the validated requirements brief below and generate comprehensive development
+    artifacts that will guide the implementation team. The brief is given as a digest,
+    one [section-id] block per section.
+
+    VALIDATED BRIEF:
+    {brief}
+
+"""
+    + STORY_OUTPUT_FORMAT
+)
+
+
+def create_scripter_agent(
+    name: str = "ProductOwner",
+    output_key: str = "stories_and_criteria",
+    scope_key: str | None = None,
+) -> LlmAgent:
+    """Create the Product Owner/Scripter agent.
+
+    When ``scope_key`` is given, the agent only covers the epics listed in
+    that state key, so that several workers can decompose one brief in
+    parallel.
+    """
+    instruction = PRODUCT_OWNER_INSTRUCTION
+
+    if scope_key:
+        instruction += """
+
+    SCOPE:
+    You are one of several Product Owners decomposing this brief in parallel.
+    Only cover the epics listed below; the other epics are handled by your colleagues.
+    Number your stories from US-001, they are renumbered when the results are merged.
+
+    {scope}"""
+
+    def provide_instruction(context: ReadonlyContext) -> str:
+        return fill_prompt(
+            instruction,
+            validated_digest(context.state),
+            prompt_budget("ProductOwner"),
+            scope=context.state.get(scope_key, "") if scope_key else "",
+        )
+
     return LlmAgent(
-        name="ProductOwner",
-        model="gemini-2.5-pro",
-        instruction=instruction,
+        name=name,
+        model=pipeline_model(config.critic_model),
+        instruction=provide_instruction,
         description="Generates user stories and acceptance criteria from validated requirements",
-        # Saves output to state['stories_and_criteria']
-        output_key="stories_and_criteria"
+        output_schema=StoryArtifacts,
+        # Saves output to state[output_key], 'stories_and_criteria' by default
+        output_key=output_key,
+        **stage_model_callbacks(),
     )
 
 
-def create_estimator_agent():
-    """Create the Agile Coach/Estimator agent."""
-    instruction = """You are an expert Agile Coach specializing in relative estimation 
-    and Story Point assessment. You have facilitated hundreds of estimation 
-    sessions and understand the nuances of complexity assessment.
+def create_epic_planner_agent() -> LlmAgent:
+    """Create the agent that splits the validated brief into actors/epics."""
+    instruction = """You are an expert Agile Product Owner. Split the validated
+    requirements brief below into epics: cohesive groups of functionality, each
+    owned by one or a few actors, that can be decomposed into user stories
+    independently of each other.
+
+    Every requirement of the brief must belong to exactly one epic. Keep the
+    summaries short but specific enough to tell which requirements belong to
+    the epic.
+
+    Validated brief (digest, one [section-id] block per section):
+    {brief}"""
+
+    def provide_instruction(context: ReadonlyContext) -> str:
+        return fill_prompt(
+            instruction, validated_digest(context.state), prompt_budget("EpicPlanner")
+        )
+
+    return LlmAgent(
+        name="EpicPlanner",
+        model=pipeline_model(config.worker_model),
+        instruction=provide_instruction,
+        description="Splits the validated brief into actors/epics",
+        output_schema=EpicPlan,
+        output_key="epic_plan",  # Saves output to state['epic_plan']
+        **stage_model_callbacks(),
+    )
+
+
+def create_product_owner_fan_out_agent() -> SequentialAgent:
+    """
+    Create the parallel ProductOwner stage.
+
+    The brief is split into epics, the epics are distributed over a bounded
+    number of ProductOwner workers running in a ParallelAgent, and the worker
+    outputs are merged locally into a single `stories_and_criteria`.
+    """
+    workers = pipeline_config.product_owner_workers
+    product_owners: list[BaseAgent] = []
+    for slot in range(workers):
+        worker = create_scripter_agent(
+            name=f"ProductOwnerWorker{slot}",
+            output_key=slice_output_key(slot),
+            scope_key=slice_key(slot),
+        )
+        worker.before_agent_callback = skip_unassigned_slice(slot)
+        product_owners.append(worker)
+
+    return SequentialAgent(
+        name="ProductOwnerFanOut",
+        description="Generates user stories per epic in parallel and merges them",
+        sub_agents=[
+            create_epic_planner_agent(),
+            EpicPartitionAgent(
+                name="EpicPartitioner",
+                description="Distributes epics over the ProductOwner workers",
+                workers=workers,
+            ),
+            ParallelAgent(
+                name="ProductOwnerWorkers",
+                description="ProductOwner workers, one per slice of epics",
+                sub_agents=product_owners,
+            ),
+            StoryMergeAgent(
+                name="StoryMerger",
+                description="Merges and renumbers the worker user stories",
+                workers=workers,
+            ),
+        ],
+    )
+
+
+def create_map_reduce_analyst_agent(analyst: BaseAgent) -> MapReduceAnalysisAgent:
+    """
+    Create the Business Analyst stage for large briefs.
+
+    Briefs above the map-reduce size are checked chunk by chunk with
+    concurrent calls, smaller ones by ``analyst``.
+    """
+    instruction = """You are an expert, skeptical Senior Business Analyst. A large
+    project brief is checked against the Definition of Ready in chunks, by several
+    analysts in parallel. You check one chunk; the outline of the whole brief is given
+    for context.
+
+    <DEFINITION OF READY CHECKLIST>
+{checklist}
+    </DEFINITION OF READY CHECKLIST>
 
     TASK:
-    Analyze the user stories from {stories_and_criteria} and assign Story Point estimates based on 
-    relative complexity, effort, and uncertainty.
+    For every checklist area, identified by its [id], report whether your chunk
+    addresses it (covered) and list what is missing or ambiguous about it in your
+    chunk, most important first. Leave out gaps that other sections of the outline
+    clearly address.
+
+    BRIEF OUTLINE:
+    {outline}
+
+    YOUR CHUNK:
+    {brief}"""
+
+    return MapReduceAnalysisAgent(
+        name="MapReduceAnalyst",
+        description="Analyzes large project briefs chunk by chunk",
+        stage=analyst,
+        model=config.critic_model,
+        instruction=instruction,
+        min_tokens=pipeline_config.map_reduce_tokens,
+        chunk_tokens=pipeline_config.chunk_tokens,
+        max_concurrency=pipeline_config.map_workers,
+    )
 
-    ESTIMATION FRAMEWORK:
+
+def create_map_reduce_product_owner_agent(
+    product_owner: BaseAgent,
+) -> MapReduceDecompositionAgent:
+    """
+    Create the ProductOwner stage for large briefs.
+
+    Briefs above the map-reduce size are decomposed chunk by chunk with
+    concurrent calls and the stories are merged locally, smaller ones are
+    decomposed by ``product_owner``.
+    """
+    instruction = (
+        """You are an expert Agile Product Owner with extensive experience in
+    decomposing business requirements into actionable development artifacts.
+
+    TASK:
+    A large validated brief is decomposed in chunks by several Product Owners in
+    parallel. Generate the development artifacts for the requirements in your chunk
+    only; the outline of the whole brief is given for context. Number your stories
+    from US-001, they are renumbered when the results are merged.
+
+    BRIEF OUTLINE:
+    {outline}
+
+    YOUR CHUNK:
+    {brief}
+
+"""
+        + STORY_OUTPUT_FORMAT
+    )
+
+    return MapReduceDecompositionAgent(
+        name="MapReduceProductOwner",
+        description="Generates user stories for large briefs chunk by chunk",
+        stage=product_owner,
+        model=config.critic_model,
+        instruction=instruction,
+        min_tokens=pipeline_config.map_reduce_tokens,
+        chunk_tokens=pipeline_config.chunk_tokens,
+        max_concurrency=pipeline_config.map_workers,
+    )
+
+
+# Story Point scale and complexity factors shared by all estimation prompts.
+ESTIMATION_FRAMEWORK = """    ESTIMATION FRAMEWORK:
     Use the Fibonacci sequence: 1, 2, 3, 5, 8, 13
 
     REFERENCE MODEL:
@@ -257,38 +744,257 @@ def create_estimator_agent():
     6. Testing Effort: Test scenarios and edge cases
     7. Uncertainty: Unknown factors or dependencies
     8. Performance Requirements: Optimization needs
+"""
 
-    OUTPUT FORMAT:
-    Generate a Markdown table with exactly three columns:
 
-    | User Story | Story Points | Justification |
-    |------------|--------------|---------------|
-    | [Story description] | [Points] | [Brief explanation of complexity factors] |
+def create_estimator_agent() -> LlmAgent:
+    """Create the Agile Coach/Estimator agent."""
+    instruction = (
+        """You are an expert Agile Coach specializing in relative estimation
+    and Story Point assessment. You have facilitated hundreds of estimation
+    sessions and understand the nuances of complexity assessment.
+
+    TASK:
+    Analyze the user stories below and assign Story Point estimates based on
+    relative complexity, effort, and uncertainty.
+
+"""
+        + ESTIMATION_FRAMEWORK
+        + """
+    OUTPUT FORMAT:
+    Return one row per user story with its story_id, the story_points and a
+    brief justification naming the complexity factors.
 
     GUIDELINES:
     - Be consistent in your relative assessments
     - Consider all complexity factors, not just development time
     - Provide clear, concise justifications
-    - If a story seems larger than 13 points, note it should be decomposed"""
+    - If a story seems larger than 13 points, note it should be decomposed
+
+    USER STORIES:
+    {stories}"""
+    )
+
+    def provide_instruction(context: ReadonlyContext) -> str:
+        # Only the story sentences and criteria are needed to estimate.
+        artifacts = stories_to_estimate(context.state)
+        prompt = instruction.format(stories=compact_stories(artifacts))
+        budget = prompt_budget("AgileCoach")
+        if budget and count_tokens(prompt) > budget:
+            # Over budget, estimate from the story sentences alone.
+            prompt = instruction.format(
+                stories=compact_stories(artifacts, criteria=False)
+            )
+        return prompt
 
     return LlmAgent(
         name="AgileCoach",
-        model="gemini-2.5-pro",
-        instruction=instruction,
+        model=pipeline_model(config.critic_model),
+        instruction=provide_instruction,
         description="Provides Story Point estimates for user stories",
-        output_key="estimations"  # Saves output to state['estimations']
+        output_schema=Estimations,
+        output_key="estimations",  # Saves output to state['estimations']
+        **stage_model_callbacks(),
     )
 
 
-def create_report_generator_agent():
+# Prompt of the estimator workers that estimate one story per call.
+STORY_ESTIMATION_INSTRUCTION = (
+    """You are an expert Agile Coach specializing in relative estimation
+    and Story Point assessment.
+
+    TASK:
+    Assign a Story Point estimate to the single user story below based on relative
+    complexity, effort, and uncertainty.
+
+"""
+    + ESTIMATION_FRAMEWORK
+    + """
+    OUTPUT FORMAT:
+    Return the story_id, the story_points and a brief justification naming the
+    complexity factors. If the story seems larger than 13 points, note it should
+    be decomposed.
+
+    USER STORY:
+    {story}"""
+)
+
+
+def create_sharded_estimator_agent(estimator: BaseAgent) -> ShardedEstimationAgent:
+    """
+    Create the sharded Agile Coach stage.
+
+    Many stories are estimated in concurrent shards calibrated on the same
+    locally selected anchor stories; up to one shard of stories is
+    estimated by ``estimator``.
+    """
+    instruction = (
+        """You are an expert Agile Coach specializing in relative estimation
+    and Story Point assessment.
+
+    TASK:
+    The user stories of a project are estimated in batches by several Agile Coaches
+    in parallel. Assign Story Point estimates to the batch below based on relative
+    complexity, effort, and uncertainty. The reference stories were estimated
+    beforehand and are shared by all batches: size your stories relative to them so
+    that the estimates of all batches are consistent.
+
+"""
+        + ESTIMATION_FRAMEWORK
+        + """
+    OUTPUT FORMAT:
+    Return one row per user story of the batch with its story_id, the story_points
+    and a brief justification naming the complexity factors. If a story seems
+    larger than 13 points, note it should be decomposed.
+
+    REFERENCE STORIES:
+    {anchors}
+
+    USER STORIES:
+    {stories}"""
+    )
+
+    return ShardedEstimationAgent(
+        name="ShardedAgileCoach",
+        description="Estimates user stories in concurrent, anchor-calibrated shards",
+        stage=estimator,
+        model=config.critic_model,
+        instruction=instruction,
+        story_instruction=STORY_ESTIMATION_INSTRUCTION,
+        shard_size=pipeline_config.estimation_shard_size,
+        anchor_count=pipeline_config.estimation_anchors,
+        max_concurrency=pipeline_config.estimator_workers,
+    )
+
+
+def create_streaming_estimation_agent(
+    product_owner: LlmAgent,
+) -> StreamingEstimationAgent:
+    """
+    Create the pipelined ProductOwner + AgileCoach stage.
+
+    Every user story is estimated by its own worker call as soon as the
+    ProductOwner has finished writing it.
+    """
+    return StreamingEstimationAgent(
+        name="StreamingAgileCoach",
+        description="Estimates user stories while the ProductOwner is writing them",
+        product_owner=product_owner,
+        estimator_model=config.critic_model,
+        estimator_instruction=STORY_ESTIMATION_INSTRUCTION,
+        max_concurrency=pipeline_config.estimator_workers,
+    )
+
+
+def create_incremental_development_agent(
+    stages: list[BaseAgent],
+) -> IncrementalDevelopmentAgent:
+    """
+    Create the incremental ProductOwner + AgileCoach stage.
+
+    When the brief changes, only the stories of the changed sections are
+    written and estimated again. With speculation, stories are also written
+    and estimated in the background during the last refinement turns, and
+    only patched for the sections the final answers added or changed.
+    ``stages`` run when there is nothing to reuse.
+    """
+    revision_instruction = (
+        """You are an expert Agile Product Owner. User stories
+    have already been written for a requirements brief, but some sections of the
+    brief were added or changed since. Write the stories these sections require.
+
+    TASK:
+    - Rewrite the outdated stories from the sections below, keeping their ids;
+      leave out those the sections no longer require.
+    - For a requirement that changes an existing story, return the revised story
+      with the same id.
+    - For a new requirement, return a new story with a new id.
+    - Do not return stories that stay unchanged.
+    Also return the actors and use cases of the returned stories.
+
+    BRIEF OUTLINE:
+    {outline}
+
+    EXISTING USER STORIES:
+    {stories}
+
+    OUTDATED USER STORIES:
+    {outdated}
+
+    SECTIONS TO WRITE THE STORIES OF:
+    {brief}
+
+"""
+        + STORY_OUTPUT_FORMAT
+    )
+
+    options: dict[str, Any] = {
+        "name": "IncrementalDevelopment",
+        "description": "Reuses the stories and estimates of unchanged brief sections",
+        "stages": stages,
+        "product_owner_model": config.critic_model,
+        "revision_instruction": revision_instruction,
+        "estimator_model": config.critic_model,
+        "estimator_instruction": STORY_ESTIMATION_INSTRUCTION,
+        "max_concurrency": pipeline_config.estimator_workers,
+    }
+    if not pipeline_config.speculation:
+        return IncrementalDevelopmentAgent(**options)
+    return SpeculativeDevelopmentAgent(
+        **options,
+        product_owner_instruction=PRODUCT_OWNER_INSTRUCTION,
+        incremental=pipeline_config.incremental,
+    )
+
+
+def create_output_repair_agent(stages: list[BaseAgent]) -> OutputRepairAgent:
+    """
+    Create the stage that checks the ProductOwner + AgileCoach output.
+
+    Stories without well-formed Gherkin acceptance criteria and estimates
+    that are missing or not Fibonacci points are re-asked one by one,
+    instead of running ``stages`` again.
+    """
+    repair_instruction = """You are an expert Agile Product Owner. The user story
+    below was written for the requirements brief below, but it does not follow the
+    required format:
+    {problems}
+
+    TASK:
+    Return the story fixed, keeping its id and its meaning: role, action and benefit
+    following "As a [role], I want [action], so that [benefit]", and
+    acceptance_criteria in Gherkin syntax where every scenario has a GIVEN [initial
+    context], a WHEN [action or event] and a THEN [expected outcome]. List in
+    sections the ids of the brief sections ([section-id]) the story is derived from.
+
+    USER STORY:
+    {story}
+
+    BRIEF SECTIONS:
+    {brief}"""
+
+    return OutputRepairAgent(
+        name="OutputRepair",
+        description="Re-asks the user stories and estimates that fail the format checks",
+        stages=stages,
+        product_owner_model=config.critic_model,
+        repair_instruction=repair_instruction,
+        estimator_model=config.critic_model,
+        estimator_instruction=STORY_ESTIMATION_INSTRUCTION,
+        max_concurrency=pipeline_config.estimator_workers,
+    )
+
+
+def create_report_generator_agent() -> LlmAgent:
     """Create the Report Generator agent."""
-    instruction = """You are a technical documentation specialist. Your task is to compile 
+    instruction = """You are a technical documentation specialist. Your task is to compile
     all the project artifacts into a comprehensive final report.
 
     Using the following inputs:
-    - Validated Brief: {validated_brief}
-    - User Stories and Acceptance Criteria: {stories_and_criteria}
+    - Validated Brief: {brief}
+    - User Stories and Acceptance Criteria: {stories}
     - Story Point Estimations: {estimations}
+    - Stories Left Unestimated: {unestimated}
 
     Generate a well-formatted Markdown report with the following structure:
 
@@ -306,68 +1012,250 @@ def create_report_generator_agent():
     ### 2.3 Acceptance Criteria
 
     ## 3. Complexity Estimation
-    Include the story points table and total estimated effort.
+    Include the story points table and total estimated effort, and list the
+    stories left unestimated, if any.
 
     ## 4. Implementation Recommendations
     Based on the analysis, provide key recommendations for the development team.
 
     Make the report professional, clear, and ready for stakeholder review."""
 
+    def provide_instruction(context: ReadonlyContext) -> str:
+        # The typed artifacts are rendered to Markdown for presentation.
+        artifacts = load_story_artifacts(context.state.get("stories_and_criteria"))
+        estimations = load_estimations(context.state.get("estimations"))
+        clusters = context.state.get("story_clusters") or {}
+        stories = render_story_artifacts(collapse_duplicates(artifacts, clusters))
+        if clusters:
+            # Near-duplicates are listed once, by the story they repeat
+            duplicates = render_duplicates(artifacts, clusters)
+            stories += f"\n\n## Near-duplicate User Stories\n{duplicates}"
+        return instruction.format(
+            brief=context.state.get("validated_brief", ""),
+            stories=stories,
+            estimations=render_estimations(estimations, artifacts),
+            unestimated=", ".join(
+                estimation_metrics(
+                    estimations, artifacts, context.state.get("unestimated")
+                )["unestimated"]
+            )
+            or "None",
+        )
+
     return LlmAgent(
         name="ReportGenerator",
-        model="gemini-2.5-pro",
-        instruction=instruction,
+        model=pipeline_model(config.critic_model),
+        instruction=provide_instruction,
         description="Compiles all artifacts into a final report",
         output_key="final_report",
+        **stage_model_callbacks(),
+    )
+
+
+def create_report_assembler_agent() -> ReportAssemblerAgent:
+    """Create the template-based Report Generator."""
+    instruction = """You are a technical documentation specialist writing two sections
+    of a functional design & estimation report for stakeholders. The rest of the
+    report (requirements, user stories, acceptance criteria, estimation table) is
+    already written.
+
+    Write:
+    - executive_summary: a brief overview of the project scope and key metrics.
+    - recommendations: key implementation recommendations for the development team,
+      based on the scope, the stories and their estimates.
+
+    Use professional, clear Markdown without headings.
+
+    Validated Brief (digest):
+    {brief}
+
+    User Stories:
+    {stories}
+
+    Estimation Metrics:
+    {metrics}"""
+
+    return ReportAssemblerAgent(
+        name="ReportGenerator",
+        description="Compiles all artifacts into a final report",
+        summary_model=config.worker_model,
+        summary_instruction=instruction,
     )
 
 
-def create_google_docs_saver_agent():
+def create_google_docs_saver_agent() -> LlmAgent:
     """Create the Google Docs Saver agent."""
     instruction = """You are a Google Docs specialist responsible for saving reports to Google Docs.
-    
+
     Your task is to:
     1. Generate a descriptive file name based on the final report content from {final_report}
     2. Ask the user if the generated file name is acceptable for saving to Google Docs
     3. If the user says it's not ok, ask for an alternative file name
     4. If the user says it's ok (or provides an alternative), use the google-docs batch update functionality to save the content to the specific Google Docs document: https://docs.google.com/document/d/13-PDPXIMVbD0vgCSf1eb2CNt_NNncStX6FKE6J3KokI/edit?tab=t.0
-    
+
     The document ID to use is: 13-PDPXIMVbD0vgCSf1eb2CNt_NNncStX6FKE6J3KokI
-    
+
     When generating file names, make them descriptive and professional, for example:
     - "MARES_Requirements_Analysis_[ProjectName]_[Date]"
     - "Functional_Design_Report_[ProjectName]_[Date]"
-    
+
     Use the docs_documents_batch_update tool to insert the report content into the document.
     """
 
     return LlmAgent(
         name="GoogleDocsSaver",
-        model="gemini-2.0-flash",
+        model=pipeline_model("gemini-2.0-flash"),
         instruction=instruction,
         description="Handles file naming and saving reports to Google Docs",
         output_key="docs_save_result",
         tools=[google_docs_toolset, google_drive_toolset],
+        **stage_model_callbacks(cached=False),
     )
 
 
-class InitializeBriefAgent(LlmAgent):
+class InitializeBriefAgent(BaseAgent):
     """
     Custom agent that initializes the project brief in the state
     from the user's message.
+
+    While refinement questions are pending, the message is the user's answer
+    (or, in batched mode, the answers to the refinement form) and is added to
+    the brief instead; any other message is a new brief, also kept as
+    `submitted_brief`. While a warm start offer is pending, the message is
+    the user's answer to it: the warm start is applied when accepted, and the
+    brief is analysed as submitted otherwise. A message that was already
+    applied, when the pipeline is re-entered after a failed run, leaves the
+    brief unchanged.
+
+    The `session_scope` the stages are checkpointed under is set as well.
     """
 
-    def __init__(self):
+    def __init__(self) -> None:
         super().__init__(
             name="BriefInitializer",
             description="Extracts and saves the project brief from user input",
-            instruction="Get the project_brief from the user and store it in the state so it can be used by  the next agent",
-            output_key="project_brief"
         )
 
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Save the user's message to state['project_brief']."""
+        message = user_text(ctx)
+        state = ctx.session.state
+        questions = state.get("pending_questions")
+        if message == state.get("brief_message") and state.get("project_brief"):
+            # Re-entry with the same message, e.g. after a failed run
+            return
+        state_delta: dict[str, Any] = {
+            "brief_message": message,
+            SESSION_SCOPE_KEY: session_scope(ctx.session),
+        }
+        offer = state.get(WARM_START_OFFER_KEY)
+        if offer and state.get("project_brief"):
+            state_delta[WARM_START_OFFER_KEY] = None
+            if accepts_warm_start(message):
+                state_delta.update(offer)
+        elif (
+            questions
+            and state.get("project_brief")
+            and not state.get("analysis_complete")
+        ):
+            if state.get("refinement_batched"):
+                answers = parse_form_answers(message, questions)
+            else:
+                answers = [(questions[0], message)]
+            state_delta["project_brief"] = apply_refinements(
+                state["project_brief"], answers
+            )
+        else:
+            state_delta["project_brief"] = state_delta["submitted_brief"] = message
+        yield state_event(self, ctx, state_delta)
+
+
+COORDINATOR_WELCOME = """Welcome to MARES! I manage a team of specialist agents that validate
+your requirements, write user stories and acceptance criteria, estimate them and
+compile a final report.
+
+Please share the client brief to get started."""
+
+
+def is_brief_revision(message: str, state: dict[str, Any]) -> bool:
+    """Whether a message is a new version of the validated brief rather than
+    a reply: it has several sections, some of them shared with the brief."""
+    if not state.get("validated_brief"):
+        return False
+    sections = {section.id for section in build_digest(message).sections}
+    known = {section.id for section in validated_digest(state).sections}
+    return len(sections) > 1 and bool(sections & known)
+
+
+class MARESCoordinatorAgent(BaseAgent):
+    """
+    Custom agent that hands every user turn to the MARES pipeline.
+
+    A conversation with the GoogleDocsSaver (file name confirmation) is
+    continued with that agent instead, unless the user sends a revised
+    brief.
+    """
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Welcome the user or transfer to the pipeline."""
+        if not user_text(ctx):
+            yield state_event(self, ctx, {}, COORDINATOR_WELCOME)
+            return
+
+        pipeline = self.sub_agents[0]
+        agent_to_run = pipeline
+        last_author = next(
+            (
+                e.author
+                for e in reversed(ctx.session.events)
+                if e.author != "user" and e.content and e.content.parts
+            ),
+            None,
+        )
+        if last_author == "GoogleDocsSaver" and not is_brief_revision(
+            user_text(ctx), ctx.session.state
+        ):
+            agent_to_run = pipeline.find_agent(last_author) or pipeline
+        yield state_event(self, ctx, {}, transfer_to_agent=agent_to_run.name)
+        async for event in agent_to_run.run_async(ctx):
+            yield event
+
+
+# State keys read and written by the pipeline stages that are checkpointed.
+# Interactive and deterministic stages always run.
+CHECKPOINTED_STAGES = {
+    "BusinessAnalyst": (["project_brief", "warm_digest"], ["missing_elements"]),
+    "ProductOwner": (["validated_brief"], ["stories_and_criteria"]),
+    "ProductOwnerFanOut": (["validated_brief"], ["stories_and_criteria"]),
+    "MapReduceAnalyst": (["project_brief", "warm_digest"], ["missing_elements"]),
+    "MapReduceProductOwner": (["validated_brief"], ["stories_and_criteria"]),
+    "StreamingAgileCoach": (
+        ["validated_brief"],
+        ["stories_and_criteria", "estimations", "unestimated"],
+    ),
+    "AgileCoach": (
+        ["stories_and_criteria", "story_clusters", "estimation_scope"],
+        ["estimations"],
+    ),
+    "ShardedAgileCoach": (
+        ["stories_and_criteria", "story_clusters", "estimation_scope"],
+        ["estimations", "unestimated"],
+    ),
+    "ReportGenerator": (
+        ["validated_brief", "stories_and_criteria", "estimations", "unestimated"],
+        ["final_report"],
+    ),
+}
+
+checkpoint_store = CheckpointStore(pipeline_config.checkpoint_path)
+
 
 # Create the main coordinator agent that orchestrates the workflow
-def create_mares_coordinator():
+def create_mares_coordinator() -> MARESCoordinatorAgent:
     """
     Create the main MARES coordinator agent using ADK's multi-agent patterns.
     This implements the Sequential Pipeline Pattern with all three specialist agents.
@@ -377,14 +1265,93 @@ def create_mares_coordinator():
     initializer = InitializeBriefAgent()
 
     # Create the specialist agents
-    # RefinementLoop = create_refinement_loop_agent()
-    analyst = create_analyst_agent()
+    analyst: BaseAgent
+    if pipeline_config.parallel_analysis:
+        analyst = create_parallel_analyst_agent()
+    else:
+        analyst = create_analyst_agent()
     refinement_validator = create_refinement_validator_agent()
-    scripter = create_scripter_agent()
-    estimator = create_estimator_agent()
-    report_generator = create_report_generator_agent()
+    scripter: BaseAgent
+    if pipeline_config.product_owner_fan_out:
+        scripter = create_product_owner_fan_out_agent()
+    else:
+        scripter = create_scripter_agent()
+    estimator: BaseAgent = create_estimator_agent()
+    # Nested stages, checkpointed and budgeted like the pipeline stages
+    inner_stages: list[BaseAgent] = []
+    if pipeline_config.sharded_estimation:
+        estimator = create_sharded_estimator_agent(estimator)
+    if pipeline_config.estimation_reuse:
+        inner_stages.append(estimator)
+        estimator = EstimationReuseAgent(
+            name="EstimationReuse",
+            description="Reuses the past estimates of similar user stories",
+            stage=estimator,
+            threshold=pipeline_config.estimation_reuse_threshold,
+        )
+    if pipeline_config.story_dedup:
+        inner_stages.append(estimator)
+        estimator = DuplicateCollapseAgent(
+            name="StoryDeduplicator",
+            description="Estimates near-duplicate user stories once per cluster",
+            stage=estimator,
+            threshold=pipeline_config.story_dedup_threshold,
+        )
+    if pipeline_config.map_reduce:
+        analyst = create_map_reduce_analyst_agent(analyst)
+    warm_start = []
+    if pipeline_config.brief_reuse:
+        warm_start.append(
+            BriefReuseAgent(
+                name="BriefMatcher",
+                description="Warm-starts the brief from a similar validated brief",
+                threshold=pipeline_config.brief_reuse_threshold,
+                reuse_stories=(
+                    pipeline_config.incremental or pipeline_config.speculation
+                ),
+            )
+        )
+        add_agent_callbacks(analyst, before=skip_reused_analysis)
+    development_stages: list[BaseAgent]
+    if pipeline_config.streaming_estimation and isinstance(scripter, LlmAgent):
+        # Steps 4 and 5 run as one pipelined stage.
+        development_stages = [create_streaming_estimation_agent(scripter)]
+    else:
+        if pipeline_config.map_reduce:
+            scripter = create_map_reduce_product_owner_agent(scripter)
+        development_stages = [scripter, estimator]
+    if pipeline_config.incremental or pipeline_config.speculation:
+        inner_stages += development_stages
+        development = create_incremental_development_agent(development_stages)
+        if isinstance(development, SpeculativeDevelopmentAgent):
+            refinement_validator.speculative_stage = development
+        development_stages = [development]
+    if pipeline_config.output_repair:
+        inner_stages += development_stages
+        development_stages = [create_output_repair_agent(development_stages)]
+    report_generator: BaseAgent
+    if pipeline_config.report_assembler:
+        report_generator = create_report_assembler_agent()
+    else:
+        report_generator = create_report_generator_agent()
     google_docs_saver = create_google_docs_saver_agent()
     validator = AnalystValidationAgent()
+    compactor = BriefCompactionAgent(
+        name="BriefCompactor",
+        description="Compacts the validated brief into a sectioned digest",
+    )
+    if pipeline_config.estimation_reuse:
+        # Index the estimates for the stories of later runs
+        add_agent_callbacks(development_stages[-1], after=record_estimations)
+    if pipeline_config.brief_reuse:
+        # Index the validated brief for the similar briefs of later sessions
+        add_agent_callbacks(development_stages[-1], after=record_brief)
+        # The analysis waits for the user's answer to a warm start offer
+        for analysis_stage in [analyst, refinement_validator, validator]:
+            add_agent_callbacks(analysis_stage, before=await_warm_start_answer)
+    # Steps 4 to 7 only run once the brief has been validated
+    for stage in [compactor, *development_stages, report_generator, google_docs_saver]:
+        stage.before_agent_callback = require_analysis_complete
 
     # Create the main sequential pipeline
     main_pipeline = SequentialAgent(
@@ -392,45 +1359,39 @@ def create_mares_coordinator():
         description="Main MARES workflow pipeline",
         sub_agents=[
             initializer,  # Step 0: Initialize the brief in state
+            *warm_start,  # Reuse the work on a similar brief validated before
             analyst,  # Step 1: Analyze and validate requirements,
             refinement_validator,  # Step 2: request additional info for missing points, step by step
             validator,  # Step 3: Check if validation is complete
-            scripter,  # Step 4: Generate user stories and acceptance criteria
-            estimator,  # Step 5: Estimate story points
+            compactor,  # Downstream prompts reference the brief digest
+            # Step 4: Generate user stories and acceptance criteria
+            # Step 5: Estimate story points
+            *development_stages,
             report_generator,  # Step 6: Generate final report
             google_docs_saver,  # Step 7: Save report to Google Docs
-        ]
+        ],
     )
 
+    # Resume after the last completed stage when the pipeline is re-entered
+    if pipeline_config.checkpoints_enabled:
+        for stage in [*main_pipeline.sub_agents, *inner_stages]:
+            if stage.name in CHECKPOINTED_STAGES:
+                before, after = checkpoint_store.stage_callbacks(
+                    *CHECKPOINTED_STAGES[stage.name]
+                )
+                add_agent_callbacks(stage, before=before, after=after)
+
+    # Time budgets: stages running late fall back to faster models
+    if pipeline_config.pipeline_deadline > 0 or pipeline_config.stage_deadlines:
+        add_agent_callbacks(main_pipeline, before=start_pipeline_deadline)
+        for stage in [*main_pipeline.sub_agents, *inner_stages]:
+            add_agent_callbacks(stage, before=start_stage_deadline)
+
     # Create the coordinator agent that manages the overall process
-    coordinator_instruction = """You are the MARES Project Coordinator, managing a team of specialist agents
-    to analyze software requirements and generate development artifacts.
-
-    Your team consists of:
-    1. BusinessAnalyst - Validates requirements and asks clarifying questions
-    2. ProductOwner - Creates user stories and acceptance criteria
-    3. AgileCoach - Estimates story complexity
-    4. ReportGenerator - Compiles the final report
-    5. GoogleDocsSaver - Handles file naming and saves reports to Google Docs
-    
-    You will start by welcoming the user and asking for the client brief. Once you received the 
-    client brief you should take the following steps:
-    1. Save it to the temporary state for the pipeline to access
-    2. Delegate to the MARESPipeline to run the complete analysis workflow
-    3. Monitor the process and handle any user interactions needed
-    4. Ensure all steps complete successfully
-    5. Present the final report to the user
-    6. The GoogleDocsSaver agent will handle file naming and saving to Google Docs
-    
-    Extract the project brief from the user's message and save it to temp:project_brief, then transfer to MARESPipeline."""
-
-    coordinator = LlmAgent(
+    coordinator = MARESCoordinatorAgent(
         name="MARESCoordinator",
-        model="gemini-2.0-flash",
-        instruction=coordinator_instruction,
         description="Orchestrates the MARES requirements analysis process",
         sub_agents=[main_pipeline],  # Pipeline is a sub-agent of coordinator
-        tools=[google_docs_toolset, google_drive_toolset],
     )
 
     return coordinator
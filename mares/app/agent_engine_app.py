@@ -18,6 +18,7 @@ import datetime
 import json
 import logging
 import os
+from collections.abc import Iterator
 from typing import Any
 
 import google.auth
@@ -30,6 +31,7 @@ from vertexai import agent_engines
 from vertexai.preview.reasoning_engines import AdkApp
 
 from app.agent import root_agent
+from app.llm import rate_limiter
 from app.utils.gcs import create_bucket_if_not_exists
 from app.utils.tracing import CloudTraceLoggingSpanExporter
 from app.utils.typing import Feedback
@@ -55,13 +57,57 @@ class AgentEngineApp(AdkApp):
         feedback_obj = Feedback.model_validate(feedback)
         self.logger.log_struct(feedback_obj.model_dump(), severity="INFO")
 
+    def stream_turn(
+        self,
+        *,
+        message: str | dict[str, Any],
+        user_id: str,
+        session_id: str | None = None,
+        **kwargs: Any,
+    ) -> Iterator[dict[str, Any]]:
+        """Streams the response to one new turn of a conversation.
+
+        The client only sends the new message instead of the whole
+        conversation: the context is rebuilt from the session service.
+
+        Args:
+            message: The new user message, as text or a Content dict.
+            user_id: The ID of the user.
+            session_id: The session of the conversation, None on its first
+                turn.
+            **kwargs: Additional keyword arguments for `stream_query`.
+
+        Yields:
+            The events of the turn. When a session is created (first turn, or
+            the session was not found), the first event is
+            ``{"session_id": id}`` with the ID to send on the next turns.
+        """
+        if session_id:
+            try:
+                self.get_session(user_id=user_id, session_id=session_id)
+            except RuntimeError:
+                logging.warning(f"Session {session_id} not found, starting a new one")
+                session_id = None
+        if not session_id:
+            session_id = self.create_session(user_id=user_id)["id"]
+            yield {"session_id": session_id}
+        yield from self.stream_query(
+            message=message, user_id=user_id, session_id=session_id, **kwargs
+        )
+
+    def get_rate_limit_stats(self) -> dict[str, dict[str, Any]]:
+        """Per-model throttling and queue-depth metrics of this worker."""
+        return rate_limiter.stats()
+
     def register_operations(self) -> dict[str, list[str]]:
         """Registers the operations of the Agent.
 
-        Extends the base operations to include feedback registration functionality.
+        Extends the base operations to include feedback registration, rate
+        limit metrics and single-turn streaming functionality.
         """
         operations = super().register_operations()
-        operations[""] = operations[""] + ["register_feedback"]
+        operations[""] = operations[""] + ["register_feedback", "get_rate_limit_stats"]
+        operations["stream"] = operations["stream"] + ["stream_turn"]
         return operations
 
     def clone(self) -> "AgentEngineApp":
@@ -84,12 +130,16 @@ def deploy_agent_engine_app(
     location: str,
     agent_name: str | None = None,
     requirements_file: str = ".requirements.txt",
-    extra_packages: list[str] = ["./app"],
-    env_vars: dict[str, str] = {},
+    extra_packages: list[str] | None = None,
+    env_vars: dict[str, str] | None = None,
     service_account: str | None = None,
 ) -> agent_engines.AgentEngine:
     """Deploy the agent engine app to Vertex AI."""
 
+    if env_vars is None:
+        env_vars = {}
+    if extra_packages is None:
+        extra_packages = ["./app"]
     staging_bucket_uri = f"gs://{project}-agent-engine"
     artifacts_bucket_name = f"{project}-mares-logs-data"
     create_bucket_if_not_exists(
@@ -12,8 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import google.auth
 
@@ -44,3 +45,244 @@ class ResearchConfiguration:
 
 
 config = ResearchConfiguration()
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    """Reads a boolean toggle from the environment."""
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes")
+
+
+# Default (requests per minute, tokens per minute) quota per model.
+DEFAULT_RATE_LIMITS = {
+    "gemini-2.5-pro": (60, 2_000_000),
+    "gemini-2.5-flash": (300, 4_000_000),
+    "gemini-2.0-flash": (300, 4_000_000),
+}
+
+
+# Price in USD per 1M (input, output) tokens of each model.
+DEFAULT_MODEL_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.0),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.0-flash": (0.10, 0.40),
+}
+
+
+# Default token budget of the whole prompt per stage.
+DEFAULT_PROMPT_BUDGETS = {
+    "BusinessAnalyst": 8000,
+    "RefinementAgent": 2000,
+    "EpicPlanner": 6000,
+    "ProductOwner": 8000,
+    "AgileCoach": 12000,
+    "ReportGenerator": 6000,
+}
+
+
+def _prompt_budgets() -> dict[str, int]:
+    """Reads the per-stage prompt budgets, overridable with a JSON object in
+    MARES_PROMPT_BUDGETS, e.g. ``{"ProductOwner": 4000}``; 0 disables a
+    budget."""
+    overrides = json.loads(os.getenv("MARES_PROMPT_BUDGETS", "{}"))
+    return {**DEFAULT_PROMPT_BUDGETS, **overrides}
+
+
+def _rate_limits() -> dict[str, tuple[int, int]]:
+    """Reads the per-model quota, overridable with a JSON object in
+    MARES_RATE_LIMITS, e.g. ``{"gemini-2.5-pro": [30, 1000000]}``."""
+    overrides = json.loads(os.getenv("MARES_RATE_LIMITS", "{}"))
+    return {**DEFAULT_RATE_LIMITS, **{k: tuple(v) for k, v in overrides.items()}}
+
+
+@dataclass
+class PipelineConfiguration:
+    """Configuration for the MARES pipeline stages.
+
+    Every optimisation is off by default and enabled with its ``MARES_*``
+    environment variable, see the README.
+
+    Attributes:
+        cache_dir (str): Root directory for local, on-disk pipeline data.
+        llm_cache_enabled (bool): Serve repeated stage calls from the LLM cache.
+        llm_cache_memory_entries (int): Capacity of the in-memory cache tier.
+        llm_cache_disk_bytes (int): Size budget of the on-disk cache tier.
+        product_owner_fan_out (bool): Decompose the brief per epic with parallel
+            ProductOwner workers instead of a single ProductOwner call.
+        product_owner_workers (int): Maximum number of concurrent ProductOwner
+            workers in fan-out mode.
+        streaming_estimation (bool): Estimate each user story as soon as the
+            streaming ProductOwner has written it.
+        estimator_workers (int): Maximum number of concurrent estimator calls.
+        sharded_estimation (bool): Estimate many user stories in concurrent
+            shards calibrated on the same anchor stories.
+        estimation_shard_size (int): Number of user stories per shard; up to
+            one shard is estimated in a single pass.
+        estimation_anchors (int): Number of anchor stories shared by the
+            shards.
+        estimation_reuse (bool): Reuse the points and justification of
+            similar stories estimated before instead of estimating them again.
+        estimation_reuse_threshold (float): Minimum cosine similarity of a
+            reusable past estimate.
+        estimation_index_path (str): SQLite file of the past estimates.
+        story_dedup (bool): Estimate near-duplicate user stories once per
+            cluster and leave them out of the report prompts.
+        story_dedup_threshold (float): Minimum MinHash similarity of
+            near-duplicate stories.
+        brief_reuse (bool): Offer to warm-start a new brief from the most
+            similar brief the same user validated before, so that only the
+            sections that differ are analysed and decomposed again.
+        brief_reuse_threshold (float): Minimum MinHash similarity of a
+            reusable brief.
+        brief_index_path (str): SQLite file of the validated briefs.
+        report_assembler (bool): Assemble the final report from a template and
+            only have a model write the summary and recommendations.
+        batched_refinement (bool): Ask about all missing Definition-of-Ready
+            items in a single form instead of one question per turn.
+        checkpoints_enabled (bool): Checkpoint the output of each pipeline
+            stage and skip stages whose inputs are unchanged on re-entry.
+        checkpoint_path (str): SQLite database of the stage checkpoints.
+        rate_limit_enabled (bool): Throttle model calls to the per-model quota
+            and retry them with backoff when the quota is exhausted.
+        rate_limit_path (str): SQLite database of the rate limit buckets,
+            shared by all worker processes on the host.
+        rate_limits (dict): (requests per minute, tokens per minute) per model.
+        rate_limit_retries (int): Maximum retries of a call that got a 429.
+        hedging_enabled (bool): Send a duplicate of a non-streaming model call
+            when it takes longer than the p90 latency of its stage, and use
+            whichever response arrives first.
+        hedge_min_delay (float): Minimum delay in seconds before hedging.
+        pipeline_deadline (float): Time budget in seconds of one pipeline run,
+            0 for none.
+        stage_deadlines (dict): Time budget in seconds per pipeline stage.
+        fallback_models (dict): Faster model to use per model when the
+            remaining budget of a stage is lower than its expected latency.
+        expected_latency (float): Expected latency in seconds of a stage
+            until enough of its calls have been observed.
+        model_routing (bool): Route each call of a stage to the worker or the
+            critic model of ``ResearchConfiguration`` by input complexity.
+        routing_threshold (float): Complexity score from which the critic
+            model is used.
+        routing_input_tokens (int): Prompt size that alone scores 1.
+        routing_story_count (int): Number of user stories that alone scores 1.
+        routing_gap_count (int): Number of open Definition-of-Ready items that
+            alone scores 1.
+        call_latency_budget (float): Maximum expected latency in seconds of a
+            call on the critic model, 0 for none.
+        call_cost_budget (float): Maximum expected cost in USD of a call on
+            the critic model, 0 for none.
+        model_prices (dict): Price in USD per 1M (input, output) tokens per
+            model.
+        prompt_budgets_enforced (bool): Hold the stage prompts to
+            ``prompt_budgets``. A brief digest over budget is never
+            shortened: large briefs are mapped in chunks when ``map_reduce``
+            is on, otherwise the stage fails.
+        prompt_budgets (dict): Token budget of the whole prompt per stage.
+        dor_precheck (bool): Score the Definition-of-Ready areas locally,
+            skip the BusinessAnalyst when all of them pass and only have it
+            check the weak ones otherwise.
+        dor_pass_threshold (float): Local score from which an area passes.
+            Above 0.75, no area with a sub-item without evidence passes.
+        parallel_analysis (bool): Check each Definition-of-Ready area with its
+            own BusinessAnalyst worker on the fast model, in parallel.
+        map_reduce (bool): Analyse and decompose large briefs chunk by chunk,
+            concurrently, and merge the results locally.
+        map_reduce_tokens (int): Brief size from which map-reduce is used.
+        chunk_tokens (int): Target size of a brief chunk.
+        map_workers (int): Maximum number of concurrent chunk calls.
+        speculation (bool): Write and estimate the user stories in the
+            background while the user answers the last refinement questions.
+        speculation_pending (int): Number of missing elements from which
+            down the speculation starts.
+        incremental (bool): When the validated brief changes, only write
+            and estimate again the user stories of the changed sections.
+        regeneration_max_share (float): Share of the brief sections to write
+            the stories of above which the development stages run again in
+            full instead.
+        question_prefetch (bool): Draft the next refinement question in the
+            background while the user answers the current one.
+        output_repair (bool): Check the user stories and estimates locally
+            and re-ask only the ones without well-formed Gherkin criteria or
+            Fibonacci points.
+    """
+
+    cache_dir: str = os.getenv("MARES_CACHE_DIR", os.path.expanduser("~/.cache/mares"))
+    llm_cache_enabled: bool = _env_flag("MARES_LLM_CACHE", False)
+    llm_cache_memory_entries: int = 128
+    llm_cache_disk_bytes: int = 256 * 1024 * 1024
+    product_owner_fan_out: bool = _env_flag("MARES_PO_FAN_OUT", False)
+    product_owner_workers: int = int(os.getenv("MARES_PO_WORKERS", "4"))
+    streaming_estimation: bool = _env_flag("MARES_STREAMING_ESTIMATION", False)
+    estimator_workers: int = int(os.getenv("MARES_ESTIMATOR_WORKERS", "4"))
+    sharded_estimation: bool = _env_flag("MARES_SHARDED_ESTIMATION", False)
+    estimation_shard_size: int = int(os.getenv("MARES_ESTIMATION_SHARD_SIZE", "15"))
+    estimation_anchors: int = int(os.getenv("MARES_ESTIMATION_ANCHORS", "3"))
+    estimation_reuse: bool = _env_flag("MARES_ESTIMATION_REUSE", False)
+    estimation_reuse_threshold: float = float(
+        os.getenv("MARES_ESTIMATION_REUSE_THRESHOLD", "0.9")
+    )
+    estimation_index_path: str = os.getenv(
+        "MARES_ESTIMATION_INDEX_PATH", os.path.join(cache_dir, "estimations.sqlite")
+    )
+    story_dedup: bool = _env_flag("MARES_STORY_DEDUP", False)
+    story_dedup_threshold: float = float(
+        os.getenv("MARES_STORY_DEDUP_THRESHOLD", "0.8")
+    )
+    brief_reuse: bool = _env_flag("MARES_BRIEF_REUSE", False)
+    brief_reuse_threshold: float = float(
+        os.getenv("MARES_BRIEF_REUSE_THRESHOLD", "0.8")
+    )
+    brief_index_path: str = os.getenv(
+        "MARES_BRIEF_INDEX_PATH", os.path.join(cache_dir, "briefs.sqlite")
+    )
+    report_assembler: bool = _env_flag("MARES_REPORT_ASSEMBLER", False)
+    batched_refinement: bool = _env_flag("MARES_BATCHED_REFINEMENT", False)
+    checkpoints_enabled: bool = _env_flag("MARES_CHECKPOINTS", False)
+    checkpoint_path: str = os.getenv(
+        "MARES_CHECKPOINT_PATH", os.path.join(cache_dir, "checkpoints.sqlite")
+    )
+    rate_limit_enabled: bool = _env_flag("MARES_RATE_LIMIT", False)
+    rate_limit_path: str = os.getenv(
+        "MARES_RATE_LIMIT_PATH", os.path.join(cache_dir, "rate_limits.sqlite")
+    )
+    rate_limits: dict[str, tuple[int, int]] = field(default_factory=_rate_limits)
+    rate_limit_retries: int = int(os.getenv("MARES_RATE_LIMIT_RETRIES", "5"))
+    hedging_enabled: bool = _env_flag("MARES_HEDGING", False)
+    hedge_min_delay: float = float(os.getenv("MARES_HEDGE_MIN_DELAY", "2"))
+    pipeline_deadline: float = float(os.getenv("MARES_PIPELINE_DEADLINE", "0"))
+    stage_deadlines: dict[str, float] = field(
+        default_factory=lambda: json.loads(os.getenv("MARES_STAGE_DEADLINES", "{}"))
+    )
+    fallback_models: dict[str, str] = field(
+        default_factory=lambda: {"gemini-2.5-pro": "gemini-2.5-flash"}
+    )
+    expected_latency: float = 30.0
+    model_routing: bool = _env_flag("MARES_MODEL_ROUTING", False)
+    routing_threshold: float = float(os.getenv("MARES_ROUTING_THRESHOLD", "1"))
+    routing_input_tokens: int = int(os.getenv("MARES_ROUTING_INPUT_TOKENS", "6000"))
+    routing_story_count: int = int(os.getenv("MARES_ROUTING_STORY_COUNT", "20"))
+    routing_gap_count: int = int(os.getenv("MARES_ROUTING_GAP_COUNT", "6"))
+    call_latency_budget: float = float(os.getenv("MARES_CALL_LATENCY_BUDGET", "0"))
+    call_cost_budget: float = float(os.getenv("MARES_CALL_COST_BUDGET", "0"))
+    model_prices: dict[str, tuple[float, float]] = field(
+        default_factory=lambda: dict(DEFAULT_MODEL_PRICES)
+    )
+    prompt_budgets_enforced: bool = _env_flag("MARES_ENFORCE_PROMPT_BUDGETS", False)
+    prompt_budgets: dict[str, int] = field(default_factory=_prompt_budgets)
+    dor_precheck: bool = _env_flag("MARES_DOR_PRECHECK", False)
+    dor_pass_threshold: float = float(os.getenv("MARES_DOR_PASS_THRESHOLD", "0.85"))
+    parallel_analysis: bool = _env_flag("MARES_PARALLEL_ANALYSIS", False)
+    map_reduce: bool = _env_flag("MARES_MAP_REDUCE", False)
+    map_reduce_tokens: int = int(os.getenv("MARES_MAP_REDUCE_TOKENS", "12000"))
+    chunk_tokens: int = int(os.getenv("MARES_CHUNK_TOKENS", "4000"))
+    map_workers: int = int(os.getenv("MARES_MAP_WORKERS", "8"))
+    speculation: bool = _env_flag("MARES_SPECULATION", False)
+    speculation_pending: int = int(os.getenv("MARES_SPECULATION_PENDING", "2"))
+    incremental: bool = _env_flag("MARES_INCREMENTAL", False)
+    regeneration_max_share: float = float(
+        os.getenv("MARES_REGENERATION_MAX_SHARE", "0.5")
+    )
+    question_prefetch: bool = _env_flag("MARES_QUESTION_PREFETCH", False)
+    output_repair: bool = _env_flag("MARES_OUTPUT_REPAIR", False)
+
+
+pipeline_config = PipelineConfiguration()
@@ -1,4 +1,5 @@
 import os
+
 from google.adk.tools.application_integration_tool.application_integration_toolset import (
     ApplicationIntegrationToolset,
 )
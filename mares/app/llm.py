@@ -0,0 +1,451 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Shared model-call plumbing for the MARES agents and deterministic stages."""
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import AsyncGenerator, Mapping
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from typing import Any, cast
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.base_llm_connection import BaseLlmConnection
+from google.adk.models.registry import LLMRegistry
+from google.adk.sessions.state import State
+from google.genai import types
+
+from .config import config as model_tiers
+from .config import pipeline_config
+from .utils.latency import LatencyTracker
+from .utils.llm_cache import LlmResponseCache, make_cache_key
+from .utils.rate_limit import (
+    RateLimit,
+    SharedRateLimiter,
+    backoff_delay,
+    is_rate_limited,
+)
+from .utils.refinement import pending_elements
+from .utils.routing import (
+    ComplexityScale,
+    ComplexitySignals,
+    call_cost,
+    choose_tier,
+    complexity_score,
+)
+
+# Label ADK attaches to every model request with the name of the calling agent.
+AGENT_NAME_LABEL = "adk_agent_name"
+
+# Invocation-scoped state keys holding the absolute deadline (epoch seconds)
+# of the pipeline run and of the running stage.
+PIPELINE_DEADLINE_KEY = "temp:pipeline_deadline"
+STAGE_DEADLINE_KEY = "temp:stage_deadline"
+
+# Shared response cache of the pipeline stages, keyed by the rendered
+# instruction and the conversation history of each call.
+llm_cache = LlmResponseCache(
+    cache_dir=os.path.join(pipeline_config.cache_dir, "llm"),
+    max_memory_entries=pipeline_config.llm_cache_memory_entries,
+    max_disk_bytes=pipeline_config.llm_cache_disk_bytes,
+)
+
+
+# Per-model quota shared by every stage and worker process.
+rate_limiter = SharedRateLimiter(
+    path=pipeline_config.rate_limit_path,
+    limits={
+        model: RateLimit(*limit) for model, limit in pipeline_config.rate_limits.items()
+    },
+)
+
+# Expected response size, for requests without max_output_tokens.
+_DEFAULT_OUTPUT_TOKENS = 2048
+
+# Observed model call latencies, per stage and model.
+latency_tracker = LatencyTracker()
+
+_models: dict[str, BaseLlm] = {}
+
+
+def _resolve_model(model: str) -> BaseLlm:
+    """Returns the shared client of ``model``, created on first use."""
+    if model not in _models:
+        _models[model] = LLMRegistry.new_llm(model)
+    return _models[model]
+
+
+def _input_tokens(llm_request: LlmRequest) -> int:
+    config = llm_request.config or types.GenerateContentConfig()
+    characters = len(str(config.system_instruction or ""))
+    for content in llm_request.contents or []:
+        characters += sum(len(part.text or "") for part in content.parts or [])
+    return characters // 4
+
+
+def _output_tokens(llm_request: LlmRequest) -> int:
+    config = llm_request.config or types.GenerateContentConfig()
+    return config.max_output_tokens or _DEFAULT_OUTPUT_TOKENS
+
+
+def estimate_tokens(llm_request: LlmRequest) -> int:
+    """Roughly estimates the input and output tokens of a request."""
+    return _input_tokens(llm_request) + _output_tokens(llm_request)
+
+
+def _stage_name(llm_request: LlmRequest) -> str:
+    labels = (llm_request.config.labels if llm_request.config else None) or {}
+    return labels.get(AGENT_NAME_LABEL, "")
+
+
+async def _collect(responses: AsyncGenerator[LlmResponse, None]) -> list[LlmResponse]:
+    return [llm_response async for llm_response in responses]
+
+
+class PipelineLlm(BaseLlm):
+    """Model used by all MARES stages.
+
+    Delegates to the model registered for ``model`` (Gemini), throttled by
+    the shared per-model rate limiter. Calls that fail with 429 before any
+    response was received are retried with jittered exponential backoff.
+
+    With hedging enabled, a non-streaming call that takes longer than the
+    p90 latency of its stage is duplicated; the first response wins and the
+    other call is cancelled.
+    """
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        # Stages opt in explicitly, the wrapper is not registered.
+        return []
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        model = llm_request.model or self.model
+        stage = _stage_name(llm_request)
+        started = time.monotonic()
+        if stream or not pipeline_config.hedging_enabled:
+            async for llm_response in self._throttled(model, llm_request, stream):
+                yield llm_response
+        else:
+            for llm_response in await self._hedged(model, stage, llm_request):
+                yield llm_response
+        latency_tracker.record(stage, model, time.monotonic() - started)
+
+    async def _throttled(
+        self, model: str, llm_request: LlmRequest, stream: bool
+    ) -> AsyncGenerator[LlmResponse, None]:
+        llm = _resolve_model(model)
+        if not pipeline_config.rate_limit_enabled:
+            async for llm_response in llm.generate_content_async(llm_request, stream):
+                yield llm_response
+            return
+
+        estimate = estimate_tokens(llm_request)
+        attempt = 0
+        while True:
+            await rate_limiter.acquire(model, estimate)
+            received = False
+            try:
+                async for llm_response in llm.generate_content_async(
+                    llm_request, stream
+                ):
+                    received = True
+                    usage = llm_response.usage_metadata
+                    if usage and usage.total_token_count and not llm_response.partial:
+                        await rate_limiter.settle(
+                            model, estimate, usage.total_token_count
+                        )
+                    yield llm_response
+                return
+            except Exception as e:
+                if (
+                    received
+                    or not is_rate_limited(e)
+                    or attempt >= pipeline_config.rate_limit_retries
+                ):
+                    raise
+                # Other processes back off as well until the delay is over
+                delay = backoff_delay(attempt)
+                await rate_limiter.penalize(model, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _hedged(
+        self, model: str, stage: str, llm_request: LlmRequest
+    ) -> list[LlmResponse]:
+        p90 = latency_tracker.quantile(stage, model)
+        primary = asyncio.create_task(
+            _collect(self._throttled(model, llm_request, False))
+        )
+        if p90 is None:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(p90, pipeline_config.hedge_min_delay)
+            )
+            # The hedge is best effort: it is only sent if quota is available.
+            if not done and await rate_limiter.try_acquire(
+                model, estimate_tokens(llm_request)
+            ):
+                logging.info(f"{stage}: {model} slower than p90 ({p90:.1f}s), hedging")
+                hedge_request = llm_request.model_copy(deep=True)
+                pending.add(
+                    asyncio.create_task(
+                        _collect(
+                            _resolve_model(model).generate_content_async(hedge_request)
+                        )
+                    )
+                )
+            error: BaseException | None = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+        finally:
+            for task in pending:
+                task.cancel()
+
+    # BaseLlm declares a plain connection, but the models (and the flows
+    # that use them) treat ``connect`` as an async context manager.
+    @asynccontextmanager
+    async def connect(  # type: ignore[override]
+        self, llm_request: LlmRequest
+    ) -> AsyncGenerator[BaseLlmConnection, None]:
+        """Opens a live connection on the resolved model."""
+        model = _resolve_model(llm_request.model or self.model)
+        connection = cast(
+            AbstractAsyncContextManager[BaseLlmConnection],
+            model.connect(llm_request),
+        )
+        async with connection as live:
+            yield live
+
+
+def current_deadline(state: State | Mapping[str, Any]) -> float | None:
+    """The deadline of the running stage, or else of the pipeline run."""
+    return state.get(STAGE_DEADLINE_KEY) or state.get(PIPELINE_DEADLINE_KEY)
+
+
+def select_model(stage: str, model: str, deadline: float | None) -> str:
+    """Falls back to a faster model when a stage is running out of time.
+
+    Args:
+        stage: Name of the calling agent.
+        model: The model the stage is configured with.
+        deadline: Absolute deadline of the stage, if any.
+
+    Returns:
+        ``model``, or its fallback when the remaining budget is lower than
+        the p90 latency of the stage on ``model``.
+    """
+    fallback = pipeline_config.fallback_models.get(model)
+    if deadline is None or not fallback:
+        return model
+    remaining = deadline - time.time()
+    expected = (
+        latency_tracker.quantile(stage, model) or pipeline_config.expected_latency
+    )
+    if remaining >= expected:
+        return model
+    logging.info(
+        f"{stage}: {remaining:.0f}s left but {model} takes {expected:.0f}s, "
+        f"falling back to {fallback}"
+    )
+    return fallback
+
+
+def deadline_model_callback(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> LlmResponse | None:
+    """``before_model_callback`` that applies ``select_model`` to a request."""
+    llm_request.model = select_model(
+        callback_context.agent_name,
+        llm_request.model or "",
+        current_deadline(callback_context.state),
+    )
+    return None
+
+
+def route_model(
+    stage: str, model: str, signals: ComplexitySignals, output_tokens: int = 0
+) -> str:
+    """Picks the worker or critic model for a call by input complexity.
+
+    Calls configured with either model of ``ResearchConfiguration`` go to
+    the critic model only when their complexity score reaches the routing
+    threshold and the critic fits the per-call latency and cost budget.
+    Other models are left unchanged.
+
+    Args:
+        stage: Name of the calling agent.
+        model: The model the stage is configured with.
+        signals: Complexity signals of the call input.
+        output_tokens: Expected output tokens, for the cost estimate.
+
+    Returns:
+        The model to call.
+    """
+    strong, fast = model_tiers.critic_model, model_tiers.worker_model
+    if not pipeline_config.model_routing or model not in (strong, fast):
+        return model
+    score = complexity_score(
+        signals,
+        ComplexityScale(
+            input_tokens=pipeline_config.routing_input_tokens,
+            stories=pipeline_config.routing_story_count,
+            gaps=pipeline_config.routing_gap_count,
+        ),
+    )
+    prices = pipeline_config.model_prices.get(strong)
+    decision = choose_tier(
+        score,
+        strong,
+        fast,
+        threshold=pipeline_config.routing_threshold,
+        strong_latency=latency_tracker.quantile(stage, strong)
+        or pipeline_config.expected_latency,
+        strong_cost=(
+            call_cost(
+                prices, signals.input_tokens, output_tokens or _DEFAULT_OUTPUT_TOKENS
+            )
+            if prices
+            else None
+        ),
+        latency_budget=pipeline_config.call_latency_budget,
+        cost_budget=pipeline_config.call_cost_budget,
+    )
+    logging.info(
+        f"{stage}: complexity {decision.score:.2f} ({signals.input_tokens} tokens, "
+        f"{signals.stories} stories, {signals.gaps} gaps), {decision.reason} "
+        f"-> {decision.model}"
+    )
+    return decision.model
+
+
+def route_model_callback(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> LlmResponse | None:
+    """``before_model_callback`` that applies ``route_model`` to a request.
+
+    The story count and open checklist gaps are read from session state.
+    """
+    state = callback_context.state
+    stories = state.get("stories_and_criteria")
+    if isinstance(stories, dict):
+        stories = stories.get("stories")
+    signals = ComplexitySignals(
+        input_tokens=_input_tokens(llm_request),
+        stories=len(stories) if isinstance(stories, list) else 0,
+        gaps=len(pending_elements(state.get("missing_elements"))),
+    )
+    llm_request.model = route_model(
+        callback_context.agent_name,
+        llm_request.model or "",
+        signals,
+        _output_tokens(llm_request),
+    )
+    return None
+
+
+def pipeline_model(model: str) -> BaseLlm:
+    """The model of a pipeline stage, e.g. ``pipeline_model("gemini-2.5-pro")``."""
+    return PipelineLlm(model=model)
+
+
+def stage_model_callbacks(cached: bool = True) -> dict[str, Any]:
+    """Model callbacks of a pipeline stage.
+
+    The model tier is routed by input complexity and checked against the
+    stage deadline first, then the request is served from the LLM cache when
+    ``cached`` and the cache is enabled.
+    """
+    callbacks: dict[str, Any] = {
+        "before_model_callback": [route_model_callback, deadline_model_callback]
+    }
+    if cached and pipeline_config.llm_cache_enabled:
+        callbacks["before_model_callback"].append(llm_cache.before_model_callback)
+        callbacks["after_model_callback"] = llm_cache.after_model_callback
+    return callbacks
+
+
+def response_text(content: types.Content) -> str:
+    """The answer text of a model response, without its thought parts."""
+    return "".join(
+        part.text for part in content.parts or [] if part.text and not part.thought
+    )
+
+
+async def generate_text(
+    model: str,
+    instruction: str,
+    agent_name: str,
+    config: types.GenerateContentConfig | None = None,
+    deadline: float | None = None,
+) -> str:
+    """Runs a single, self-contained model call outside of an LlmAgent.
+
+    Deterministic stages use this for small worker calls (one story, one
+    section...). Requests are built the way an ``LlmAgent`` without history
+    builds them, so they share the LLM cache with the agents.
+
+    Args:
+        model: Name of the model to call.
+        instruction: The fully rendered instruction.
+        agent_name: Name the call is attributed to in labels and cache keys.
+        config: Optional generation config.
+        deadline: Absolute deadline of the calling stage, if any.
+
+    Returns:
+        The text of the final response.
+    """
+    model = route_model(
+        agent_name, model, ComplexitySignals(input_tokens=len(instruction) // 4)
+    )
+    model = select_model(agent_name, model, deadline)
+    config = config.model_copy() if config else types.GenerateContentConfig()
+    config.system_instruction = instruction
+    config.labels = {**(config.labels or {}), AGENT_NAME_LABEL: agent_name}
+
+    key = make_cache_key(agent_name, model, instruction, config)
+    if pipeline_config.llm_cache_enabled:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return response_text(types.Content.model_validate(cached))
+
+    llm_request = LlmRequest(model=model, config=config)
+    llm = pipeline_model(model)
+    final = None
+    async for llm_response in llm.generate_content_async(llm_request):
+        if not llm_response.partial:
+            final = llm_response
+    if final is None or final.content is None or final.error_code:
+        error = final.error_message if final else "no response"
+        raise RuntimeError(f"{agent_name} call to {model} failed: {error}")
+
+    if pipeline_config.llm_cache_enabled:
+        llm_cache.put(key, final.content.model_dump(mode="json", exclude_none=True))
+    return response_text(final.content)
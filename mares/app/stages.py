@@ -0,0 +1,1579 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Custom (non-LlmAgent) stages of the MARES pipeline."""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections.abc import AsyncGenerator, Iterable, Mapping
+from typing import Any
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.run_config import StreamingMode
+from google.adk.events import Event, EventActions
+from google.adk.sessions.state import State
+from google.genai import types
+from pydantic import ValidationError
+
+from .config import pipeline_config
+from .llm import (
+    PIPELINE_DEADLINE_KEY,
+    STAGE_DEADLINE_KEY,
+    current_deadline,
+    generate_text,
+)
+from .utils.brief_index import BriefIndex
+from .utils.checkpoints import session_scope
+from .utils.digest import (
+    PromptBudgetError,
+    build_digest,
+    chunk_digest,
+    count_tokens,
+    fill_prompt,
+    load_digest,
+    render_digest,
+    render_outline,
+)
+from .utils.estimation_index import EstimationIndex
+from .utils.readiness import (
+    DOR_DIMENSIONS,
+    assess_readiness,
+    reduce_chunk_analyses,
+    render_checklist,
+    weak_dimensions,
+)
+from .utils.refinement import NOTHING_MISSING, merge_findings
+from .utils.report import assemble_report, estimation_metrics, render_metrics
+from .utils.speculation import (
+    RegenerationPlan,
+    diff_digests,
+    plan_regeneration,
+    speculator,
+)
+from .utils.stories import (
+    balance_slices,
+    collapse_duplicates,
+    compact_stories,
+    compact_story,
+    complete_story_objects,
+    load_estimations,
+    load_story_artifacts,
+    merge_story_artifacts,
+    render_duplicates,
+    revise_story_artifacts,
+    select_anchors,
+    story_clusters,
+)
+from .utils.typing import (
+    BriefDigest,
+    ChunkAnalysis,
+    EpicPlan,
+    EstimationRow,
+    Estimations,
+    ReportNarrative,
+    StoryArtifacts,
+    UserStory,
+)
+from .utils.validation import estimation_problems, row_problems, story_problems
+
+# Past estimates, reused for similar stories.
+estimation_index = EstimationIndex(pipeline_config.estimation_index_path)
+# Validated briefs, reused as a warm start for similar briefs.
+brief_index = BriefIndex(pipeline_config.brief_index_path)
+
+# State keys a validated brief is reused with.
+REUSED_BRIEF_KEYS = [
+    "missing_elements",
+    "validated_brief",
+    "stories_digest",
+    "stories_and_criteria",
+    "estimations",
+]
+# App name and user id the brief of the session is indexed under.
+BRIEF_SCOPE_KEY = "brief_scope"
+# Warm start from a similar brief, applied once the user accepts it.
+WARM_START_OFFER_KEY = "warm_start_offer"
+# Replies accepting a warm start offer.
+_ACCEPT_REPLIES = {"y", "yes", "ok", "okay", "sure", "reuse"}
+# Worker calls per story before it is left unestimated.
+_ESTIMATE_ATTEMPTS = 2
+
+
+def state_event(
+    agent: BaseAgent,
+    ctx: InvocationContext,
+    state_delta: dict[str, Any],
+    text: str | None = None,
+    **actions: Any,
+) -> Event:
+    """Builds an event that commits ``state_delta`` to the session.
+
+    Extra keyword arguments (``escalate``, ``transfer_to_agent``...) are set
+    on the event actions.
+    """
+    content = None
+    if text:
+        content = types.Content(role="model", parts=[types.Part(text=text)])
+    return Event(
+        invocation_id=ctx.invocation_id,
+        author=agent.name,
+        branch=ctx.branch,
+        content=content,
+        actions=EventActions(state_delta=state_delta, **actions),
+    )
+
+
+def user_text(ctx: InvocationContext) -> str:
+    """Text of the user message that started the invocation."""
+    if not ctx.user_content or not ctx.user_content.parts:
+        return ""
+    # Attachments extracted by the frontend arrive as separate text parts.
+    texts = [part.text for part in ctx.user_content.parts if part.text]
+    return "\n\n".join(texts).strip()
+
+
+def require_analysis_complete(
+    callback_context: CallbackContext,
+) -> types.Content | None:
+    """``before_agent_callback`` that skips a stage until the brief is validated."""
+    if callback_context.state.get("analysis_complete"):
+        return None
+    return types.Content(role="model", parts=[])
+
+
+def start_pipeline_deadline(callback_context: CallbackContext) -> None:
+    """``before_agent_callback`` that starts the time budget of a pipeline run."""
+    if pipeline_config.pipeline_deadline > 0:
+        callback_context.state[PIPELINE_DEADLINE_KEY] = (
+            time.time() + pipeline_config.pipeline_deadline
+        )
+    return None
+
+
+def start_stage_deadline(callback_context: CallbackContext) -> None:
+    """``before_agent_callback`` that starts the time budget of a stage.
+
+    The stage deadline never extends past the pipeline deadline. Stages
+    without a budget of their own run against the pipeline deadline.
+    """
+    state = callback_context.state
+    deadline = state.get(PIPELINE_DEADLINE_KEY)
+    budget = pipeline_config.stage_deadlines.get(callback_context.agent_name)
+    if budget:
+        deadline = min(filter(None, (deadline, time.time() + budget)))
+    state[STAGE_DEADLINE_KEY] = deadline
+    return None
+
+
+def readiness_precheck(callback_context: CallbackContext) -> types.Content | None:
+    """``before_agent_callback`` of the BusinessAnalyst that scores the
+    Definition-of-Ready areas of `project_brief` locally into `dor_scores`.
+
+    When every area clearly passes, the brief is marked complete and the
+    analyst is skipped.
+    """
+    state = callback_context.state
+    scores = assess_readiness(str(state.get("project_brief", "")))
+    state["dor_scores"] = scores
+    weak = weak_dimensions(scores, pipeline_config.dor_pass_threshold)
+    logging.info(f"Definition-of-Ready pre-check: {scores}")
+    if weak:
+        return None
+    state["missing_elements"] = NOTHING_MISSING
+    return types.Content(
+        role="model",
+        parts=[
+            types.Part(text="✅ All Definition-of-Ready areas pass the local check")
+        ],
+    )
+
+
+def changed_sections(state: State | Mapping[str, Any]) -> list[str] | None:
+    """IDs of the sections of `project_brief` that differ from the validated
+    brief it was warm-started from (`warm_digest`), or None when the whole
+    brief is to be analysed: without a warm start, or when sections were
+    removed."""
+    if not state.get("warm_digest"):
+        return None
+    diff = diff_digests(
+        load_digest(state["warm_digest"]),
+        build_digest(str(state.get("project_brief", ""))),
+    )
+    return None if diff.removed else diff.affected
+
+
+def analysis_digest(state: Mapping[str, Any]) -> BriefDigest:
+    """The digest of the sections of `project_brief` the BusinessAnalyst
+    checks."""
+    digest = build_digest(str(state.get("project_brief", "")))
+    changed = changed_sections(state)
+    if changed is None:
+        return digest
+    return BriefDigest(
+        sections=[section for section in digest.sections if section.id in changed]
+    )
+
+
+def skip_reused_analysis(callback_context: CallbackContext) -> types.Content | None:
+    """``before_agent_callback`` of the BusinessAnalyst that skips it when
+    `project_brief` is the warm-started brief unchanged, whose reused
+    `missing_elements` are in state."""
+    if changed_sections(callback_context.state) != []:
+        return None
+    return types.Content(
+        role="model",
+        parts=[types.Part(text="♻️ Brief validated before, analysis reused")],
+    )
+
+
+def finding_key(dimension: str) -> str:
+    """State key holding the missing elements found for one checklist area."""
+    return f"dor_finding_{dimension}"
+
+
+def skip_passed_dimension(dimension: str) -> Any:
+    """Builds a ``before_agent_callback`` that skips the analyst of a
+    checklist area that passed the local pre-check."""
+
+    def callback(callback_context: CallbackContext) -> types.Content | None:
+        scores = callback_context.state.get("dor_scores") or {}
+        if scores.get(dimension, 0.0) < pipeline_config.dor_pass_threshold:
+            return None
+        callback_context.state[finding_key(dimension)] = NOTHING_MISSING
+        return types.Content(role="model", parts=[])
+
+    return callback
+
+
+def add_agent_callbacks(
+    agent: BaseAgent, before: Any = None, after: Any = None
+) -> None:
+    """Appends agent callbacks to the ones ``agent`` already has."""
+    for field, callback in (
+        ("before_agent_callback", before),
+        ("after_agent_callback", after),
+    ):
+        if callback is None:
+            continue
+        existing = getattr(agent, field)
+        if existing is None:
+            existing = []
+        elif not isinstance(existing, list):
+            existing = [existing]
+        setattr(agent, field, [*existing, callback])
+
+
+def slice_key(slot: int) -> str:
+    """State key holding the epics assigned to ProductOwner worker ``slot``."""
+    return f"product_owner_slice_{slot}"
+
+
+def slice_output_key(slot: int) -> str:
+    """State key holding the output of ProductOwner worker ``slot``."""
+    return f"product_owner_output_{slot}"
+
+
+def skip_unassigned_slice(slot: int) -> Any:
+    """Builds a ``before_agent_callback`` that skips a worker with no epics."""
+
+    def callback(callback_context: CallbackContext) -> types.Content | None:
+        if callback_context.state.get(slice_key(slot)):
+            return None
+        callback_context.state[slice_output_key(slot)] = ""
+        return types.Content(role="model", parts=[])
+
+    return callback
+
+
+def prompt_budget(stage: str) -> int:
+    """Token budget of the prompt of ``stage``, 0 for none or when budgets
+    are not enforced."""
+    if not pipeline_config.prompt_budgets_enforced:
+        return 0
+    return pipeline_config.prompt_budgets.get(stage, 0)
+
+
+def validated_digest(state: State | Mapping[str, Any]) -> BriefDigest:
+    """The digest of the validated brief, built on the fly when the
+    BriefCompactor has not run (e.g. in a standalone stage)."""
+    if state.get("brief_digest"):
+        return load_digest(state["brief_digest"])
+    return build_digest(str(state.get("validated_brief", "")))
+
+
+def stories_to_estimate(state: Mapping[str, Any]) -> StoryArtifacts:
+    """The stories of `stories_and_criteria` the AgileCoach estimates: all of
+    them but the near-duplicates in `story_clusters`, and only those listed
+    in `estimation_scope` when set."""
+    artifacts = collapse_duplicates(
+        load_story_artifacts(state.get("stories_and_criteria")),
+        state.get("story_clusters") or {},
+    )
+    scope = state.get("estimation_scope")
+    if scope is None:
+        return artifacts
+    ids = set(scope)
+    return artifacts.model_copy(
+        update={"stories": [story for story in artifacts.stories if story.id in ids]}
+    )
+
+
+def record_estimations(callback_context: CallbackContext) -> None:
+    """Adds the stories of the run the AgileCoach estimated to the estimation
+    index; the near-duplicates that copied a row are left out."""
+    state = callback_context.state
+    copies = {
+        member
+        for members in (state.get("story_clusters") or {}).values()
+        for member in members
+    }
+    try:
+        estimation_index.add(
+            load_story_artifacts(state.get("stories_and_criteria")).stories,
+            [
+                row
+                for row in load_estimations(state.get("estimations")).rows
+                if row.story_id not in copies
+            ],
+        )
+    except sqlite3.Error as e:
+        logging.warning(f"Recording the estimations failed: {e}")
+    return None
+
+
+def record_brief(callback_context: CallbackContext) -> None:
+    """Adds the submitted brief of the run, with the state it was validated
+    and decomposed into, to the brief index of its app and user."""
+    state = callback_context.state
+    scope = state.get(BRIEF_SCOPE_KEY)
+    if not scope or not state.get("submitted_brief") or not state.get("estimations"):
+        return None
+    outputs = {key: state.get(key) for key in REUSED_BRIEF_KEYS}
+    if not outputs["stories_digest"]:
+        outputs["stories_digest"] = validated_digest(state).model_dump()
+    try:
+        brief_index.add(state["submitted_brief"], outputs, **scope)
+    except sqlite3.Error as e:
+        logging.warning(f"Recording the validated brief failed: {e}")
+    return None
+
+
+def accepts_warm_start(message: str) -> bool:
+    """Whether a reply to a warm start offer accepts it."""
+    return message.strip().strip(".!").lower() in _ACCEPT_REPLIES
+
+
+def await_warm_start_answer(callback_context: CallbackContext) -> types.Content | None:
+    """``before_agent_callback`` that skips a stage while a warm start offer
+    waits for the user's answer."""
+    if not callback_context.state.get(WARM_START_OFFER_KEY):
+        return None
+    return types.Content(role="model", parts=[])
+
+
+class BriefReuseAgent(BaseAgent):
+    """Offers to warm-start a new `project_brief` from the most similar brief
+    the same user validated before in the same app.
+
+    Nothing is applied until the user accepts: the warm start is kept in
+    `warm_start_offer`, and the analysis waits for the answer (see
+    ``await_warm_start_answer``). Once accepted, the refinements of the
+    similar brief are carried over to the new one, and its missing elements,
+    stories and estimates are put in state. The BusinessAnalyst then only
+    checks the sections that differ from the validated brief, and the
+    development stages only write and estimate the stories of those
+    sections.
+    """
+
+    threshold: float
+    reuse_stories: bool = True
+    """Offer the stories and estimates too, for the incremental development
+    stage to patch."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Look up a freshly submitted brief in the brief index."""
+        state = ctx.session.state
+        brief = str(state.get("project_brief", ""))
+        if (
+            not brief
+            or brief != state.get("submitted_brief")
+            or brief != state.get("brief_message")
+        ):
+            # A refinement answer, or the reply to a warm start offer
+            return
+        scope = {"app_name": ctx.session.app_name, "user_id": ctx.session.user_id}
+        try:
+            match = brief_index.lookup(brief, self.threshold, **scope)
+        except sqlite3.Error as e:
+            logging.warning(f"Reading the brief index failed: {e}")
+            match = None
+        validated = str(match.outputs.get("validated_brief") or "") if match else ""
+        submitted = match.brief.rstrip() if match else ""
+        if not validated.startswith(submitted):
+            # Only refinements appended to the submitted brief can be carried over
+            match = None
+        if match is None:
+            yield state_event(self, ctx, {BRIEF_SCOPE_KEY: scope, "warm_digest": None})
+            return
+
+        refinements = validated[len(submitted) :]
+        warm_brief = brief.rstrip() + refinements
+        warm_digest = build_digest(validated)
+        offer = {
+            "project_brief": warm_brief,
+            "warm_digest": warm_digest.model_dump(),
+            "missing_elements": match.outputs.get("missing_elements"),
+        }
+        if self.reuse_stories:
+            offer.update(
+                (key, match.outputs.get(key))
+                for key in ["stories_digest", "stories_and_criteria", "estimations"]
+            )
+        diff = diff_digests(warm_digest, build_digest(warm_brief))
+        carried = (
+            "its refinements, stories and estimates"
+            if self.reuse_stories
+            else "its refinements"
+        )
+        yield state_event(
+            self,
+            ctx,
+            {
+                BRIEF_SCOPE_KEY: scope,
+                "warm_digest": None,
+                WARM_START_OFFER_KEY: offer,
+                "analysis_complete": False,
+            },
+            f"♻️ You validated a similar brief before ({match.similarity:.0%} "
+            f"similar, {len(diff.affected) + len(diff.removed)} of "
+            f"{len(warm_digest.sections)} sections differ). Reply **yes** to "
+            f"carry over {carried}, or anything else to analyse this brief "
+            f"from scratch.\n\nRefinements of the similar brief:\n"
+            f"{refinements.strip() or '(none)'}",
+        )
+
+
+class BriefCompactionAgent(BaseAgent):
+    """Compacts `validated_brief` into the sectioned `brief_digest`.
+
+    Downstream stages prompt with the digest instead of the full brief.
+    """
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Write the digest of the validated brief to `brief_digest`."""
+        brief = str(ctx.session.state.get("validated_brief", ""))
+        digest = build_digest(brief)
+        compacted = count_tokens(render_digest(digest))
+        yield state_event(
+            self,
+            ctx,
+            {"brief_digest": digest.model_dump()},
+            f"🗜️ Compacted the brief from {count_tokens(brief)} to {compacted} "
+            f"tokens in {len(digest.sections)} sections",
+        )
+
+
+class FindingsMergeAgent(BaseAgent):
+    """Merges the per-area analyst findings into `missing_elements`."""
+
+    dimensions: list[str]
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Deduplicate the findings, in checklist order."""
+        findings = [
+            ctx.session.state.get(finding_key(dimension))
+            for dimension in self.dimensions
+        ]
+        yield state_event(self, ctx, {"missing_elements": merge_findings(findings)})
+
+
+class MapReduceAgent(BaseAgent):
+    """Base of the stages that process large briefs chunk by chunk.
+
+    Briefs below ``min_tokens`` are handled by the wrapped single-pass
+    ``stage``, unless their digest does not fit its prompt budget. Larger
+    briefs are split into chunks of about ``chunk_tokens``, mapped with
+    concurrent model calls and reduced locally, so that latency follows the
+    largest chunk rather than the whole brief. When a chunk call fails, the
+    brief is handled by ``stage`` as a whole instead.
+    """
+
+    stage: BaseAgent
+    model: str
+    instruction: str
+    """Chunk prompt with `{brief}` (the chunk) and `{outline}` placeholders."""
+    brief_key: str
+    """State key of the brief the stage processes."""
+    min_tokens: int
+    chunk_tokens: int
+    max_concurrency: int = 8
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(sub_agents=[data["stage"]], **data)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Process large briefs per chunk, others in a single pass."""
+        brief = str(ctx.session.state.get(self.brief_key, ""))
+        if count_tokens(brief) < self.min_tokens:
+            try:
+                async for event in self.stage.run_async(ctx):
+                    yield event
+                return
+            except PromptBudgetError as e:
+                # Raised while the stage builds its prompt, before any event.
+                logging.info(f"{self.stage.name}: {e}, mapping it in chunks")
+        async for event in self._run_chunked(ctx):
+            yield event
+
+    def _run_chunked(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        """Processes the brief chunk by chunk."""
+        raise NotImplementedError
+
+    async def _map(
+        self,
+        chunks: list[BriefDigest],
+        outline: str,
+        schema: type[Any],
+        **values: Any,
+    ) -> list[Any]:
+        """Runs the chunk prompt on every chunk concurrently."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(chunk: BriefDigest) -> Any:
+            async with semaphore:
+                reply = await generate_text(
+                    model=self.model,
+                    instruction=self.instruction.format(
+                        brief=render_digest(chunk), outline=outline, **values
+                    ),
+                    agent_name=f"{self.name}Worker",
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        response_schema=schema,
+                    ),
+                )
+            return schema.model_validate_json(reply)
+
+        return await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+
+class MapReduceAnalysisAgent(MapReduceAgent):
+    """Checks a large `project_brief` against the Definition of Ready chunk
+    by chunk and merges the findings into `missing_elements`."""
+
+    brief_key: str = "project_brief"
+
+    async def _run_chunked(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        """Analyse the brief per chunk."""
+        brief = str(ctx.session.state.get(self.brief_key, ""))
+        scores = assess_readiness(brief)
+        dimensions = list(DOR_DIMENSIONS)
+        if pipeline_config.dor_precheck:
+            dimensions = weak_dimensions(scores, pipeline_config.dor_pass_threshold)
+        if not dimensions:
+            yield state_event(
+                self,
+                ctx,
+                {"dor_scores": scores, "missing_elements": NOTHING_MISSING},
+                "✅ All Definition-of-Ready areas pass the local check",
+            )
+            return
+
+        digest = analysis_digest(ctx.session.state)
+        chunks = chunk_digest(digest, self.chunk_tokens)
+        try:
+            analyses = await self._map(
+                chunks,
+                render_outline(digest),
+                ChunkAnalysis,
+                checklist=render_checklist(dimensions, with_ids=True),
+            )
+        except Exception as e:
+            logging.warning(f"Analysing the brief in chunks failed: {e}")
+            async for event in self.stage.run_async(ctx):
+                yield event
+            return
+        yield state_event(
+            self,
+            ctx,
+            {
+                "dor_scores": scores,
+                "missing_elements": reduce_chunk_analyses(analyses, dimensions),
+            },
+            f"🗂️ Analysed the brief in {len(chunks)} chunks",
+        )
+
+
+class MapReduceDecompositionAgent(MapReduceAgent):
+    """Decomposes a large `validated_brief` into user stories chunk by chunk
+    and merges them into `stories_and_criteria`."""
+
+    brief_key: str = "validated_brief"
+
+    async def _run_chunked(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        """Decompose the brief per chunk."""
+        digest = validated_digest(ctx.session.state)
+        chunks = chunk_digest(digest, self.chunk_tokens)
+        try:
+            documents = await self._map(chunks, render_outline(digest), StoryArtifacts)
+        except Exception as e:
+            logging.warning(f"Decomposing the brief in chunks failed: {e}")
+            async for event in self.stage.run_async(ctx):
+                yield event
+            return
+        merged = merge_story_artifacts(documents)
+        yield state_event(
+            self,
+            ctx,
+            {"stories_and_criteria": merged.model_dump()},
+            f"🗂️ Decomposed the brief in {len(chunks)} chunks into "
+            f"{len(merged.stories)} user stories",
+        )
+
+
+class EpicPartitionAgent(BaseAgent):
+    """Distributes the planned epics over the ProductOwner worker slots."""
+
+    workers: int
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Write one balanced slice of epics per worker slot."""
+        plan = EpicPlan.model_validate(
+            ctx.session.state.get("epic_plan") or {"epics": []}
+        )
+        items = [
+            f"### {epic.name}\nActors: {', '.join(epic.actors) or 'n/a'}\n{epic.summary}"
+            for epic in plan.epics
+        ]
+        # Without a usable plan, a single worker covers the whole brief.
+        slices = balance_slices(items, self.workers) or [
+            ["All requirements of the brief."]
+        ]
+        state_delta = {
+            slice_key(slot): "\n\n".join(slices[slot]) if slot < len(slices) else ""
+            for slot in range(self.workers)
+        }
+        yield state_event(
+            self,
+            ctx,
+            state_delta,
+            f"🧩 Split the brief into {len(items)} epics across {len(slices)} ProductOwner workers",
+        )
+
+
+class StoryMergeAgent(BaseAgent):
+    """Merges the ProductOwner worker outputs into `stories_and_criteria`."""
+
+    workers: int
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Renumber the worker stories and write a single set of artifacts."""
+        documents = [
+            load_story_artifacts(ctx.session.state.get(slice_output_key(slot)))
+            for slot in range(self.workers)
+        ]
+        merged = merge_story_artifacts(documents)
+        yield state_event(self, ctx, {"stories_and_criteria": merged.model_dump()})
+
+
+def _streamed_stories(partial_json: str) -> list[UserStory]:
+    """The valid user stories that are complete in the streamed output."""
+    stories = []
+    for story in complete_story_objects(partial_json):
+        try:
+            stories.append(UserStory.model_validate(story))
+        except ValidationError:
+            continue
+    return stories
+
+
+def estimation_state(
+    stories: list[UserStory], rows: Iterable[EstimationRow | None]
+) -> dict[str, Any]:
+    """State delta of the estimates of ``stories``.
+
+    The rows go to `estimations` in story order; the ids of the stories left
+    without a row go to `unestimated`, so that the report lists them.
+    """
+    estimated = {row.story_id: row for row in rows if row is not None}
+    return {
+        "estimations": Estimations(
+            rows=[estimated[s.id] for s in stories if s.id in estimated]
+        ).model_dump(),
+        "unestimated": [s.id for s in stories if s.id not in estimated],
+    }
+
+
+async def estimate_story(
+    model: str,
+    instruction: str,
+    agent_name: str,
+    story: UserStory,
+    semaphore: asyncio.Semaphore,
+    deadline: float | None = None,
+) -> EstimationRow | None:
+    """Estimates a single user story with a worker call.
+
+    A failed call, or a reply that is not an estimation row, is retried
+    once.
+
+    Args:
+        model: Name of the estimator model.
+        instruction: Single-story estimation prompt, with a `{story}`
+            placeholder.
+        agent_name: Name the call is attributed to.
+        story: The user story.
+        semaphore: Bounds the number of concurrent estimator calls.
+        deadline: Absolute deadline of the calling stage, if any.
+
+    Returns:
+        The estimation row, reused from a similar past story when there is
+        one; None when the retried call failed as well, so that the story
+        is left unestimated.
+    """
+    if pipeline_config.estimation_reuse:
+        try:
+            reused = estimation_index.lookup(
+                [story], pipeline_config.estimation_reuse_threshold
+            )
+        except sqlite3.Error as e:
+            logging.warning(f"Reading the estimation index failed: {e}")
+            reused = {}
+        if reused:
+            return reused[story.id]
+    async with semaphore:
+        for attempt in range(_ESTIMATE_ATTEMPTS):
+            try:
+                reply = await generate_text(
+                    model=model,
+                    instruction=instruction.format(story=compact_story(story)),
+                    agent_name=agent_name,
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        response_schema=EstimationRow,
+                    ),
+                    deadline=deadline,
+                )
+                row = EstimationRow.model_validate_json(reply)
+                return row.model_copy(update={"story_id": story.id})
+            except Exception as e:
+                logging.warning(
+                    f"Estimating {story.id} failed (attempt {attempt + 1} of "
+                    f"{_ESTIMATE_ATTEMPTS}): {e}"
+                )
+    return None
+
+
+class StreamingEstimationAgent(BaseAgent):
+    """Runs the ProductOwner and estimates its stories while it is writing.
+
+    The ProductOwner output is streamed; as soon as a story object is
+    complete it is handed to an estimator worker, so that estimation overlaps
+    with story writing. The per-story rows are assembled into `estimations`
+    once both are done.
+    """
+
+    product_owner: LlmAgent
+    estimator_model: str
+    estimator_instruction: str
+    """Single-story estimation prompt, with a `{story}` placeholder."""
+    max_concurrency: int = 4
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(sub_agents=[data["product_owner"]], **data)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Stream the ProductOwner and fan its stories out to estimators."""
+        run_config = ctx.run_config.model_copy() if ctx.run_config else None
+        stream_ctx = ctx
+        if run_config is not None:
+            client_streams = run_config.streaming_mode == StreamingMode.SSE
+            run_config.streaming_mode = StreamingMode.SSE
+            stream_ctx = ctx.model_copy(update={"run_config": run_config})
+        else:
+            client_streams = False
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        deadline = current_deadline(ctx.session.state)
+        tasks: dict[str, asyncio.Task[EstimationRow | None]] = {}
+        text = ""
+
+        def dispatch(stories: list[UserStory]) -> None:
+            for story in stories:
+                if story.id not in tasks:
+                    tasks[story.id] = asyncio.create_task(
+                        estimate_story(
+                            self.estimator_model,
+                            self.estimator_instruction,
+                            f"{self.name}Worker",
+                            story,
+                            semaphore,
+                            deadline,
+                        )
+                    )
+
+        try:
+            async for event in self.product_owner.run_async(stream_ctx):
+                if event.partial:
+                    if event.content and event.content.parts:
+                        text += "".join(
+                            part.text or ""
+                            for part in event.content.parts
+                            if not part.thought
+                        )
+                        dispatch(_streamed_stories(text))
+                    if client_streams:
+                        yield event
+                    continue
+                yield event
+            # The final, non-partial response supersedes the streamed chunks.
+            artifacts = load_story_artifacts(
+                ctx.session.state.get(self.product_owner.output_key or "") or text
+            )
+            dispatch(artifacts.stories)
+            rows = await asyncio.gather(
+                *(tasks[story.id] for story in artifacts.stories)
+            )
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        yield state_event(self, ctx, estimation_state(artifacts.stories, rows))
+
+
+class ShardedEstimationAgent(BaseAgent):
+    """Estimates `stories_and_criteria` in concurrent shards.
+
+    A few anchor stories, selected locally across the range of story sizes,
+    are estimated first. The other stories are split into shards of
+    ``shard_size`` estimated concurrently, every shard sized against the
+    same anchors so that points stay consistent between shards, and the
+    rows are merged into one `estimations` table. Up to ``shard_size``
+    stories are estimated by the wrapped single-pass ``stage``.
+    """
+
+    stage: BaseAgent
+    model: str
+    instruction: str
+    """Shard prompt with `{anchors}` (the estimated anchor stories) and
+    `{stories}` placeholders."""
+    story_instruction: str
+    """Single-story estimation prompt, with a `{story}` placeholder, for the
+    stories a shard left out."""
+    shard_size: int
+    anchor_count: int = 3
+    max_concurrency: int = 4
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(sub_agents=[data["stage"]], **data)
+
+    async def _estimate_shard(
+        self,
+        stories: list[UserStory],
+        anchors: str,
+        semaphore: asyncio.Semaphore,
+        deadline: float | None,
+    ) -> list[EstimationRow]:
+        async with semaphore:
+            try:
+                reply = await generate_text(
+                    model=self.model,
+                    instruction=self.instruction.format(
+                        anchors=anchors,
+                        stories=compact_stories(StoryArtifacts(stories=stories)),
+                    ),
+                    agent_name=f"{self.name}Worker",
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        response_schema=Estimations,
+                    ),
+                    deadline=deadline,
+                )
+                return Estimations.model_validate_json(reply).rows
+            except Exception as e:
+                logging.warning(
+                    f"Estimating a shard of {len(stories)} stories failed: {e}"
+                )
+                return []
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Estimate many stories in shards, few in a single pass."""
+        state = ctx.session.state
+        stories = stories_to_estimate(state).stories
+        if len(stories) <= self.shard_size:
+            async for event in self.stage.run_async(ctx):
+                yield event
+            return
+
+        deadline = current_deadline(state)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        anchors = select_anchors(stories, self.anchor_count)
+        anchor_ids = {story.id for story in anchors}
+        rows = {
+            row.story_id: row
+            for row in await self._estimate_shard(
+                anchors, "None, these stories are the reference", semaphore, deadline
+            )
+            if row.story_id in anchor_ids
+        }
+        reference = "\n".join(
+            f"{compact_story(story, criteria=False)} -> {rows[story.id].story_points} points"
+            for story in anchors
+            if story.id in rows
+        )
+        rest = [story for story in stories if story.id not in rows]
+        shards = [
+            rest[i : i + self.shard_size] for i in range(0, len(rest), self.shard_size)
+        ]
+        results = await asyncio.gather(
+            *(
+                self._estimate_shard(shard, reference or "None", semaphore, deadline)
+                for shard in shards
+            )
+        )
+        known = {story.id for story in stories}
+        rows.update(
+            (row.story_id, row)
+            for shard_rows in results
+            for row in shard_rows
+            if row.story_id in known and row.story_id not in rows
+        )
+        missing = [story for story in stories if story.id not in rows]
+        for row in await asyncio.gather(
+            *(
+                estimate_story(
+                    self.model,
+                    self.story_instruction,
+                    f"{self.name}Worker",
+                    story,
+                    semaphore,
+                    deadline,
+                )
+                for story in missing
+            )
+        ):
+            if row is not None:
+                rows[row.story_id] = row
+
+        yield state_event(
+            self,
+            ctx,
+            estimation_state(stories, rows.values()),
+            f"🧮 Estimated {len(stories)} user stories in {len(shards)} shards "
+            f"against {len(anchors)} anchor stories",
+        )
+
+
+class DuplicateCollapseAgent(BaseAgent):
+    """Estimates near-duplicate user stories once per cluster.
+
+    The stories of `stories_and_criteria` are clustered with MinHash/LSH
+    into `story_clusters`. The wrapped ``stage`` only estimates the first
+    story of every cluster, and its row is copied to the near-duplicates.
+    """
+
+    stage: BaseAgent
+    threshold: float
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(sub_agents=[data["stage"]], **data)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Cluster the stories, estimate them and expand the clusters."""
+        state = ctx.session.state
+        stories = load_story_artifacts(state.get("stories_and_criteria")).stories
+        clusters = story_clusters(stories, self.threshold)
+        yield state_event(self, ctx, {"story_clusters": clusters})
+        async for event in self.stage.run_async(ctx):
+            yield event
+        if not clusters:
+            return
+
+        rows = {
+            row.story_id: row for row in load_estimations(state.get("estimations")).rows
+        }
+        for story_id, members in clusters.items():
+            if story_id not in rows:
+                continue
+            row = rows[story_id]
+            for member in members:
+                rows[member] = row.model_copy(
+                    update={
+                        "story_id": member,
+                        "justification": f"Same as {story_id}: {row.justification}",
+                    }
+                )
+        duplicates = sum(len(members) for members in clusters.values())
+        yield state_event(
+            self,
+            ctx,
+            estimation_state(stories, rows.values()),
+            f"🧬 Estimated {duplicates} near-duplicate user stories with the "
+            f"{len(clusters)} stories they repeat",
+        )
+
+
+class EstimationReuseAgent(BaseAgent):
+    """Reuses past estimates of similar stories and only has the wrapped
+    ``stage`` estimate the novel ones.
+
+    Stories within the similarity threshold of a story in the estimation
+    index take its points and justification. The others are listed in
+    `estimation_scope` for the AgileCoach, and both sets of rows are merged
+    into one `estimations` table.
+    """
+
+    stage: BaseAgent
+    threshold: float
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(sub_agents=[data["stage"]], **data)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Reuse the known estimates, estimate the rest with the stage."""
+        state = ctx.session.state
+        stories = collapse_duplicates(
+            load_story_artifacts(state.get("stories_and_criteria")),
+            state.get("story_clusters") or {},
+        ).stories
+        try:
+            rows = estimation_index.lookup(stories, self.threshold)
+        except sqlite3.Error as e:
+            logging.warning(f"Reading the estimation index failed: {e}")
+            rows = {}
+        novel = [story.id for story in stories if story.id not in rows]
+        yield state_event(self, ctx, {"estimation_scope": novel if rows else None})
+        if not rows:
+            async for event in self.stage.run_async(ctx):
+                yield event
+            return
+
+        if novel:
+            async for event in self.stage.run_async(ctx):
+                yield event
+            estimated = load_estimations(state.get("estimations")).rows
+            rows.update(
+                (row.story_id, row) for row in estimated if row.story_id in novel
+            )
+        yield state_event(
+            self,
+            ctx,
+            {**estimation_state(stories, rows.values()), "estimation_scope": None},
+            f"♻️ Reused past estimates for {len(stories) - len(novel)} of "
+            f"{len(stories)} user stories",
+        )
+
+
+class IncrementalDevelopmentAgent(BaseAgent):
+    """Writes and estimates only the user stories of the changed brief
+    sections.
+
+    Every story records the brief sections it is derived from, and every
+    estimation row the story it estimates. When the validated brief changes
+    after the stories were written, the stories derived from changed or
+    removed sections are written and estimated again, stories are written for
+    the added sections, and all other stories and rows are reused verbatim.
+    The wrapped ``stages`` run when there is nothing to reuse, when some
+    stories do not record their sections or when most of the brief changed.
+    """
+
+    stages: list[BaseAgent]
+    product_owner_model: str
+    revision_instruction: str
+    """Prompt with `{outline}`, `{stories}`, `{outdated}` and `{brief}` (the
+    sections to write the stories of) placeholders, returning the new and
+    revised stories."""
+    estimator_model: str
+    estimator_instruction: str
+    """Single-story estimation prompt, with a `{story}` placeholder."""
+    max_concurrency: int = 4
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(sub_agents=data["stages"], **data)
+
+    async def _write_stories(
+        self, instruction: str, deadline: float | None = None
+    ) -> StoryArtifacts:
+        reply = await generate_text(
+            model=self.product_owner_model,
+            instruction=instruction,
+            agent_name=f"{self.name}ProductOwner",
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=StoryArtifacts,
+            ),
+            deadline=deadline,
+        )
+        return StoryArtifacts.model_validate_json(reply)
+
+    async def _estimate(
+        self, stories: list[UserStory], deadline: float | None = None
+    ) -> list[EstimationRow]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        rows = await asyncio.gather(
+            *(
+                estimate_story(
+                    self.estimator_model,
+                    self.estimator_instruction,
+                    f"{self.name}AgileCoach",
+                    story,
+                    semaphore,
+                    deadline,
+                )
+                for story in stories
+            )
+        )
+        return [row for row in rows if row is not None]
+
+    async def _previous(
+        self, ctx: InvocationContext
+    ) -> tuple[BriefDigest, StoryArtifacts, Estimations] | None:
+        """The stories and estimates to reuse, with the digest they were
+        written from."""
+        state = ctx.session.state
+        if not state.get("stories_digest"):
+            return None
+        return (
+            load_digest(state["stories_digest"]),
+            load_story_artifacts(state.get("stories_and_criteria")),
+            load_estimations(state.get("estimations")),
+        )
+
+    async def _revise(
+        self,
+        digest: BriefDigest,
+        plan: RegenerationPlan,
+        artifacts: StoryArtifacts,
+        estimations: Estimations,
+        deadline: float | None,
+    ) -> tuple[StoryArtifacts, Estimations, list[str]]:
+        """Writes the stories of the planned sections in place of the stale
+        ones, and estimates the stories without an estimate."""
+        revision = StoryArtifacts()
+        if plan.sections:
+            stale = set(plan.stale)
+            revision = await self._write_stories(
+                self.revision_instruction.format(
+                    outline=render_outline(digest),
+                    stories=compact_stories(
+                        StoryArtifacts(
+                            stories=[s for s in artifacts.stories if s.id not in stale]
+                        ),
+                        criteria=False,
+                    ),
+                    outdated=compact_stories(
+                        StoryArtifacts(
+                            stories=[s for s in artifacts.stories if s.id in stale]
+                        ),
+                        criteria=False,
+                    )
+                    or "None",
+                    brief=render_digest(
+                        BriefDigest(
+                            sections=[
+                                section
+                                for section in digest.sections
+                                if section.id in plan.sections
+                            ]
+                        )
+                    ),
+                ),
+                deadline,
+            )
+            # Without sections of their own, stories depend on all of them
+            revision.stories = [
+                story
+                if story.sections
+                else story.model_copy(update={"sections": plan.sections})
+                for story in revision.stories
+            ]
+        revised, touched = revise_story_artifacts(artifacts, revision)
+        revised.stories = [
+            story
+            for story in revised.stories
+            if story.id not in plan.stale or story.id in touched
+        ]
+        rows = {
+            row.story_id: row for row in estimations.rows if row.story_id not in touched
+        }
+        new_rows = await self._estimate(
+            [story for story in revised.stories if story.id not in rows], deadline
+        )
+        rows.update((row.story_id, row) for row in new_rows)
+        ordered = [rows[story.id] for story in revised.stories if story.id in rows]
+        return revised, Estimations(rows=ordered), touched
+
+    async def _run_stages(
+        self, ctx: InvocationContext, digest: BriefDigest
+    ) -> AsyncGenerator[Event, None]:
+        # Until the stages are done, the stories are not those of the digest
+        yield state_event(self, ctx, {"stories_digest": None})
+        for stage in self.stages:
+            async for event in stage.run_async(ctx):
+                yield event
+        yield state_event(self, ctx, {"stories_digest": digest.model_dump()})
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Reuse or patch the previous stories and estimates, or run the
+        stages."""
+        state = ctx.session.state
+        digest = validated_digest(state)
+        previous = await self._previous(ctx)
+        plan = None
+        if previous is not None:
+            plan = plan_regeneration(
+                diff_digests(previous[0], digest), digest, previous[1].stories
+            )
+        if plan is None or len(plan.sections) > (
+            pipeline_config.regeneration_max_share * len(digest.sections)
+        ):
+            async for event in self._run_stages(ctx, digest):
+                yield event
+            return
+
+        _, artifacts, estimations = previous
+        try:
+            artifacts, estimations, touched = await self._revise(
+                digest, plan, artifacts, estimations, current_deadline(state)
+            )
+        except Exception as e:
+            logging.warning(f"Revising the user stories failed: {e}")
+            async for event in self._run_stages(ctx, digest):
+                yield event
+            return
+        if plan.sections or plan.stale:
+            text = (
+                f"⚡ Reused {len(artifacts.stories) - len(touched)} user stories, "
+                f"{len(touched)} written for {len(plan.sections)} new or changed "
+                "brief sections"
+            )
+        else:
+            text = "⚡ Brief unchanged, user stories and estimates reused"
+        yield state_event(
+            self,
+            ctx,
+            {
+                "stories_and_criteria": artifacts.model_dump(),
+                **estimation_state(artifacts.stories, estimations.rows),
+                "stories_digest": digest.model_dump(),
+            },
+            text,
+        )
+
+
+class SpeculativeDevelopmentAgent(IncrementalDevelopmentAgent):
+    """Writes and estimates the user stories ahead of the brief validation.
+
+    While the user answers the last refinement questions, `speculate` runs
+    the ProductOwner and per-story estimation in the background on the
+    current brief. Once the brief is validated, the speculative result is
+    reused section by section like the stories of a previous run.
+    """
+
+    product_owner_instruction: str
+    """ProductOwner prompt with a `{brief}` placeholder."""
+    incremental: bool = True
+    """Reuse the stories of the previous run when nothing was speculated."""
+
+    async def _speculate(
+        self, brief: str
+    ) -> tuple[BriefDigest, StoryArtifacts, Estimations]:
+        digest = build_digest(brief)
+        artifacts = await self._write_stories(
+            fill_prompt(
+                self.product_owner_instruction, digest, prompt_budget("ProductOwner")
+            )
+        )
+        rows = await self._estimate(artifacts.stories)
+        return digest, artifacts, Estimations(rows=rows)
+
+    def speculate(self, ctx: InvocationContext) -> None:
+        """Starts the speculative run on the current `project_brief`, unless
+        one already runs on it."""
+        brief = str(ctx.session.state.get("project_brief", ""))
+        if ctx.session.state.get("warm_digest"):
+            # The warm-started stories are patched instead
+            return
+        if pipeline_config.map_reduce and (
+            count_tokens(brief) >= pipeline_config.map_reduce_tokens
+        ):
+            # Large briefs are decomposed chunk by chunk instead
+            return
+        speculator.start(
+            session_scope(ctx.session), brief, lambda: self._speculate(brief)
+        )
+
+    async def _previous(
+        self, ctx: InvocationContext
+    ) -> tuple[BriefDigest, StoryArtifacts, Estimations] | None:
+        """The speculative result, or else the stories of the previous run."""
+        speculation = speculator.take(session_scope(ctx.session))
+        if speculation is not None:
+            try:
+                return await speculation.task
+            except Exception as e:
+                logging.warning(f"Speculative run failed: {e!r}")
+        return await super()._previous(ctx) if self.incremental else None
+
+
+class OutputRepairAgent(BaseAgent):
+    """Checks the stories and estimates of the development stages locally
+    and re-asks only the ones that fail the checks.
+
+    Stories without well-formed Gherkin acceptance criteria are rewritten
+    one by one by the ProductOwner model. Those stories, and the stories
+    without exactly one estimate of Fibonacci points, are then estimated
+    again one by one. All other stories and rows are kept as the ``stages``
+    wrote them.
+    """
+
+    stages: list[BaseAgent]
+    product_owner_model: str
+    repair_instruction: str
+    """Single-story prompt with `{story}`, `{problems}` and `{brief}` (the
+    sections the story is derived from) placeholders, returning the
+    rewritten story."""
+    estimator_model: str
+    estimator_instruction: str
+    """Single-story estimation prompt, with a `{story}` placeholder."""
+    max_concurrency: int = 4
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(sub_agents=data["stages"], **data)
+
+    async def _repair_story(
+        self,
+        story: UserStory,
+        problems: list[str],
+        digest: BriefDigest,
+        semaphore: asyncio.Semaphore,
+        deadline: float | None,
+    ) -> UserStory:
+        """Has the ProductOwner rewrite one story; keeps the story when the
+        rewrite is not better."""
+        sections = [s for s in digest.sections if s.id in story.sections]
+        instruction = fill_prompt(
+            self.repair_instruction,
+            BriefDigest(sections=sections or digest.sections),
+            prompt_budget("ProductOwner"),
+            story=compact_story(story),
+            problems="\n".join(f"- {problem}" for problem in problems),
+        )
+        async with semaphore:
+            try:
+                reply = await generate_text(
+                    model=self.product_owner_model,
+                    instruction=instruction,
+                    agent_name=f"{self.name}ProductOwner",
+                    config=types.GenerateContentConfig(
+                        response_mime_type="application/json",
+                        response_schema=UserStory,
+                    ),
+                    deadline=deadline,
+                )
+                repaired = UserStory.model_validate_json(reply)
+            except Exception as e:
+                logging.warning(f"Repairing {story.id} failed: {e}")
+                return story
+        repaired = repaired.model_copy(
+            update={"id": story.id, "sections": repaired.sections or story.sections}
+        )
+        if len(story_problems(repaired)) >= len(problems):
+            return story
+        return repaired
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Run the stages, then re-ask the failing stories and rows."""
+        for stage in self.stages:
+            async for event in stage.run_async(ctx):
+                yield event
+        state = ctx.session.state
+        artifacts = load_story_artifacts(state.get("stories_and_criteria"))
+        if not artifacts.stories:
+            return
+
+        deadline = current_deadline(state)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        broken = {
+            story.id: problems
+            for story in artifacts.stories
+            if (problems := story_problems(story))
+        }
+        digest = validated_digest(state)
+        repaired = await asyncio.gather(
+            *(
+                self._repair_story(story, broken[story.id], digest, semaphore, deadline)
+                for story in artifacts.stories
+                if story.id in broken
+            )
+        )
+        rewritten = {
+            story.id: story for story in repaired if story not in artifacts.stories
+        }
+        artifacts = artifacts.model_copy(
+            update={"stories": [rewritten.get(s.id, s) for s in artifacts.stories]}
+        )
+
+        estimations = load_estimations(state.get("estimations"))
+        failing = estimation_problems(artifacts.stories, estimations)
+        to_estimate = [
+            story
+            for story in artifacts.stories
+            if story.id in failing or story.id in rewritten
+        ]
+        if not rewritten and not to_estimate:
+            return
+        for story in to_estimate:
+            logging.info(f"Re-estimating {story.id}: {failing.get(story.id)}")
+        rows: dict[str, EstimationRow] = {}
+        for row in estimations.rows:
+            if row.story_id not in rows or row_problems(rows[row.story_id]):
+                rows[row.story_id] = row
+        new_rows = await asyncio.gather(
+            *(
+                estimate_story(
+                    self.estimator_model,
+                    self.estimator_instruction,
+                    f"{self.name}AgileCoach",
+                    story,
+                    semaphore,
+                    deadline,
+                )
+                for story in to_estimate
+            )
+        )
+        for estimate in new_rows:
+            if estimate is not None and (
+                estimate.story_id not in rows or not row_problems(estimate)
+            ):
+                rows[estimate.story_id] = estimate
+        yield state_event(
+            self,
+            ctx,
+            {
+                "stories_and_criteria": artifacts.model_dump(),
+                **estimation_state(artifacts.stories, rows.values()),
+            },
+            f"🩹 Re-asked {len(broken)} user stories and {len(to_estimate)} "
+            "estimates that failed the format checks",
+        )
+
+
+class ReportAssemblerAgent(BaseAgent):
+    """Builds `final_report` from session state with a fixed template.
+
+    Story point totals are computed locally; a small model only writes the
+    Executive Summary and the Implementation Recommendations.
+    """
+
+    summary_model: str
+    summary_instruction: str
+    """Prompt with `{brief}` (the brief digest), `{stories}` and `{metrics}`
+    placeholders."""
+
+    async def _write_narrative(
+        self, digest: BriefDigest, stories: str, metrics: str, deadline: float | None
+    ) -> ReportNarrative:
+        try:
+            reply = await generate_text(
+                model=self.summary_model,
+                instruction=fill_prompt(
+                    self.summary_instruction,
+                    digest,
+                    prompt_budget(self.name),
+                    stories=stories,
+                    metrics=metrics,
+                ),
+                agent_name=self.name,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=ReportNarrative,
+                ),
+                deadline=deadline,
+            )
+            return ReportNarrative.model_validate_json(reply)
+        except Exception as e:
+            logging.warning(f"Writing the report narrative failed: {e}")
+            return ReportNarrative(
+                executive_summary=metrics,
+                recommendations="_Recommendations could not be generated._",
+            )
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        """Assemble the final report and save it to `final_report`."""
+        state = ctx.session.state
+        brief = str(state.get("validated_brief", ""))
+        artifacts = load_story_artifacts(state.get("stories_and_criteria"))
+        estimations = load_estimations(state.get("estimations"))
+        unestimated = state.get("unestimated")
+        metrics = render_metrics(
+            estimation_metrics(estimations, artifacts, unestimated)
+        )
+        clusters = state.get("story_clusters") or {}
+
+        narrative = await self._write_narrative(
+            validated_digest(state),
+            "\n".join(
+                filter(
+                    None,
+                    [
+                        compact_stories(
+                            collapse_duplicates(artifacts, clusters), criteria=False
+                        ),
+                        render_duplicates(artifacts, clusters),
+                    ],
+                )
+            ),
+            metrics,
+            current_deadline(state),
+        )
+        report = assemble_report(
+            validated_brief=brief,
+            artifacts=artifacts,
+            estimations=estimations,
+            executive_summary=narrative.executive_summary,
+            recommendations=narrative.recommendations,
+            unestimated=unestimated,
+        )
+        yield state_event(self, ctx, {"final_report": report}, report)
@@ -0,0 +1,168 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from .minhash import LshIndex, MinHasher, shingles, similarity
+from .sqlite_store import SqliteStore
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_brief(brief: str) -> str:
+    """The brief a fingerprint is taken of: lowercased, with collapsed
+    whitespace."""
+    return _SPACES.sub(" ", brief.lower()).strip()
+
+
+@dataclass
+class BriefMatch:
+    """A validated brief similar to a new one.
+
+    Attributes:
+        brief (str): The brief as it was submitted, before refinement.
+        similarity (float): Estimated Jaccard similarity to the new brief.
+        outputs (dict): The state the brief was validated and decomposed
+            into, by state key.
+    """
+
+    brief: str
+    similarity: float
+    outputs: dict[str, Any]
+
+
+class BriefIndex(SqliteStore):
+    """SQLite store of validated briefs, fingerprinted with MinHash.
+
+    Every brief is stored as submitted, keyed on the app and user it was
+    validated for and its normalised text, with the MinHash signature of its
+    word shingles and the state it was validated and decomposed into. A
+    brief is only matched against the briefs of the same app and user: the
+    signatures of those are loaded into an LSH index on their first lookup,
+    so that only candidate briefs are compared.
+    """
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS briefs ("
+        " key TEXT PRIMARY KEY,"
+        " app_name TEXT NOT NULL,"
+        " user_id TEXT NOT NULL,"
+        " brief TEXT NOT NULL,"
+        " signature BLOB NOT NULL,"
+        " outputs TEXT NOT NULL,"
+        " updated_at REAL NOT NULL)"
+    )
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._hasher = MinHasher()
+        self._indexes: dict[tuple[str, str], LshIndex[str]] = {}
+        self._index_threshold = 0.0
+        self._signatures: dict[str, np.ndarray] = {}
+
+    def _signature(self, brief: str) -> np.ndarray:
+        return self._hasher.signature(shingles(normalize_brief(brief)))
+
+    def _load(self, threshold: float, app_name: str, user_id: str) -> LshIndex[str]:
+        if self._index_threshold != threshold:
+            self._indexes = {}
+            self._index_threshold = threshold
+        scope = (app_name, user_id)
+        if scope not in self._indexes:
+            records = self._connect().execute(
+                "SELECT key, signature FROM briefs WHERE app_name = ? AND user_id = ?",
+                scope,
+            )
+            index: LshIndex[str] = LshIndex(self._hasher.permutations, threshold)
+            for key, blob in records:
+                self._signatures[key] = np.frombuffer(blob, dtype=np.uint64)
+                index.add(key, self._signatures[key])
+            self._indexes[scope] = index
+        return self._indexes[scope]
+
+    def add(
+        self, brief: str, outputs: dict[str, Any], app_name: str, user_id: str
+    ) -> None:
+        """Stores (or replaces) a validated brief.
+
+        Args:
+            brief: The brief as submitted.
+            outputs: The state it was validated and decomposed into.
+            app_name: The app the brief was validated in.
+            user_id: The user who submitted the brief.
+        """
+        key = hashlib.sha256(
+            json.dumps([app_name, user_id, normalize_brief(brief)]).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO briefs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    app_name,
+                    user_id,
+                    brief,
+                    self._signature(brief).tobytes(),
+                    json.dumps(outputs, default=str),
+                    time.time(),
+                ),
+            )
+            connection.commit()
+            self._indexes.pop((app_name, user_id), None)
+
+    def lookup(
+        self, brief: str, threshold: float, app_name: str, user_id: str
+    ) -> BriefMatch | None:
+        """Finds the validated brief of the same app and user most similar to
+        a new one.
+
+        Args:
+            brief: The new brief.
+            threshold: Minimum estimated Jaccard similarity of a match.
+            app_name: The app the new brief is submitted in.
+            user_id: The user who submitted the new brief.
+
+        Returns:
+            The best match, or None when no brief is similar enough.
+        """
+        signature = self._signature(brief)
+        with self._lock:
+            index = self._load(threshold, app_name, user_id)
+            scores = {
+                key: similarity(signature, self._signatures[key])
+                for key in index.candidates(signature)
+            }
+            if not scores:
+                return None
+            key = max(scores, key=scores.__getitem__)
+            if scores[key] < threshold:
+                return None
+            row = (
+                self._connect()
+                .execute("SELECT brief, outputs FROM briefs WHERE key = ?", (key,))
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return BriefMatch(
+            brief=row[0], similarity=scores[key], outputs=json.loads(row[1])
+        )
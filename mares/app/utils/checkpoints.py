@@ -0,0 +1,179 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections.abc import Callable, Mapping
+from typing import Any
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.sessions import Session
+from google.adk.sessions.state import State
+from google.genai import types
+
+from .sqlite_store import SqliteStore
+
+# State key of the session scope checkpoints are saved under, set by the
+# BriefInitializer at the start of every turn.
+SESSION_SCOPE_KEY = "session_scope"
+
+
+def session_scope(session: Session) -> str:
+    """Identifies an ADK session across invocations."""
+    return f"{session.app_name}/{session.user_id}/{session.id}"
+
+
+def state_fingerprint(state: State | Mapping[str, Any], keys: list[str]) -> str:
+    """Hashes the values of the given state keys.
+
+    Args:
+        state: Session state.
+        keys: The state keys a stage reads.
+
+    Returns:
+        A hex digest that changes whenever one of the values changes.
+    """
+    payload = json.dumps(
+        {key: state.get(key) for key in keys}, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore(SqliteStore):
+    """SQLite store of the state written by each pipeline stage.
+
+    A checkpoint holds the output state keys of one stage in one session,
+    together with the fingerprint of the stage inputs they were produced
+    from. When a stage is re-entered with unchanged inputs, its outputs are
+    restored instead of running it again.
+    """
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS checkpoints ("
+        " scope TEXT NOT NULL,"
+        " stage TEXT NOT NULL,"
+        " fingerprint TEXT NOT NULL,"
+        " outputs TEXT NOT NULL,"
+        " updated_at REAL NOT NULL,"
+        " PRIMARY KEY (scope, stage))"
+    )
+
+    def load(self, scope: str, stage: str) -> tuple[str, dict[str, Any]] | None:
+        """Returns the ``(fingerprint, outputs)`` checkpoint of a stage, if any."""
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT fingerprint, outputs FROM checkpoints"
+                    " WHERE scope = ? AND stage = ?",
+                    (scope, stage),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def save(
+        self, scope: str, stage: str, fingerprint: str, outputs: dict[str, Any]
+    ) -> None:
+        """Stores (or replaces) the checkpoint of a stage."""
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (
+                    scope,
+                    stage,
+                    fingerprint,
+                    json.dumps(outputs, default=str),
+                    time.time(),
+                ),
+            )
+            connection.commit()
+
+    def clear(self, scope: str | None = None) -> None:
+        """Deletes the checkpoints of one session scope, or all of them."""
+        with self._lock:
+            connection = self._connect()
+            if scope is None:
+                connection.execute("DELETE FROM checkpoints")
+            else:
+                connection.execute("DELETE FROM checkpoints WHERE scope = ?", (scope,))
+            connection.commit()
+
+    def stage_callbacks(
+        self, inputs: list[str], outputs: list[str]
+    ) -> tuple[Callable[..., Any], Callable[..., Any]]:
+        """Builds the agent callbacks that checkpoint and resume one stage.
+
+        Args:
+            inputs: State keys the stage reads.
+            outputs: State keys the stage writes.
+
+        Returns:
+            A ``before_agent_callback`` that restores the outputs and skips
+            the stage when its inputs are unchanged, and an
+            ``after_agent_callback`` that saves the outputs. Sessions
+            without a `session_scope` state key are not checkpointed.
+        """
+
+        def before_agent_callback(
+            callback_context: CallbackContext,
+        ) -> types.Content | None:
+            scope = callback_context.state.get(SESSION_SCOPE_KEY)
+            if not scope:
+                return None
+            fingerprint = state_fingerprint(callback_context.state, inputs)
+            try:
+                checkpoint = self.load(scope, callback_context.agent_name)
+            except sqlite3.Error as e:
+                logging.warning(f"Reading checkpoint failed: {e}")
+                return None
+            if checkpoint is None or checkpoint[0] != fingerprint:
+                return None
+            if any(key not in checkpoint[1] for key in outputs):
+                return None
+            for key in outputs:
+                callback_context.state[key] = checkpoint[1][key]
+            return types.Content(
+                role="model",
+                parts=[
+                    types.Part(
+                        text=f"⏭️ {callback_context.agent_name}: inputs unchanged, "
+                        "resumed from checkpoint"
+                    )
+                ],
+            )
+
+        def after_agent_callback(callback_context: CallbackContext) -> None:
+            state = callback_context.state
+            scope = state.get(SESSION_SCOPE_KEY)
+            if not scope or any(state.get(key) is None for key in outputs):
+                return None
+            try:
+                self.save(
+                    scope,
+                    callback_context.agent_name,
+                    state_fingerprint(state, inputs),
+                    {key: state.get(key) for key in outputs},
+                )
+            except sqlite3.Error as e:
+                logging.warning(f"Writing checkpoint failed: {e}")
+            return None
+
+        return before_agent_callback, after_agent_callback
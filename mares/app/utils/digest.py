@@ -0,0 +1,207 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from typing import Any
+
+from .typing import BriefDigest, BriefSection
+
+_HEADING = re.compile(r"^\s*#{1,6}\s+(?P<title>.+?)\s*#*\s*$")
+_BOLD_LINE = re.compile(r"^\s*\*\*(?P<title>[^*]+?)\*\*:?\s*$")
+_EMPHASIS = re.compile(r"\*\*|__")
+_BULLET = re.compile(r"^\s*(?:[-*•+]|\d+[.)])\s+")
+_SPACES = re.compile(r"\s+")
+_SLUG_WORDS = 5
+# Shorter lines (e.g. "Yes") may legitimately repeat under several sections.
+_MIN_DEDUPLICATED_LENGTH = 40
+
+
+class PromptBudgetError(ValueError):
+    """A brief digest does not fit the prompt budget of its stage."""
+
+
+def count_tokens(text: str) -> int:
+    """Estimates the number of model tokens of ``text`` (about 4 characters
+    per token), without calling the model's tokenizer."""
+    return (len(text) + 3) // 4
+
+
+def _slug(title: str) -> str:
+    words = re.findall(r"[a-z0-9]+", title.lower())
+    return "-".join(words[:_SLUG_WORDS]) or "section"
+
+
+def _compact_lines(lines: list[str], seen: set[str]) -> str:
+    """Strips formatting, blank lines and lines already seen in the brief."""
+    compacted = []
+    for line in lines:
+        bullet = bool(_BULLET.match(line))
+        line = _SPACES.sub(" ", _EMPHASIS.sub("", _BULLET.sub("", line))).strip()
+        if not line or line.lower() in seen:
+            continue
+        if len(line) >= _MIN_DEDUPLICATED_LENGTH:
+            seen.add(line.lower())
+        compacted.append(f"- {line}" if bullet else line)
+    return "\n".join(compacted)
+
+
+def build_digest(brief: str) -> BriefDigest:
+    """Splits a brief into compact sections with stable IDs.
+
+    Sections start at Markdown headings and at bold-only lines, such as the
+    questions that refinement answers are filed under. Text before the first
+    heading is the ``overview``. Section IDs are derived from the section
+    titles, so they do not change when refinements are appended.
+
+    Args:
+        brief: The project brief.
+
+    Returns:
+        The digest; sections without text are left out.
+    """
+    blocks: list[tuple[str, list[str]]] = [("Overview", [])]
+    for line in brief.splitlines():
+        match = _HEADING.match(line) or _BOLD_LINE.match(line)
+        if match:
+            blocks.append((match.group("title").strip(), []))
+        else:
+            blocks[-1][1].append(line)
+
+    sections = []
+    ids: dict[str, int] = {}
+    seen: set[str] = set()
+    for title, lines in blocks:
+        text = _compact_lines(lines, seen)
+        if not text:
+            continue
+        slug = _slug(title)
+        ids[slug] = ids.get(slug, 0) + 1
+        section_id = slug if ids[slug] == 1 else f"{slug}-{ids[slug]}"
+        sections.append(BriefSection(id=section_id, title=title, text=text))
+    return BriefDigest(sections=sections)
+
+
+def load_digest(value: Any) -> BriefDigest:
+    """Reads a digest stored in session state (model, dict or JSON)."""
+    if isinstance(value, BriefDigest):
+        return value
+    if isinstance(value, str):
+        return BriefDigest.model_validate_json(value)
+    return BriefDigest.model_validate(value or {})
+
+
+def render_digest(digest: BriefDigest, max_tokens: int = 0) -> str:
+    """Renders a digest for a prompt, one ``[section-id] Title`` block per
+    section.
+
+    Args:
+        digest: The brief digest.
+        max_tokens: Token budget of the rendered digest, 0 for none.
+
+    Returns:
+        The rendered digest.
+
+    Raises:
+        PromptBudgetError: The digest is over budget. It is never shortened,
+            so that no stage works from part of the brief.
+    """
+    rendered = "\n\n".join(
+        f"[{section.id}] {section.title}\n{section.text}" for section in digest.sections
+    )
+    if max_tokens and count_tokens(rendered) > max_tokens:
+        raise PromptBudgetError(
+            f"Brief digest of {count_tokens(rendered)} tokens does not fit a "
+            f"budget of {max_tokens} tokens"
+        )
+    return rendered
+
+
+def fill_prompt(
+    template: str, digest: BriefDigest, max_tokens: int = 0, **values: Any
+) -> str:
+    """Formats a prompt template, fitting the ``{brief}`` digest in the rest
+    of the stage's token budget.
+
+    Args:
+        template: Prompt with a ``{brief}`` placeholder and the ``values``
+            placeholders.
+        digest: The brief digest to insert.
+        max_tokens: Token budget of the whole prompt, 0 for none.
+        **values: Other placeholder values.
+
+    Returns:
+        The prompt.
+
+    Raises:
+        PromptBudgetError: The digest does not fit the rest of the budget.
+    """
+    budget = 0
+    if max_tokens:
+        rest = count_tokens(template.format(brief="", **values))
+        budget = max(1, max_tokens - rest)
+    return template.format(brief=render_digest(digest, budget), **values)
+
+
+def _split_section(section: BriefSection, max_tokens: int) -> list[BriefSection]:
+    """Splits an oversized section at line boundaries, keeping its ID."""
+    parts: list[list[str]] = [[]]
+    size = 0
+    for line in section.text.splitlines():
+        tokens = count_tokens(line) + 1
+        if parts[-1] and size + tokens > max_tokens:
+            parts.append([])
+            size = 0
+        parts[-1].append(line)
+        size += tokens
+    if len(parts) == 1:
+        return [section]
+    return [
+        BriefSection(
+            id=section.id,
+            title=f"{section.title} (part {number}/{len(parts)})",
+            text="\n".join(lines),
+        )
+        for number, lines in enumerate(parts, 1)
+    ]
+
+
+def chunk_digest(digest: BriefDigest, max_tokens: int) -> list[BriefDigest]:
+    """Packs consecutive digest sections into chunks of about ``max_tokens``.
+
+    Sections larger than a chunk are split at line boundaries. Chunks keep
+    the section IDs, so results per chunk can be traced back to the brief.
+
+    Args:
+        digest: The brief digest.
+        max_tokens: Target size of a rendered chunk.
+
+    Returns:
+        The chunks, in brief order.
+    """
+    chunks: list[list[BriefSection]] = [[]]
+    size = 0
+    for section in digest.sections:
+        for part in _split_section(section, max_tokens):
+            tokens = count_tokens(render_digest(BriefDigest(sections=[part])))
+            if chunks[-1] and size + tokens > max_tokens:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(part)
+            size += tokens
+    return [BriefDigest(sections=sections) for sections in chunks if sections]
+
+
+def render_outline(digest: BriefDigest) -> str:
+    """Lists the section IDs and titles of a digest, one per line."""
+    return "\n".join(f"[{section.id}] {section.title}" for section in digest.sections)
@@ -0,0 +1,181 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import re
+import time
+import zlib
+from itertools import pairwise
+
+import numpy as np
+
+from .sqlite_store import SqliteStore
+from .stories import story_sentence
+from .typing import EstimationRow, UserStory
+
+# Size of the hashed feature vectors.
+EMBEDDING_DIMENSIONS = 1024
+# Start of the justification of a reused estimate, as shown in the report.
+REUSED_PREFIX = "Reused from a similar past story"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def story_text(story: UserStory) -> str:
+    """The text a story is compared on: its sentence and criteria, without
+    its id."""
+    criteria = " ".join(
+        f"given {c.given} when {c.when} then {c.then}"
+        for c in story.acceptance_criteria
+    )
+    return f"{story_sentence(story)} {criteria}".strip()
+
+
+def is_reused(row: EstimationRow) -> bool:
+    """Whether an estimation row was reused instead of estimated."""
+    return row.justification.startswith(REUSED_PREFIX)
+
+
+def embed(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> np.ndarray:
+    """Embeds text locally as a normalised vector of hashed word unigrams
+    and bigrams, so that stories worded alike have a high cosine
+    similarity."""
+    tokens = _TOKEN.findall(text.lower())
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for feature in tokens + [f"{a} {b}" for a, b in pairwise(tokens)]:
+        bucket = zlib.crc32(feature.encode("utf-8"))
+        # The top bit signs the feature, so that collisions tend to cancel out.
+        vector[bucket % dimensions] += -1.0 if bucket >> 31 else 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class EstimationIndex(SqliteStore):
+    """SQLite-backed vector index of past estimation rows.
+
+    Every estimated story is stored with its embedding, points and
+    justification. The embeddings are loaded into one matrix on first
+    lookup, so that a whole set of stories is matched with a single matrix
+    product.
+    """
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS estimations ("
+        " key TEXT PRIMARY KEY,"
+        " text TEXT NOT NULL,"
+        " story_points INTEGER NOT NULL,"
+        " justification TEXT NOT NULL,"
+        " embedding BLOB NOT NULL,"
+        " updated_at REAL NOT NULL)"
+    )
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._matrix: np.ndarray | None = None
+        self._rows: list[tuple[int, str]] = []
+
+    def _load(self) -> np.ndarray:
+        if self._matrix is None:
+            records = (
+                self._connect()
+                .execute(
+                    "SELECT story_points, justification, embedding FROM estimations"
+                )
+                .fetchall()
+            )
+            self._rows = [
+                (points, justification) for points, justification, _ in records
+            ]
+            self._matrix = np.array(
+                [np.frombuffer(blob, dtype=np.float32) for _, _, blob in records],
+                dtype=np.float32,
+            ).reshape(len(records), EMBEDDING_DIMENSIONS)
+        return self._matrix
+
+    def add(self, stories: list[UserStory], rows: list[EstimationRow]) -> int:
+        """Stores (or replaces) the estimates of stories.
+
+        Args:
+            stories: The estimated stories.
+            rows: Their estimation rows; reused and 0-point rows are left
+                out, so that only model estimates are indexed.
+
+        Returns:
+            The number of stored estimates.
+        """
+        by_id = {story.id: story for story in stories}
+        records = []
+        for row in rows:
+            story = by_id.get(row.story_id)
+            if story is None or row.story_points <= 0 or is_reused(row):
+                continue
+            text = story_text(story)
+            records.append(
+                (
+                    hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                    text,
+                    row.story_points,
+                    row.justification,
+                    embed(text).tobytes(),
+                    time.time(),
+                )
+            )
+        if not records:
+            return 0
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO estimations VALUES (?, ?, ?, ?, ?, ?)", records
+            )
+            connection.commit()
+            self._matrix = None
+        return len(records)
+
+    def lookup(
+        self, stories: list[UserStory], threshold: float
+    ) -> dict[str, EstimationRow]:
+        """Finds the past estimates of stories similar to the given ones.
+
+        Args:
+            stories: The stories to estimate.
+            threshold: Minimum cosine similarity of a reusable estimate.
+
+        Returns:
+            The reused estimation rows, by id of the story they now estimate,
+            with a justification that says they are reused.
+        """
+        if not stories:
+            return {}
+        with self._lock:
+            matrix = self._load()
+            rows = self._rows
+        if not len(matrix):
+            return {}
+        queries = np.stack([embed(story_text(story)) for story in stories])
+        similarities = queries @ matrix.T
+        best = similarities.argmax(axis=1)
+        reused = {}
+        for story, index, similarity in zip(
+            stories, best, similarities[np.arange(len(stories)), best], strict=True
+        ):
+            if similarity >= threshold:
+                points, justification = rows[index]
+                reused[story.id] = EstimationRow(
+                    story_id=story.id,
+                    story_points=points,
+                    justification=(
+                        f"{REUSED_PREFIX} ({similarity:.0%} similar): {justification}"
+                    ),
+                )
+        return reused
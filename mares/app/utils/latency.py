@@ -0,0 +1,44 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from collections import defaultdict, deque
+
+
+class LatencyTracker:
+    """Rolling window of model call latencies per stage and model."""
+
+    def __init__(self, window: int = 50, min_samples: int = 5):
+        self.min_samples = min_samples
+        self._samples: dict[tuple[str, str], deque[float]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, model: str, seconds: float) -> None:
+        """Records the latency of a successful call."""
+        with self._lock:
+            self._samples[(stage, model)].append(seconds)
+
+    def quantile(self, stage: str, model: str, q: float = 0.9) -> float | None:
+        """The ``q`` quantile of the recent latencies of a stage and model.
+
+        Returns:
+            The latency in seconds, or None until enough calls were observed.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get((stage, model), ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
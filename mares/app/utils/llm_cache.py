@@ -0,0 +1,273 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+from pydantic import BaseModel
+
+# Request config fields that do not influence the generated content.
+_NON_SEMANTIC_CONFIG_FIELDS = {"system_instruction", "http_options", "labels"}
+
+# Key of a missed request, kept in the callback state of that model call.
+# The before and after model callbacks of one call share its state delta, so
+# concurrent calls of the same agent never see each other's key; ``temp:``
+# keys are not persisted to the session.
+_PENDING_KEY = "temp:llm_cache_key"
+
+
+def _config_fingerprint(config: types.GenerateContentConfig | None) -> dict[str, Any]:
+    """Returns a JSON-serialisable view of the generation config."""
+    if config is None:
+        return {}
+    fingerprint = config.model_dump(
+        mode="json",
+        exclude=_NON_SEMANTIC_CONFIG_FIELDS | {"response_schema"},
+        exclude_none=True,
+    )
+    schema = config.response_schema
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        fingerprint["response_schema"] = schema.model_json_schema()
+    elif schema is not None:
+        fingerprint["response_schema"] = repr(schema)
+    return fingerprint
+
+
+def make_cache_key(
+    agent_name: str,
+    model: str | None,
+    instruction: str,
+    config: types.GenerateContentConfig | None = None,
+    contents: list[types.Content] | None = None,
+) -> str:
+    """Builds the content address of a stage call.
+
+    Args:
+        agent_name: Name of the agent issuing the call.
+        model: Model name the request is sent to.
+        instruction: The rendered system instruction, with all state
+            placeholders already substituted.
+        config: The generation config of the request.
+        contents: The conversation history sent with the instruction, so
+            that calls with the same instruction but other earlier turns
+            do not share a response.
+
+    Returns:
+        A hex SHA-256 digest identifying the request.
+    """
+    payload = json.dumps(
+        {
+            "agent": agent_name,
+            "model": model or "",
+            "instruction": instruction,
+            "config": _config_fingerprint(config),
+            "contents": [
+                content.model_dump(mode="json", exclude_none=True)
+                for content in contents or []
+            ],
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LlmResponseCache:
+    """Two-tier (memory LRU + on-disk) cache of final model responses.
+
+    The cache is meant to be wired into ``LlmAgent`` stages through
+    ``before_model_callback`` / ``after_model_callback``: on a hit the model
+    call is skipped and the stored content is returned instead.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | None = None,
+        max_memory_entries: int = 128,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        """
+        Initialize the cache.
+
+        :param cache_dir: Directory of the on-disk tier, disabled when None
+        :param max_memory_entries: Capacity of the in-memory LRU tier
+        :param max_disk_bytes: Size budget of the on-disk tier; the least
+            recently used entries are evicted once it is exceeded
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    # Public API
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Returns the stored content for ``key`` and updates the counters."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return self._memory[key]
+            content = self._read_disk(key)
+            if content is not None:
+                self._remember(key, content)
+                self._counters["disk_hits"] += 1
+                return content
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, content: dict[str, Any]) -> None:
+        """Stores ``content`` in both tiers."""
+        with self._lock:
+            self._remember(key, content)
+            self._write_disk(key, content)
+            self._counters["stores"] += 1
+
+    def stats(self) -> dict[str, int]:
+        """Returns the hit/miss counters and current tier sizes."""
+        with self._lock:
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            return {
+                **self._counters,
+                "hits": hits,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self) -> None:
+        """Drops every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            for path, _, _ in self._disk_entries():
+                os.remove(path)
+            self._disk_bytes = 0
+
+    # ADK callbacks
+
+    def before_model_callback(
+        self, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> LlmResponse | None:
+        """Serves the stage from the cache, or remembers the key for storing."""
+        key = make_cache_key(
+            agent_name=callback_context.agent_name,
+            model=llm_request.model,
+            instruction=str(llm_request.config.system_instruction or ""),
+            config=llm_request.config,
+            contents=llm_request.contents,
+        )
+        content = self.get(key)
+        if content is not None:
+            logging.info(f"LLM cache hit for {callback_context.agent_name}")
+            return LlmResponse(content=types.Content.model_validate(content))
+        callback_context.state[_PENDING_KEY] = key
+        return None
+
+    def after_model_callback(
+        self, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> LlmResponse | None:
+        """Stores the final, text-only response of a cache miss."""
+        if llm_response.partial:
+            return None
+        key = callback_context.state.get(_PENDING_KEY)
+        content = llm_response.content
+        if (
+            key is None
+            or llm_response.error_code
+            or content is None
+            or not content.parts
+            or any(part.function_call for part in content.parts)
+        ):
+            return None
+        self.put(key, content.model_dump(mode="json", exclude_none=True))
+        return None
+
+    # Internals
+
+    def _remember(self, key: str, content: dict[str, Any]) -> None:
+        self._memory[key] = content
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(str(self.cache_dir), key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> dict[str, Any] | None:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                content = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        # Touch the entry so that eviction is least-recently-used.
+        os.utime(path)
+        return content
+
+    def _write_disk(self, key: str, content: dict[str, Any]) -> None:
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        data = json.dumps(content, ensure_ascii=False).encode("utf-8")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            self._disk_bytes -= os.path.getsize(path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._disk_bytes += len(data)
+        self._evict_disk()
+
+    def _disk_entries(self) -> list[tuple[str, int, float]]:
+        entries = []
+        for root, _, files in os.walk(str(self.cache_dir)):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self) -> None:
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        for path, size, _ in sorted(self._disk_entries(), key=lambda e: e[2]):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            self._disk_bytes -= size
+            self._counters["evictions"] += 1
@@ -0,0 +1,162 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import zlib
+from collections.abc import Hashable
+from typing import Generic, TypeVar
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+_Key = TypeVar("_Key", bound=Hashable)
+
+
+def shingles(text: str, size: int = 3) -> set[str]:
+    """The word shingles of a text, lowercased and without punctuation.
+
+    Args:
+        text: The text.
+        size: Number of words per shingle; shorter texts are one shingle.
+
+    Returns:
+        The distinct shingles.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """Computes MinHash signatures, whose agreement estimates the Jaccard
+    similarity of two shingle sets."""
+
+    def __init__(self, permutations: int = 128, seed: int = 1):
+        generator = np.random.default_rng(seed)
+        self.permutations = permutations
+        self._a = generator.integers(
+            1, _MERSENNE_PRIME, size=permutations, dtype=np.uint64
+        )
+        self._b = generator.integers(
+            0, _MERSENNE_PRIME, size=permutations, dtype=np.uint64
+        )
+
+    def signature(self, features: set[str]) -> np.ndarray:
+        """The signature of a set of shingles."""
+        if not features:
+            return np.full(self.permutations, _MAX_HASH, dtype=np.uint64)
+        hashes = np.array(
+            [zlib.crc32(feature.encode("utf-8")) for feature in features],
+            dtype=np.uint64,
+        )[:, np.newaxis]
+        # Universal hashing; the products wrap around, which keeps them random
+        permuted = (hashes * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """The Jaccard similarity estimated from two MinHash signatures."""
+    return float(np.mean(first == second))
+
+
+def lsh_bands(permutations: int, threshold: float) -> tuple[int, int]:
+    """Splits a signature into ``(bands, rows)`` so that pairs of
+    ``threshold`` similarity are almost always candidates: the split whose
+    candidate threshold ``(1 / bands) ** (1 / rows)`` is the highest one not
+    above ``threshold``."""
+    splits = [
+        (permutations // rows, rows)
+        for rows in range(1, permutations + 1)
+        if permutations % rows == 0
+    ]
+
+    def candidate_threshold(split: tuple[int, int]) -> float:
+        return (1 / split[0]) ** (1 / split[1])
+
+    below = [split for split in splits if candidate_threshold(split) <= threshold]
+    return max(below or splits[:1], key=candidate_threshold)
+
+
+class LshIndex(Generic[_Key]):
+    """Locality-sensitive hashing index of MinHash signatures: signatures
+    that agree on a whole band share a bucket and are candidates."""
+
+    def __init__(self, permutations: int, threshold: float):
+        self.bands, self.rows = lsh_bands(permutations, threshold)
+        self._buckets: dict[tuple[int, bytes], list[_Key]] = {}
+
+    def _keys(self, signature: np.ndarray) -> list[tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows : (band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def add(self, key: _Key, signature: np.ndarray) -> None:
+        """Adds a signature under ``key``."""
+        for bucket in self._keys(signature):
+            self._buckets.setdefault(bucket, []).append(key)
+
+    def candidates(self, signature: np.ndarray) -> set[_Key]:
+        """The keys of the signatures sharing a bucket with ``signature``."""
+        return {
+            key
+            for bucket in self._keys(signature)
+            for key in self._buckets.get(bucket, [])
+        }
+
+
+def cluster_near_duplicates(
+    texts: list[str], threshold: float, shingle_size: int = 3
+) -> list[list[int]]:
+    """Groups near-duplicate texts.
+
+    Candidate pairs come from an LSH index and are kept when their estimated
+    Jaccard similarity reaches ``threshold``; groups are the connected
+    components of the kept pairs.
+
+    Args:
+        texts: The texts to group.
+        threshold: Minimum similarity of near-duplicates.
+        shingle_size: Number of words per shingle.
+
+    Returns:
+        The groups of text indices, singletons included, each in text order
+        and ordered by their first text.
+    """
+    hasher = MinHasher()
+    index: LshIndex[int] = LshIndex(hasher.permutations, threshold)
+    parents = list(range(len(texts)))
+
+    def root(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    signatures = [hasher.signature(shingles(text, shingle_size)) for text in texts]
+    for i, signature in enumerate(signatures):
+        for j in index.candidates(signature):
+            if similarity(signature, signatures[j]) >= threshold:
+                first, second = sorted((root(i), root(j)))
+                parents[second] = first
+        index.add(i, signature)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(texts)):
+        groups.setdefault(root(i), []).append(i)
+    return list(groups.values())
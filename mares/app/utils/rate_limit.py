@@ -0,0 +1,232 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, ClassVar
+
+from .sqlite_store import SqliteStore
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Quota of one model.
+
+    Attributes:
+        requests_per_minute (float): Maximum number of requests per minute.
+        tokens_per_minute (float): Maximum number of tokens per minute.
+    """
+
+    requests_per_minute: float
+    tokens_per_minute: float
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter for retry ``attempt`` (from 0)."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether a model call failed because the quota is exhausted."""
+    return getattr(error, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+class SharedRateLimiter(SqliteStore):
+    """Per-model token buckets shared by all processes on a host.
+
+    Each model has a request bucket and a token bucket that refill
+    continuously at the configured per-minute rate and hold at most one
+    minute of quota. The buckets live in a SQLite database, so that every
+    worker process draws from the same quota. When a model reports 429, the
+    model is blocked for all processes for the backoff delay.
+
+    Queue depth and throttling metrics are kept per process.
+    """
+
+    schema = (
+        "CREATE TABLE IF NOT EXISTS buckets ("
+        " model TEXT PRIMARY KEY,"
+        " requests REAL NOT NULL,"
+        " tokens REAL NOT NULL,"
+        " updated_at REAL NOT NULL,"
+        " blocked_until REAL NOT NULL DEFAULT 0)"
+    )
+    # Bucket updates wait for other processes, in explicit transactions.
+    connect_options: ClassVar[dict[str, Any]] = {"timeout": 30, "isolation_level": None}
+
+    def __init__(
+        self,
+        path: str,
+        limits: dict[str, RateLimit],
+        default_limit: RateLimit | None = None,
+    ):
+        super().__init__(path)
+        self.limits = limits
+        self.default_limit = default_limit
+        self._stats_lock = threading.Lock()
+        self._stats: dict[str, dict[str, float]] = defaultdict(
+            lambda: dict.fromkeys(
+                (
+                    "requests",
+                    "throttled",
+                    "wait_seconds",
+                    "rate_limited",
+                    "queue_depth",
+                    "max_queue_depth",
+                ),
+                0,
+            )
+        )
+
+    def limit_for(self, model: str) -> RateLimit | None:
+        """The quota of ``model``, None when it is not limited."""
+        return self.limits.get(model, self.default_limit)
+
+    def _update(self, model: str, tokens: float, take: bool) -> float:
+        """Refills the buckets and takes ``tokens`` from them if possible.
+
+        Returns:
+            0 when the request was admitted, otherwise the seconds to wait.
+        """
+        limit = self.limit_for(model)
+        if limit is None:
+            return 0.0
+        with self._lock:
+            connection = self._connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = connection.execute(
+                    "SELECT requests, tokens, updated_at, blocked_until"
+                    " FROM buckets WHERE model = ?",
+                    (model,),
+                ).fetchone()
+                if row is None:
+                    row = (limit.requests_per_minute, limit.tokens_per_minute, now, 0.0)
+                requests, available, updated_at, blocked_until = row
+                elapsed = max(0.0, now - updated_at)
+                requests = min(
+                    limit.requests_per_minute,
+                    requests + elapsed * limit.requests_per_minute / 60,
+                )
+                available = min(
+                    limit.tokens_per_minute,
+                    available + elapsed * limit.tokens_per_minute / 60,
+                )
+                # A request larger than the bucket waits for a full bucket.
+                tokens = min(tokens, limit.tokens_per_minute)
+                if not take:
+                    available = min(limit.tokens_per_minute, available - tokens)
+                    wait = 0.0
+                elif now < blocked_until:
+                    wait = blocked_until - now
+                elif requests >= 1 and available >= tokens:
+                    requests -= 1
+                    available -= tokens
+                    wait = 0.0
+                else:
+                    wait = max(
+                        (1 - requests) * 60 / limit.requests_per_minute,
+                        (tokens - available) * 60 / limit.tokens_per_minute,
+                        0.01,
+                    )
+                connection.execute(
+                    "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?)",
+                    (model, requests, available, now, blocked_until),
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return wait
+
+    def _block(self, model: str, delay: float) -> None:
+        """Blocks the buckets of ``model`` for ``delay`` seconds."""
+        self._update(model, 0, take=False)
+        with self._lock:
+            self._connect().execute(
+                "UPDATE buckets SET blocked_until = MAX(blocked_until, ?)"
+                " WHERE model = ?",
+                (time.time() + delay, model),
+            )
+
+    def _count(self, model: str, **increments: float) -> dict[str, float]:
+        """Adds to the metrics of ``model`` and returns a copy of them."""
+        with self._stats_lock:
+            stats = self._stats[model]
+            for name, increment in increments.items():
+                stats[name] += increment
+            stats["max_queue_depth"] = max(
+                stats["max_queue_depth"], stats["queue_depth"]
+            )
+            return dict(stats)
+
+    async def acquire(self, model: str, tokens: float) -> float:
+        """Waits until a request of about ``tokens`` tokens may be sent.
+
+        The buckets are updated in a worker thread, since other processes
+        may hold the database for a while.
+
+        Args:
+            model: Name of the model the request is sent to.
+            tokens: Estimated number of input and output tokens.
+
+        Returns:
+            The number of seconds the request was throttled.
+        """
+        self._count(model, requests=1)
+        waited = 0.0
+        wait = await asyncio.to_thread(self._update, model, tokens, True)
+        if not wait:
+            return waited
+        stats = self._count(model, throttled=1, queue_depth=1)
+        logging.info(
+            f"Throttling {model} request for {wait:.1f}s "
+            f"(queue depth {stats['queue_depth']:.0f})"
+        )
+        try:
+            while wait:
+                await asyncio.sleep(wait)
+                waited += wait
+                wait = await asyncio.to_thread(self._update, model, tokens, True)
+        finally:
+            self._count(model, queue_depth=-1, wait_seconds=waited)
+        return waited
+
+    async def try_acquire(self, model: str, tokens: float) -> bool:
+        """Takes quota for an optional request only if it is available now."""
+        self._count(model, requests=1)
+        return not await asyncio.to_thread(self._update, model, tokens, True)
+
+    async def settle(self, model: str, estimated: float, actual: float) -> None:
+        """Corrects the token bucket once the real usage of a call is known."""
+        if actual and actual != estimated:
+            await asyncio.to_thread(self._update, model, actual - estimated, False)
+
+    async def penalize(self, model: str, delay: float) -> None:
+        """Blocks ``model`` for all processes for ``delay`` seconds after a
+        429 response."""
+        self._count(model, rate_limited=1)
+        if self.limit_for(model) is not None:
+            await asyncio.to_thread(self._block, model, delay)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Per-model throttling metrics of this process."""
+        with self._stats_lock:
+            return {model: dict(stats) for model, stats in self._stats.items()}
@@ -0,0 +1,304 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import re
+from dataclasses import dataclass
+
+from .digest import build_digest
+from .refinement import merge_findings
+from .typing import ChunkAnalysis
+
+
+@dataclass(frozen=True)
+class ReadinessDimension:
+    """One area of the Definition-of-Ready checklist.
+
+    Attributes:
+        id (str): Short identifier of the area.
+        checklist (str): The checklist item, as shown to the BusinessAnalyst.
+        headings (tuple): Words that mark a brief section about the area.
+        keywords (tuple): Regex stems of words that cover the area.
+        evidence (tuple): One regex per sub-item of the checklist item,
+            matching specific evidence of that sub-item; an area scores at
+            most the share of its sub-items with evidence.
+    """
+
+    id: str
+    checklist: str
+    headings: tuple[str, ...]
+    keywords: tuple[str, ...]
+    evidence: tuple[str, ...]
+
+
+DOR_DIMENSIONS = (
+    ReadinessDimension(
+        id="goals",
+        checklist="Goal & Metrics: Clear business objectives and measurable success criteria",
+        headings=("goal", "objective", "purpose", "success", "metric", "kpi"),
+        keywords=(
+            "goal",
+            "objective",
+            "purpose",
+            "aim",
+            "success",
+            "kpi",
+            "metric",
+            "measur",
+            "target",
+            "increas",
+            "reduc",
+            "improv",
+            "roi",
+        ),
+        evidence=(
+            r"\b(goals?|objectives?|purpose|aims?|reduc\w*|increas\w*|improv\w*)\b",
+            r"\d+(\.\d+)?\s*(%|percent)|\b(kpis?|metrics?|measur\w*)\b",
+        ),
+    ),
+    ReadinessDimension(
+        id="actors",
+        checklist="Users/Actors: Well-defined user roles and stakeholders",
+        headings=("user", "actor", "role", "persona", "stakeholder"),
+        keywords=(
+            "user",
+            "actor",
+            "role",
+            "persona",
+            "stakeholder",
+            "customer",
+            "admin",
+            "manager",
+            "operator",
+            "staff",
+            "agent",
+            "employee",
+        ),
+        evidence=(r"\bas an? \w+|\b(roles?|personas?|stakeholders?)\b",),
+    ),
+    ReadinessDimension(
+        id="scope",
+        checklist="Scope: Clear boundaries of what's included and excluded",
+        headings=("scope", "boundar", "mvp", "release", "phase"),
+        keywords=(
+            "scope",
+            "includ",
+            "exclud",
+            "boundar",
+            "mvp",
+            "phase",
+            "release",
+            "limitation",
+            "out of",
+            "only",
+        ),
+        evidence=(
+            r"\b(in[- ]scope|included)\b",
+            r"\b(out[- ]of[- ]scope|exclud\w*|not included|will not|won't)\b",
+        ),
+    ),
+    ReadinessDimension(
+        id="functional",
+        checklist="Functional Requirements: Detailed features and capabilities",
+        headings=("functional requirement", "feature", "capabilit", "function"),
+        keywords=(
+            "feature",
+            "function",
+            "must",
+            "shall",
+            "able to",
+            "allow",
+            "enabl",
+            "support",
+            "workflow",
+            "capabilit",
+            "requirement",
+        ),
+        evidence=(r"\b(must|shall|should) \w+|\bable to \w+",),
+    ),
+    ReadinessDimension(
+        id="data",
+        checklist="Data Requirements: Data sources, formats, and storage needs",
+        headings=("data", "storage", "integration"),
+        keywords=(
+            "data",
+            "database",
+            "storage",
+            "store",
+            "format",
+            "csv",
+            "json",
+            "source",
+            "record",
+            "schema",
+            "retention",
+            "backup",
+            "migrat",
+            "integrat",
+        ),
+        evidence=(
+            r"\b(sources?|imported|integrat\w*|apis?)\b",
+            r"\b(formats?|csv|json|xml|pdf|schema)\b",
+            r"\b(stor\w*|database|retention|backup)\b",
+        ),
+    ),
+    ReadinessDimension(
+        id="nfr",
+        checklist="""Non-Functional Requirements:
+       - Security: Authentication, authorization, data protection
+       - Performance: Response times, throughput, scalability
+       - Usability: User experience requirements
+       - Compliance: Regulatory or policy requirements""",
+        headings=(
+            "non-functional",
+            "nonfunctional",
+            "security",
+            "performance",
+            "usability",
+            "compliance",
+        ),
+        keywords=(
+            "secur",
+            "authenticat",
+            "authoriz",
+            "sso",
+            "encrypt",
+            "performance",
+            "latency",
+            "response time",
+            "throughput",
+            "scalab",
+            "usability",
+            "accessib",
+            "wcag",
+            "complian",
+            "gdpr",
+            "hipaa",
+            "regulat",
+            "audit",
+        ),
+        evidence=(
+            r"\b(secur\w*|authenticat\w*|authori[sz]\w*|sso|encrypt\w*)\b",
+            r"\b(performance|latency|response times?|throughput|scalab\w*|\d+\s*ms)\b",
+            r"\b(usability|accessib\w*|wcag|ux|user experience)\b",
+            r"\b(complian\w*|gdpr|hipaa|regulat\w*|polic\w*|audit\w*)\b",
+        ),
+    ),
+)
+
+# Hand-set logistic weights over (section heading found, log keyword hits,
+# share of sub-items with evidence): a dedicated section with some detail
+# scores high, scattered mentions low. The labelled briefs of the readiness
+# tests pin the behaviour.
+_BIAS = -4.0
+_WEIGHTS = (3.0, 1.6, 1.5)
+
+
+def _sigmoid(x: float) -> float:
+    return 1 / (1 + math.exp(-x))
+
+
+def score_dimension(
+    dimension: ReadinessDimension, brief: str, titles: list[str]
+) -> float:
+    """Probability that the brief covers one checklist area.
+
+    Args:
+        dimension: The checklist area.
+        brief: The project brief.
+        titles: Lowercased section titles of the brief.
+
+    Returns:
+        A score between 0 and 1, at most the share of sub-items with
+        evidence, so that keyword hits alone never make an area pass.
+    """
+    text = brief.lower()
+    heading = any(word in title for title in titles for word in dimension.headings)
+    hits = sum(
+        len(re.findall(rf"\b{re.escape(keyword)}", text))
+        for keyword in dimension.keywords
+    )
+    evidence = sum(
+        1 for pattern in dimension.evidence if re.search(pattern, text)
+    ) / len(dimension.evidence)
+    features = (float(heading), math.log1p(hits), evidence)
+    score = _sigmoid(
+        _BIAS + sum(w * x for w, x in zip(_WEIGHTS, features, strict=True))
+    )
+    return min(score, evidence)
+
+
+def assess_readiness(brief: str) -> dict[str, float]:
+    """Scores every Definition-of-Ready area of a brief, by area id."""
+    titles = [section.title.lower() for section in build_digest(brief).sections]
+    return {
+        dimension.id: round(score_dimension(dimension, brief, titles), 3)
+        for dimension in DOR_DIMENSIONS
+    }
+
+
+def weak_dimensions(
+    scores: dict[str, float], threshold: float
+) -> list[ReadinessDimension]:
+    """The checklist areas that do not clearly pass (unscored areas included)."""
+    return [
+        dimension
+        for dimension in DOR_DIMENSIONS
+        if scores.get(dimension.id, 0.0) < threshold
+    ]
+
+
+def render_checklist(
+    dimensions: list[ReadinessDimension], with_ids: bool = False
+) -> str:
+    """Renders checklist areas as the numbered Definition-of-Ready items,
+    optionally prefixed with their ``[id]``."""
+    return "\n".join(
+        f"    {number}. {f'[{dimension.id}] ' if with_ids else ''}{dimension.checklist}"
+        for number, dimension in enumerate(dimensions, 1)
+    )
+
+
+def reduce_chunk_analyses(
+    analyses: list[ChunkAnalysis], dimensions: list[ReadinessDimension]
+) -> str:
+    """Merges the per-chunk findings of a large brief into missing elements.
+
+    An area that some chunk covers only keeps the gaps reported by the
+    chunks that cover it; the other chunks are just silent about it. An
+    area that no chunk covers keeps all reported gaps, or the checklist item
+    itself when none were reported.
+
+    Args:
+        analyses: The findings per chunk.
+        dimensions: The checklist areas that were analysed.
+
+    Returns:
+        One bullet per missing element, or ``NOTHING_MISSING``.
+    """
+    findings = []
+    for dimension in dimensions:
+        reports = [
+            finding
+            for analysis in analyses
+            for finding in analysis.areas
+            if finding.area == dimension.id
+        ]
+        covering = [finding for finding in reports if finding.covered]
+        if covering:
+            findings.append([item for finding in covering for item in finding.missing])
+            continue
+        items = [item for finding in reports for item in finding.missing]
+        findings.append(items or [dimension.checklist.splitlines()[0].rstrip(":")])
+    return merge_findings(findings)
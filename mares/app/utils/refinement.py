@@ -0,0 +1,131 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from typing import Any
+
+# Reply of the BusinessAnalyst when the brief meets the Definition of Ready.
+NOTHING_MISSING = "NONE"
+
+_LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(?P<item>.+?)\s*$", re.MULTILINE)
+_NUMBERED_ANSWER = re.compile(r"^\s*\**(?P<number>\d+)\**\s*[.):-]\s*(?P<answer>.*)$")
+
+
+def pending_elements(missing_elements: Any) -> list[str]:
+    """Lists the Definition-of-Ready items that still need refinement.
+
+    Args:
+        missing_elements: The BusinessAnalyst output, either a list of items
+            or text with one bullet (or numbered) item per missing element.
+
+    Returns:
+        The missing elements, empty when the brief is complete.
+    """
+    if not missing_elements:
+        return []
+    if isinstance(missing_elements, list):
+        return [str(item).strip() for item in missing_elements if str(item).strip()]
+    text = str(missing_elements).strip()
+    if text.strip("*_. ").upper() == NOTHING_MISSING:
+        return []
+    items = [match.group("item") for match in _LIST_ITEM.finditer(text)]
+    return items or [text]
+
+
+def elements_key(elements: list[str]) -> str:
+    """Identifies a list of missing elements regardless of case and trailing
+    periods, which vary between BusinessAnalyst runs."""
+    return "\n".join(_normalize(element) for element in elements)
+
+
+def _normalize(element: str) -> str:
+    return element.lower().rstrip(".")
+
+
+def merge_findings(findings: list[Any]) -> str:
+    """Merges the missing elements found per checklist area.
+
+    Args:
+        findings: The outputs of the per-area analysts, in checklist order.
+
+    Returns:
+        One bullet per distinct missing element, or ``NOTHING_MISSING``.
+    """
+    merged: dict[str, str] = {}
+    for finding in findings:
+        for item in pending_elements(finding):
+            merged.setdefault(_normalize(item), item)
+    if not merged:
+        return NOTHING_MISSING
+    return "\n".join(f"- {item}" for item in merged.values())
+
+
+def apply_refinements(project_brief: str, answers: list[tuple[str, str]]) -> str:
+    """Appends the user's answers to several refinement questions to the brief.
+
+    Args:
+        project_brief: The current brief.
+        answers: ``(question, answer)`` pairs; empty answers are left out.
+
+    Returns:
+        The refined brief.
+    """
+    parts = [project_brief.rstrip()]
+    parts += [
+        f"**{question.strip()}**\n{answer.strip()}"
+        for question, answer in answers
+        if answer.strip()
+    ]
+    return "\n\n".join(parts)
+
+
+def render_refinement_form(questions: list[str]) -> str:
+    """Renders all pending refinement questions as one numbered form."""
+    items = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+    return (
+        f"📝 The brief needs more detail on {len(questions)} points. Please answer "
+        "them in a single reply, one numbered answer per point:\n\n"
+        f"{items}\n\nPoints you leave out will be asked again."
+    )
+
+
+def parse_form_answers(reply: str, questions: list[str]) -> list[tuple[str, str]]:
+    """Matches a reply to the refinement form with its questions.
+
+    Answers are recognised by their number (``1.``, ``2)``, ``3:``...) and
+    may span several lines. A reply without numbered answers is taken as
+    the answer to all questions at once.
+
+    Args:
+        reply: The user's reply to the form.
+        questions: The questions of the form, in form order.
+
+    Returns:
+        ``(question, answer)`` pairs for the answered questions.
+    """
+    answers: dict[int, list[str]] = {}
+    current = None
+    for line in reply.splitlines():
+        match = _NUMBERED_ANSWER.match(line)
+        if match and 1 <= int(match.group("number")) <= len(questions):
+            current = int(match.group("number")) - 1
+            answers.setdefault(current, []).append(match.group("answer"))
+        elif current is not None:
+            answers[current].append(line)
+    if not answers:
+        return [("; ".join(questions), reply)] if reply.strip() else []
+    return [
+        (questions[index], "\n".join(lines).strip())
+        for index, lines in sorted(answers.items())
+    ]
@@ -0,0 +1,142 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from collections import Counter
+from typing import Any
+
+from .stories import render_estimations, render_story_sections
+from .typing import Estimations, StoryArtifacts
+
+FIBONACCI_POINTS = (1, 2, 3, 5, 8, 13)
+
+
+def estimation_metrics(
+    estimations: Estimations,
+    artifacts: StoryArtifacts | None = None,
+    unestimated: list[str] | None = None,
+) -> dict[str, Any]:
+    """Computes the story point totals of the AgileCoach estimations.
+
+    Args:
+        estimations: The AgileCoach estimations.
+        artifacts: When given, its stories without an estimation row count
+            as unestimated.
+        unestimated: Ids of the stories whose estimation failed, from the
+            `unestimated` state entry; those without a row count as
+            unestimated.
+
+    Returns:
+        The number of stories, total and average points, the distribution
+        per point value and the stories without a valid Fibonacci estimate.
+    """
+    rows = estimations.rows
+    estimated = [r for r in rows if r.story_points in FIBONACCI_POINTS]
+    total = sum(r.story_points for r in estimated)
+    listed = {r.story_id for r in rows}
+    missing = (
+        [s.id for s in artifacts.stories if s.id not in listed] if artifacts else []
+    )
+    missing += [
+        story_id
+        for story_id in dict.fromkeys(unestimated or [])
+        if story_id not in listed and story_id not in missing
+    ]
+    return {
+        "stories": len(rows) + len(missing),
+        "total_points": total,
+        "average_points": round(total / len(estimated), 1) if estimated else 0.0,
+        "distribution": dict(
+            sorted(Counter(r.story_points for r in estimated).items())
+        ),
+        "unestimated": [r.story_id for r in rows if r not in estimated] + missing,
+    }
+
+
+def demote_headings(markdown: str, levels: int) -> str:
+    """Pushes every Markdown heading ``levels`` levels deeper (max ``######``)."""
+
+    def demote(match: re.Match[str]) -> str:
+        depth = min(len(match.group(1)) + levels, 6)
+        return f"{'#' * depth} "
+
+    return re.sub(r"^(#{1,6})\s+", demote, markdown, flags=re.MULTILINE)
+
+
+def render_metrics(metrics: dict[str, Any]) -> str:
+    """Renders the story point totals below the estimation table."""
+    lines = [
+        f"**Total estimated effort:** {metrics['total_points']} story points "
+        f"across {metrics['stories']} user stories "
+        f"(average {metrics['average_points']} points per story).",
+    ]
+    if metrics["distribution"]:
+        distribution = ", ".join(
+            f"{points} pts × {count}"  # noqa: RUF001
+            for points, count in metrics["distribution"].items()
+        )
+        lines.append(f"**Distribution:** {distribution}")
+    if metrics["unestimated"]:
+        lines.append(
+            "**Stories without a valid Fibonacci estimate:** "
+            + ", ".join(metrics["unestimated"])
+        )
+    return "\n\n".join(lines)
+
+
+def assemble_report(
+    validated_brief: str,
+    artifacts: StoryArtifacts,
+    estimations: Estimations,
+    executive_summary: str,
+    recommendations: str,
+    unestimated: list[str] | None = None,
+) -> str:
+    """Builds the MARES final report from the pipeline artifacts.
+
+    Sections 1 to 3 are rendered from session state; only the Executive
+    Summary and the Implementation Recommendations are written by a model.
+
+    Args:
+        validated_brief: The validated project brief.
+        artifacts: The ProductOwner artifacts.
+        estimations: The AgileCoach estimations.
+        executive_summary: Text of the Executive Summary section.
+        recommendations: Text of the Implementation Recommendations section.
+        unestimated: Ids of the stories whose estimation failed.
+
+    Returns:
+        The final report as Markdown.
+    """
+    sections = render_story_sections(artifacts)
+    actors_and_use_cases = "\n\n".join(
+        f"#### {title}\n\n{sections[title]}"
+        for title in ("Actors", "Use Cases")
+        if sections[title]
+    )
+    metrics = estimation_metrics(estimations, artifacts, unestimated)
+    table = render_estimations(estimations, artifacts)
+
+    parts = [
+        "# MARES: Functional Design & Estimation Report",
+        f"## Executive Summary\n\n{executive_summary.strip()}",
+        f"## 1. Validated Project Requirements\n\n{demote_headings(validated_brief.strip(), 2)}",
+        "## 2. Development Artifacts",
+        f"### 2.1 Actors and Use Cases\n\n{actors_and_use_cases or '_None identified._'}",
+        f"### 2.2 User Stories\n\n{sections['User Stories'] or '_None._'}",
+        f"### 2.3 Acceptance Criteria\n\n{demote_headings(sections['Acceptance Criteria'], 1) or '_None._'}",
+        f"## 3. Complexity Estimation\n\n{table}\n\n{render_metrics(metrics)}",
+        f"## 4. Implementation Recommendations\n\n{recommendations.strip()}",
+    ]
+    return "\n\n".join(parts) + "\n"
@@ -0,0 +1,121 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ComplexitySignals:
+    """What makes the input of a stage call hard.
+
+    Attributes:
+        input_tokens (int): Estimated prompt size.
+        stories (int): Number of user stories the stage works on.
+        gaps (int): Number of open Definition-of-Ready items.
+    """
+
+    input_tokens: int
+    stories: int = 0
+    gaps: int = 0
+
+
+@dataclass(frozen=True)
+class ComplexityScale:
+    """Size of each signal at which a call alone counts as complex.
+
+    Attributes:
+        input_tokens (float): Prompt size of a complex call.
+        stories (float): Story count of a complex call.
+        gaps (float): Open Definition-of-Ready items of a complex call.
+    """
+
+    input_tokens: float = 6000
+    stories: float = 20
+    gaps: float = 6
+
+
+def complexity_score(signals: ComplexitySignals, scale: ComplexityScale) -> float:
+    """Scores a call; 1 or more means it needs the stronger model tier."""
+    return (
+        signals.input_tokens / scale.input_tokens
+        + signals.stories / scale.stories
+        + signals.gaps / scale.gaps
+    )
+
+
+def call_cost(
+    prices: tuple[float, float], input_tokens: int, output_tokens: int
+) -> float:
+    """Cost in USD of a call, given the (input, output) price per 1M tokens."""
+    return (input_tokens * prices[0] + output_tokens * prices[1]) / 1_000_000
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    """The model tier picked for one call.
+
+    Attributes:
+        model (str): The model to call.
+        score (float): Complexity score of the call.
+        reason (str): Why the model was picked, for the logs.
+    """
+
+    model: str
+    score: float
+    reason: str
+
+
+def choose_tier(
+    score: float,
+    strong_model: str,
+    fast_model: str,
+    threshold: float = 1.0,
+    strong_latency: float | None = None,
+    strong_cost: float | None = None,
+    latency_budget: float = 0,
+    cost_budget: float = 0,
+) -> RoutingDecision:
+    """Picks the fast or strong model tier for a call.
+
+    Args:
+        score: Complexity score of the call.
+        strong_model: Model of the strong (slow, expensive) tier.
+        fast_model: Model of the fast tier.
+        threshold: Score from which the strong tier is used.
+        strong_latency: Expected latency in seconds on the strong model.
+        strong_cost: Expected cost in USD on the strong model.
+        latency_budget: Maximum latency of a call in seconds, 0 for none.
+        cost_budget: Maximum cost of a call in USD, 0 for none.
+
+    Returns:
+        The decision; complex calls stay on the fast tier when the strong
+        tier does not fit the budget.
+    """
+    if score < threshold:
+        return RoutingDecision(fast_model, score, "simple input")
+    if (
+        latency_budget
+        and strong_latency is not None
+        and strong_latency > latency_budget
+    ):
+        return RoutingDecision(
+            fast_model,
+            score,
+            f"{strong_model} latency {strong_latency:.0f}s over budget",
+        )
+    if cost_budget and strong_cost is not None and strong_cost > cost_budget:
+        return RoutingDecision(
+            fast_model, score, f"{strong_model} cost ${strong_cost:.4f} over budget"
+        )
+    return RoutingDecision(strong_model, score, "complex input")
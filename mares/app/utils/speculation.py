@@ -0,0 +1,199 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import threading
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass, field
+from typing import Any
+
+from .typing import BriefDigest, UserStory
+
+
+@dataclass
+class DigestDiff:
+    """The sections of a brief digest that differ from an earlier digest.
+
+    Attributes:
+        added (list): IDs of the sections that are new.
+        changed (list): IDs of the sections whose text changed.
+        removed (list): IDs of the sections that are gone.
+    """
+
+    added: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    @property
+    def unchanged(self) -> bool:
+        """Whether both digests have the same sections and texts."""
+        return not (self.added or self.changed or self.removed)
+
+    @property
+    def affected(self) -> list[str]:
+        """IDs of the added and changed sections, whose stories need writing."""
+        return self.changed + self.added
+
+
+def diff_digests(old: BriefDigest, new: BriefDigest) -> DigestDiff:
+    """Compares two digests of a brief section by section, by section ID."""
+    before = {section.id: section.text for section in old.sections}
+    after = {section.id: section.text for section in new.sections}
+    return DigestDiff(
+        added=[id_ for id_ in after if id_ not in before],
+        changed=[id_ for id_ in after if id_ in before and after[id_] != before[id_]],
+        removed=[id_ for id_ in before if id_ not in after],
+    )
+
+
+@dataclass
+class RegenerationPlan:
+    """The user stories to write again after the brief changed.
+
+    Attributes:
+        sections (list): IDs of the sections to write the stories of, in
+            brief order.
+        stale (list): IDs of the stories derived from changed or removed
+            sections, replaced by the stories written for `sections`.
+    """
+
+    sections: list[str] = field(default_factory=list)
+    stale: list[str] = field(default_factory=list)
+
+
+def plan_regeneration(
+    diff: DigestDiff, digest: BriefDigest, stories: list[UserStory]
+) -> RegenerationPlan | None:
+    """Traces the changes to a brief through the stories derived from it.
+
+    Stories derived from a changed or removed section are stale. Stories are
+    written again for the added and changed sections, and for the other
+    sections the stale stories were derived from; all other stories are
+    kept as they are.
+
+    Args:
+        diff: The changes since the stories were written.
+        digest: The digest of the changed brief.
+        stories: The stories written before the change.
+
+    Returns:
+        The plan, or None when sections changed or were removed and some
+        stories do not record the sections they are derived from.
+    """
+    outdated = set(diff.changed + diff.removed)
+    if outdated and any(not story.sections for story in stories):
+        return None
+    stale = [story for story in stories if outdated.intersection(story.sections)]
+    wanted = set(diff.affected).union(*(story.sections for story in stale))
+    return RegenerationPlan(
+        sections=[section.id for section in digest.sections if section.id in wanted],
+        stale=[story.id for story in stale],
+    )
+
+
+@dataclass
+class Speculation:
+    """Work started ahead of the turn that needs it.
+
+    Attributes:
+        key (str): Identifies the input the run was started on, e.g. the
+            brief.
+        task (Task): The run, on the event loop that started it.
+    """
+
+    key: str
+    task: asyncio.Task
+
+
+def _cancel(task: asyncio.Task) -> None:
+    """Cancels a task from any thread, unless its event loop is gone."""
+    loop = task.get_loop()
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(task.cancel)
+
+
+class Speculator:
+    """Runs speculative work in the background, one run per scope (e.g. per
+    session).
+
+    A run is a task on the event loop of the invocation that starts it, so
+    that it shares the model clients, the rate limiter and the LLM cache
+    with the pipeline on that loop instead of using them from another
+    thread. It outlives the invocation when the server keeps one event
+    loop; where every invocation runs its own loop, the run is cancelled
+    with it and never taken. A new run for a scope cancels the previous
+    one.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._runs: dict[str, Speculation] = {}
+
+    def start(
+        self,
+        scope: str,
+        key: str,
+        work: Callable[[], Coroutine[Any, Any, Any]],
+    ) -> bool:
+        """Starts a speculative run for a scope on the running event loop,
+        unless one already runs there on the same input.
+
+        Args:
+            scope: The scope the run belongs to.
+            key: Identifies the input the run works on.
+            work: Builds the coroutine to run.
+
+        Returns:
+            Whether a new run was started.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            current = self._runs.get(scope)
+            if (
+                current is not None
+                and current.key == key
+                and current.task.get_loop() is loop
+                and not current.task.cancelled()
+            ):
+                return False
+            if current is not None:
+                _cancel(current.task)
+            self._runs[scope] = Speculation(key=key, task=loop.create_task(work()))
+        logging.info(f"Started a speculative run for {scope}")
+        return True
+
+    def take(self, scope: str) -> Speculation | None:
+        """Removes and returns the speculative run of a scope, if it can
+        still be awaited on the running event loop."""
+        with self._lock:
+            speculation = self._runs.pop(scope, None)
+        if speculation is None:
+            return None
+        if speculation.task.get_loop() is not asyncio.get_running_loop():
+            _cancel(speculation.task)
+            return None
+        if speculation.task.cancelled():
+            return None
+        return speculation
+
+    def cancel(self, scope: str) -> None:
+        """Cancels the speculative run of a scope, if any."""
+        with self._lock:
+            speculation = self._runs.pop(scope, None)
+        if speculation is not None:
+            _cancel(speculation.task)
+
+
+speculator = Speculator()
@@ -0,0 +1,47 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sqlite3
+import threading
+from typing import Any, ClassVar
+
+
+class SqliteStore:
+    """Base of the pipeline stores kept in a SQLite file.
+
+    The file, its directory and the ``schema`` table are created on the
+    first ``_connect``, so that importing the pipeline does not touch the
+    file system. The connection is shared by all threads of the process;
+    subclasses hold ``_lock`` while they use it.
+    """
+
+    schema: ClassVar[str]
+    """``CREATE TABLE IF NOT EXISTS`` statement of the store table."""
+    connect_options: ClassVar[dict[str, Any]] = {}
+    """Extra arguments of ``sqlite3.connect``."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False, **self.connect_options
+            )
+            self._connection.execute(self.schema)
+        return self._connection
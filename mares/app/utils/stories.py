@@ -0,0 +1,447 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+from typing import Any
+
+from pydantic import ValidationError
+
+from .minhash import cluster_near_duplicates
+from .typing import (
+    Estimations,
+    StoryArtifacts,
+    UseCase,
+    UserStory,
+)
+
+STORY_ID_PATTERN = re.compile(r"\bUS-(\d+)\b")
+
+# Canonical order of the ProductOwner output sections.
+SECTION_ORDER = ["Actors", "Use Cases", "User Stories", "Acceptance Criteria"]
+
+ESTIMATION_TABLE_HEADER = (
+    "| User Story | Story Points | Justification |\n"
+    "|------------|--------------|---------------|"
+)
+
+
+def format_story_id(number: int) -> str:
+    """Formats a story number as ``US-001``."""
+    return f"US-{number:03d}"
+
+
+def load_story_artifacts(value: Any) -> StoryArtifacts:
+    """Reads the ProductOwner output from session state.
+
+    Args:
+        value: The ``StoryArtifacts`` written by the ProductOwner, as a model,
+            dict or JSON string.
+
+    Returns:
+        The typed artifacts, empty when nothing could be read.
+    """
+    if isinstance(value, StoryArtifacts):
+        return value
+    if not value:
+        return StoryArtifacts()
+    try:
+        if isinstance(value, str):
+            return StoryArtifacts.model_validate_json(value)
+        return StoryArtifacts.model_validate(value)
+    except ValidationError:
+        return StoryArtifacts()
+
+
+def load_estimations(value: Any) -> Estimations:
+    """Reads the AgileCoach output from session state.
+
+    Args:
+        value: The ``Estimations`` written by the AgileCoach, as a model,
+            dict or JSON string.
+
+    Returns:
+        The typed estimations, empty when nothing could be read.
+    """
+    if isinstance(value, Estimations):
+        return value
+    if not value:
+        return Estimations()
+    try:
+        if isinstance(value, str):
+            return Estimations.model_validate_json(value)
+        return Estimations.model_validate(value)
+    except ValidationError:
+        return Estimations()
+
+
+def renumber_stories(
+    artifacts: StoryArtifacts, start: int = 1
+) -> tuple[StoryArtifacts, int]:
+    """Renumbers the stories of one document into a contiguous id range.
+
+    Args:
+        artifacts: ProductOwner artifacts.
+        start: The first story number to assign.
+
+    Returns:
+        The renumbered artifacts and the next free story number.
+    """
+    stories = [
+        story.model_copy(update={"id": format_story_id(start + i)})
+        for i, story in enumerate(artifacts.stories)
+    ]
+    return artifacts.model_copy(update={"stories": stories}), start + len(stories)
+
+
+def merge_story_artifacts(documents: list[StoryArtifacts]) -> StoryArtifacts:
+    """Merges ProductOwner artifacts produced for disjoint slices of a brief.
+
+    Documents are merged in the given order, so the result is deterministic
+    for a deterministic slicing. Story ids are renumbered globally
+    (``US-001``...), actors are de-duplicated and use cases are grouped per
+    actor.
+
+    Args:
+        documents: ProductOwner artifacts, one per slice.
+
+    Returns:
+        The merged artifacts.
+    """
+    actors: dict[str, str] = {}
+    use_cases: dict[str, UseCase] = {}
+    stories: list[UserStory] = []
+    next_id = 1
+    for document in documents:
+        renumbered, next_id = renumber_stories(document, next_id)
+        stories.extend(renumbered.stories)
+        for actor in document.actors:
+            actors.setdefault(actor.strip().lower(), actor.strip())
+        for use_case in document.use_cases:
+            merged = use_cases.setdefault(
+                use_case.actor.strip().lower(), UseCase(actor=use_case.actor.strip())
+            )
+            merged.goals.extend(g for g in use_case.goals if g not in merged.goals)
+    return StoryArtifacts(
+        actors=list(actors.values()),
+        use_cases=list(use_cases.values()),
+        stories=stories,
+    )
+
+
+def revise_story_artifacts(
+    artifacts: StoryArtifacts, revision: StoryArtifacts
+) -> tuple[StoryArtifacts, list[str]]:
+    """Applies new and revised stories to existing artifacts.
+
+    Revised stories keep the id of the story they replace; stories with an
+    unknown id are new and numbered after the existing ones. Actors and use
+    case goals are added when missing.
+
+    Args:
+        artifacts: The existing artifacts.
+        revision: The new and revised stories, actors and use cases.
+
+    Returns:
+        The revised artifacts and the ids of the new and revised stories.
+    """
+    stories = list(artifacts.stories)
+    index = {story.id: position for position, story in enumerate(stories)}
+    numbers = [
+        int(match.group(1))
+        for story in stories
+        if (match := STORY_ID_PATTERN.search(story.id))
+    ]
+    next_id = max(numbers, default=0) + 1
+    touched = []
+    for story in revision.stories:
+        if story.id in index and story.id not in touched:
+            stories[index[story.id]] = story
+        else:
+            story = story.model_copy(update={"id": format_story_id(next_id)})
+            next_id += 1
+            stories.append(story)
+        touched.append(story.id)
+
+    actors = list(artifacts.actors)
+    known = {actor.strip().lower() for actor in actors}
+    actors += [actor for actor in revision.actors if actor.strip().lower() not in known]
+    use_cases = [use_case.model_copy(deep=True) for use_case in artifacts.use_cases]
+    by_actor = {use_case.actor.strip().lower(): use_case for use_case in use_cases}
+    for use_case in revision.use_cases:
+        merged = by_actor.get(use_case.actor.strip().lower())
+        if merged is None:
+            use_cases.append(use_case)
+            continue
+        merged.goals.extend(g for g in use_case.goals if g not in merged.goals)
+    return StoryArtifacts(actors=actors, use_cases=use_cases, stories=stories), touched
+
+
+def story_sentence(story: UserStory) -> str:
+    """The plain ``As a .., I want .., so that ..`` sentence of a story."""
+    return f"As a {story.role}, I want {story.action}, so that {story.benefit}"
+
+
+def compact_story(story: UserStory, criteria: bool = True) -> str:
+    """Renders one story as compact text for a downstream prompt."""
+    lines = [f"{story.id}: {story_sentence(story)}"]
+    if criteria:
+        lines.extend(
+            f"  - GIVEN {c.given} WHEN {c.when} THEN {c.then}"
+            for c in story.acceptance_criteria
+        )
+    return "\n".join(lines)
+
+
+def compact_stories(artifacts: StoryArtifacts, criteria: bool = True) -> str:
+    """Renders the stories as compact text for downstream prompts.
+
+    Args:
+        artifacts: ProductOwner artifacts.
+        criteria: Whether to add one line per acceptance criterion.
+
+    Returns:
+        One line per story (and criterion).
+    """
+    return "\n".join(compact_story(s, criteria) for s in artifacts.stories)
+
+
+def render_story_sections(artifacts: StoryArtifacts) -> dict[str, str]:
+    """Renders the ProductOwner artifacts as Markdown, one body per section.
+
+    Args:
+        artifacts: ProductOwner artifacts.
+
+    Returns:
+        A mapping of the ``SECTION_ORDER`` titles to their Markdown body,
+        empty for sections without content.
+    """
+    criteria = []
+    for story in artifacts.stories:
+        scenarios = [f"### {story.id}"]
+        for criterion in story.acceptance_criteria:
+            title = (
+                f"*Scenario: {criterion.scenario}*  \n" if criterion.scenario else ""
+            )
+            scenarios.append(
+                f"{title}**GIVEN** {criterion.given}  \n"
+                f"**WHEN** {criterion.when}  \n"
+                f"**THEN** {criterion.then}"
+            )
+        if len(scenarios) > 1:
+            criteria.append("\n\n".join(scenarios))
+    return {
+        "Actors": "\n".join(f"- {actor}" for actor in artifacts.actors),
+        "Use Cases": "\n".join(
+            f"- **{u.actor}**: {'; '.join(u.goals)}" for u in artifacts.use_cases
+        ),
+        "User Stories": "\n".join(
+            f"- **{s.id}**: **As a** {s.role}, **I want** {s.action}, "
+            f"**so that** {s.benefit}"
+            for s in artifacts.stories
+        ),
+        "Acceptance Criteria": "\n\n".join(criteria),
+    }
+
+
+def render_story_artifacts(artifacts: StoryArtifacts) -> str:
+    """Renders the ProductOwner artifacts as a Markdown document."""
+    sections = render_story_sections(artifacts)
+    return "\n\n".join(
+        f"## {title}\n\n{sections[title]}" for title in SECTION_ORDER if sections[title]
+    )
+
+
+def _cell(text: str) -> str:
+    return " ".join(text.split()).replace("|", "\\|")
+
+
+def render_estimations(
+    estimations: Estimations, artifacts: StoryArtifacts | None = None
+) -> str:
+    """Renders the estimations as the AgileCoach Markdown table.
+
+    Args:
+        estimations: AgileCoach estimations.
+        artifacts: When given, story ids are followed by the story action.
+
+    Returns:
+        The ``| User Story | Story Points | Justification |`` table.
+    """
+    actions = {s.id: s.action for s in artifacts.stories} if artifacts else {}
+    rows = [ESTIMATION_TABLE_HEADER]
+    for row in estimations.rows:
+        story = row.story_id
+        if story in actions:
+            story = f"{story}: {actions[story]}"
+        rows.append(
+            f"| {_cell(story)} | {row.story_points or '?'} | {_cell(row.justification)} |"
+        )
+    return "\n".join(rows)
+
+
+def complete_story_objects(partial_json: str) -> list[dict[str, Any]]:
+    """Extracts the user stories that are complete in a streamed JSON document.
+
+    Used on the ProductOwner output while it is still being streamed: every
+    object of the ``stories`` array whose closing brace has arrived is
+    returned.
+
+    Args:
+        partial_json: The ProductOwner output received so far.
+
+    Returns:
+        The complete story objects, in document order.
+    """
+    match = re.search(r'"stories"\s*:\s*\[', partial_json)
+    if not match:
+        return []
+    objects = []
+    depth = 0
+    start = None
+    in_string = escaped = False
+    for i in range(match.end(), len(partial_json)):
+        char = partial_json[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            if depth == 0 and char == "{":
+                start = i
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth < 0:
+                break
+            if depth == 0 and start is not None:
+                try:
+                    objects.append(json.loads(partial_json[start : i + 1]))
+                except json.JSONDecodeError:
+                    pass
+                start = None
+    return objects
+
+
+def balance_slices(items: list[str], slots: int) -> list[list[str]]:
+    """Distributes work items over at most ``slots`` balanced slices.
+
+    Items are assigned greedily, largest first, to the currently lightest
+    slice, and keep their original relative order within a slice. Empty
+    slices are dropped.
+
+    Args:
+        items: Text of the work items, e.g. one epic description each.
+        slots: Maximum number of slices.
+
+    Returns:
+        The non-empty slices.
+    """
+    slots = max(1, slots)
+    loads = [0] * slots
+    assignment: dict[int, int] = {}
+    for index in sorted(range(len(items)), key=lambda i: -len(items[i])):
+        slot = loads.index(min(loads))
+        assignment[index] = slot
+        loads[slot] += len(items[index]) or 1
+    slices: list[list[str]] = [[] for _ in range(slots)]
+    for index, item in enumerate(items):
+        slices[assignment[index]].append(item)
+    return [s for s in slices if s]
+
+
+def select_anchors(stories: list[UserStory], count: int) -> list[UserStory]:
+    """Selects reference stories spread over the range of story sizes.
+
+    Story size is approximated by the length of the story with its
+    acceptance criteria, a local stand-in for its complexity.
+
+    Args:
+        stories: The stories to select from.
+        count: Number of anchors to select.
+
+    Returns:
+        At most ``count`` stories, in their original order.
+    """
+    if count <= 0 or not stories:
+        return []
+    by_size = sorted(range(len(stories)), key=lambda i: len(compact_story(stories[i])))
+    if count == 1:
+        picked = {by_size[len(by_size) // 2]}
+    else:
+        last = len(by_size) - 1
+        picked = {by_size[round(i * last / (count - 1))] for i in range(count)}
+    return [story for i, story in enumerate(stories) if i in picked]
+
+
+def story_clusters(stories: list[UserStory], threshold: float) -> dict[str, list[str]]:
+    """Finds the near-duplicate stories, e.g. the same story for several
+    roles.
+
+    Stories are compared on their action, benefit and criteria, leaving the
+    role out, with MinHash/LSH.
+
+    Args:
+        stories: The stories.
+        threshold: Minimum estimated Jaccard similarity of near-duplicates.
+
+    Returns:
+        The ids of the near-duplicates of a story by the id of its first
+        occurrence, for the stories that have near-duplicates.
+    """
+    texts = [
+        " ".join(
+            [story.action, story.benefit]
+            + [f"{c.given} {c.when} {c.then}" for c in story.acceptance_criteria]
+        )
+        for story in stories
+    ]
+    return {
+        stories[group[0]].id: [stories[i].id for i in group[1:]]
+        for group in cluster_near_duplicates(texts, threshold, shingle_size=2)
+        if len(group) > 1
+    }
+
+
+def collapse_duplicates(
+    artifacts: StoryArtifacts, clusters: dict[str, list[str]]
+) -> StoryArtifacts:
+    """Leaves out the near-duplicates of the stories in ``clusters``."""
+    present = {story.id for story in artifacts.stories}
+    duplicates = {
+        duplicate
+        for story_id, members in clusters.items()
+        if story_id in present
+        for duplicate in members
+    }
+    stories = [story for story in artifacts.stories if story.id not in duplicates]
+    return artifacts.model_copy(update={"stories": stories})
+
+
+def render_duplicates(artifacts: StoryArtifacts, clusters: dict[str, list[str]]) -> str:
+    """Lists the near-duplicates left out by `collapse_duplicates`, one line
+    per story, e.g. ``US-004 (as a manager): same as US-001``."""
+    by_id = {story.id: story for story in artifacts.stories}
+    return "\n".join(
+        f"{member} (as a {by_id[member].role}): same as {story_id}"
+        for story_id, members in clusters.items()
+        if story_id in by_id
+        for member in members
+        if member in by_id
+    )
@@ -17,6 +17,7 @@ from typing import (
 
 from pydantic import (
     BaseModel,
+    Field,
 )
 
 
@@ -29,3 +30,105 @@ class Feedback(BaseModel):
     log_type: Literal["feedback"] = "feedback"
     service_name: Literal["mares"] = "mares"
     user_id: str = ""
+
+
+class BriefSection(BaseModel):
+    """A section of the brief digest, with an ID that stays stable while the
+    brief is refined."""
+
+    id: str
+    title: str
+    text: str
+
+
+class BriefDigest(BaseModel):
+    """Compact, sectioned form of a brief that downstream prompts reference."""
+
+    sections: list[BriefSection] = Field(default_factory=list)
+
+
+class AreaFinding(BaseModel):
+    """What one chunk of a brief shows about one Definition-of-Ready area."""
+
+    area: str = Field(description="Id of the checklist area, e.g. goals")
+    covered: bool = Field(description="Whether the chunk addresses the area")
+    missing: list[str] = Field(default_factory=list)
+
+
+class ChunkAnalysis(BaseModel):
+    """The BusinessAnalyst findings on one chunk of a large brief."""
+
+    areas: list[AreaFinding] = Field(default_factory=list)
+
+
+class Epic(BaseModel):
+    """An epic of the validated brief, grouping related user stories."""
+
+    name: str
+    actors: list[str] = Field(default_factory=list)
+    summary: str = ""
+
+
+class EpicPlan(BaseModel):
+    """The actors/epics split of a validated brief."""
+
+    epics: list[Epic]
+
+
+class ReportNarrative(BaseModel):
+    """The model-written sections of the final report."""
+
+    executive_summary: str
+    recommendations: str
+
+
+class AcceptanceCriterion(BaseModel):
+    """A Gherkin acceptance criterion of a user story."""
+
+    scenario: str = ""
+    given: str
+    when: str
+    then: str
+
+
+class UserStory(BaseModel):
+    """A numbered user story with its acceptance criteria."""
+
+    id: str = Field(description="Story id, e.g. US-001")
+    role: str
+    action: str
+    benefit: str
+    acceptance_criteria: list[AcceptanceCriterion] = Field(default_factory=list)
+    sections: list[str] = Field(
+        default_factory=list,
+        description="IDs of the brief sections the story is derived from",
+    )
+
+
+class UseCase(BaseModel):
+    """The high-level goals of one actor."""
+
+    actor: str
+    goals: list[str] = Field(default_factory=list)
+
+
+class StoryArtifacts(BaseModel):
+    """The ProductOwner output: actors, use cases and user stories."""
+
+    actors: list[str] = Field(default_factory=list)
+    use_cases: list[UseCase] = Field(default_factory=list)
+    stories: list[UserStory] = Field(default_factory=list)
+
+
+class EstimationRow(BaseModel):
+    """The Story Point estimate of one user story."""
+
+    story_id: str = Field(description="Id of the estimated story, e.g. US-001")
+    story_points: int = Field(description="One of 1, 2, 3, 5, 8, 13")
+    justification: str
+
+
+class Estimations(BaseModel):
+    """The AgileCoach output: one estimation row per user story."""
+
+    rows: list[EstimationRow] = Field(default_factory=list)
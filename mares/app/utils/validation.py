@@ -0,0 +1,102 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .report import FIBONACCI_POINTS
+from .typing import EstimationRow, Estimations, UserStory
+
+_STORY_FIELDS = ("role", "action", "benefit")
+_GHERKIN_STEPS = ("given", "when", "then")
+
+
+def story_problems(story: UserStory) -> list[str]:
+    """Checks a user story against the "As a [role], I want [action], so
+    that [benefit]" format and its Gherkin acceptance criteria.
+
+    Args:
+        story: The user story.
+
+    Returns:
+        What is wrong with the story, empty when it is well-formed.
+    """
+    problems = [
+        f"the {field} is empty"
+        for field in _STORY_FIELDS
+        if not getattr(story, field).strip()
+    ]
+    if not story.acceptance_criteria:
+        problems.append("there are no acceptance criteria in GIVEN/WHEN/THEN form")
+    for number, criterion in enumerate(story.acceptance_criteria, 1):
+        missing = [
+            step.upper()
+            for step in _GHERKIN_STEPS
+            if not getattr(criterion, step).strip()
+        ]
+        if missing:
+            problems.append(
+                f"acceptance criterion {number} has no {'/'.join(missing)} step"
+            )
+    return problems
+
+
+def row_problems(row: EstimationRow) -> list[str]:
+    """Checks an estimation row of the ``| User Story | Story Points |
+    Justification |`` table.
+
+    Args:
+        row: The estimation row.
+
+    Returns:
+        What is wrong with the row, empty when it is well-formed.
+    """
+    problems = []
+    if row.story_points not in FIBONACCI_POINTS:
+        problems.append(
+            f"{row.story_points} story points is not one of "
+            f"{', '.join(map(str, FIBONACCI_POINTS))}"
+        )
+    if not row.justification.strip():
+        problems.append("the justification is empty")
+    return problems
+
+
+def estimation_problems(
+    stories: list[UserStory], estimations: Estimations
+) -> dict[str, list[str]]:
+    """Checks that every user story has exactly one well-formed estimation
+    row.
+
+    Table rows with too few columns are dropped when a Markdown table is
+    read, so they show up as missing rows.
+
+    Args:
+        stories: The estimated user stories.
+        estimations: The estimation rows.
+
+    Returns:
+        What is wrong, by id of the stories whose estimate is missing,
+        duplicated or malformed.
+    """
+    rows: dict[str, list[EstimationRow]] = {}
+    for row in estimations.rows:
+        rows.setdefault(row.story_id, []).append(row)
+    problems = {}
+    for story in stories:
+        found = rows.get(story.id, [])
+        if not found:
+            problems[story.id] = ["there is no estimation row"]
+        elif len(found) > 1:
+            problems[story.id] = [f"there are {len(found)} estimation rows"]
+        elif row_problems(found[0]):
+            problems[story.id] = row_problems(found[0])
+    return problems
@@ -99,6 +99,15 @@ class SideBar:
                 self.agent_callable_path = None
                 self.remote_agent_engine_id = None
 
+            # A custom endpoint only serves the whole-conversation stream
+            self.server_history = use_agent_path != "Remote URL" and self.st.checkbox(
+                label="Server-side history",
+                value=os.environ.get("SERVER_HISTORY", "").lower() in ("1", "true"),
+                help="If checked, only the new message is sent on each turn and "
+                "the agent rebuilds the conversation from its session service, "
+                "instead of the whole conversation being sent every turn.",
+            )
+
             col1, col2, col3 = self.st.columns(3)
             with col1:
                 if self.st.button("+ New chat"):
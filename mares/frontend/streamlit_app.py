@@ -179,6 +179,7 @@ def handle_user_input(side_bar: SideBar) -> None:
             agent_callable_path=side_bar.agent_callable_path,
             url=side_bar.url_input_field,
             authenticate_request=side_bar.should_authenticate_request,
+            server_history=side_bar.server_history,
         )
         update_chat_title()
         if len(parts) > 1:
@@ -199,6 +200,7 @@ def generate_ai_response(
     agent_callable_path: str | None = None,
     url: str | None = None,
     authenticate_request: bool = False,
+    server_history: bool = False,
 ) -> None:
     """Generate and display the AI's response to the user's input."""
     ai_message = st.chat_message("ai")
@@ -210,6 +212,7 @@ def generate_ai_response(
             agent_callable_path=agent_callable_path,
             url=url,
             authenticate_request=authenticate_request,
+            server_history=server_history,
         )
         get_chain_response(st=st, client=client, stream_handler=stream_handler)
         status.update(label="Finished!", state="complete", expanded=False)
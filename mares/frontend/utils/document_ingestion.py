@@ -0,0 +1,285 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local text extraction of brief attachments.
+
+Documents are converted to normalized text (tables as Markdown) once, and
+the text is cached on disk by content hash, so that an attachment is sent
+to the agent as a compact text part instead of a base64 payload.
+"""
+
+import csv
+import hashlib
+import io
+import logging
+import os
+import re
+import zipfile
+from collections.abc import Callable
+from xml.etree import ElementTree
+
+_WORD = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_SHEET = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELATIONSHIP = (
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+)
+_PACKAGE_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def content_hash(data: bytes) -> str:
+    """Hex digest identifying a file by its content."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes line endings and whitespace of extracted text."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+    lines = [re.sub(r"[ \t\f\v]+", " ", line).strip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def markdown_table(rows: list[list[str]]) -> str:
+    """Renders rows as a Markdown table, the first row being the header."""
+    rows = [row for row in rows if any(cell.strip() for cell in row)]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+
+    def line(row: list[str]) -> str:
+        cells = [cell.replace("|", "\\|").replace("\n", " ").strip() for cell in row]
+        return "| " + " | ".join(cells + [""] * (width - len(cells))) + " |"
+
+    return "\n".join(
+        [line(rows[0]), "|" + " --- |" * width, *(line(row) for row in rows[1:])]
+    )
+
+
+def _decode(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def _extract_txt(data: bytes) -> str:
+    return _decode(data)
+
+
+def _extract_delimited(data: bytes, delimiter: str) -> str:
+    rows = csv.reader(io.StringIO(_decode(data)), delimiter=delimiter)
+    return markdown_table(list(rows))
+
+
+def _extract_csv(data: bytes) -> str:
+    return _extract_delimited(data, ",")
+
+
+def _extract_tsv(data: bytes) -> str:
+    return _extract_delimited(data, "\t")
+
+
+def _extract_rtf(data: bytes) -> str:
+    text = _decode(data)
+    # Drop groups that hold no document text (fonts, colors, styles...).
+    text = re.sub(
+        r"\{\\(?:\*|fonttbl|colortbl|stylesheet|info|pict)"
+        r"[^{}]*(?:\{[^{}]*\}[^{}]*)*\}",
+        "",
+        text,
+    )
+    text = re.sub(
+        r"\\'([0-9a-fA-F]{2})",
+        lambda m: bytes.fromhex(m.group(1)).decode("cp1252"),
+        text,
+    )
+    text = re.sub(r"\\u(-?\d+)\??", lambda m: chr(int(m.group(1)) % 65536), text)
+    text = re.sub(r"\\(?:par|line)\b ?", "\n", text)
+    text = re.sub(r"\\tab\b ?", "\t", text)
+    text = re.sub(r"\\([{}\\])", r"\1", text)
+    text = re.sub(r"\\[a-zA-Z]+-?\d* ?", "", text)
+    return text.replace("{", "").replace("}", "")
+
+
+def _word_text(element: ElementTree.Element) -> str:
+    return "".join(node.text or "" for node in element.iter(f"{_WORD}t"))
+
+
+def _extract_docx(data: bytes) -> str:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        body = ElementTree.fromstring(archive.read("word/document.xml")).find(
+            f"{_WORD}body"
+        )
+    blocks = []
+    for element in body if body is not None else []:
+        if element.tag == f"{_WORD}p":
+            style = element.find(f"{_WORD}pPr/{_WORD}pStyle")
+            name = style.get(f"{_WORD}val", "") if style is not None else ""
+            level = re.match(r"Heading(\d)", name)
+            text = _word_text(element)
+            if level and text:
+                text = f"{'#' * int(level.group(1))} {text}"
+            blocks.append(text)
+        elif element.tag == f"{_WORD}tbl":
+            rows = [
+                [_word_text(cell) for cell in row.iter(f"{_WORD}tc")]
+                for row in element.iter(f"{_WORD}tr")
+            ]
+            blocks.append(markdown_table(rows))
+    return "\n\n".join(blocks)
+
+
+def _column_index(reference: str) -> int:
+    letters = re.match(r"[A-Z]+", reference)
+    if letters is None:
+        return 0
+    index = 0
+    for letter in letters.group(0):
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return max(index - 1, 0)
+
+
+def _extract_xlsx(data: bytes) -> str:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        shared = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+            shared = [
+                "".join(node.text or "" for node in item.iter(f"{_SHEET}t"))
+                for item in root.iter(f"{_SHEET}si")
+            ]
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        targets = {
+            rel.get("Id"): rel.get("Target", "").lstrip("/")
+            for rel in ElementTree.fromstring(
+                archive.read("xl/_rels/workbook.xml.rels")
+            ).iter(f"{_PACKAGE_RELATIONSHIP}Relationship")
+        }
+        blocks = []
+        for sheet in workbook.iter(f"{_SHEET}sheet"):
+            target = targets.get(sheet.get(_RELATIONSHIP), "")
+            path = target if target.startswith("xl/") else f"xl/{target}"
+            rows = []
+            worksheet = ElementTree.fromstring(archive.read(path))
+            for row in worksheet.iter(f"{_SHEET}row"):
+                cells: dict[int, str] = {}
+                for cell in row.iter(f"{_SHEET}c"):
+                    value = cell.find(f"{_SHEET}v")
+                    if cell.get("t") == "s" and value is not None:
+                        text = shared[int(value.text or 0)]
+                    elif cell.get("t") == "inlineStr":
+                        text = "".join(
+                            node.text or "" for node in cell.iter(f"{_SHEET}t")
+                        )
+                    else:
+                        text = value.text if value is not None and value.text else ""
+                    cells[_column_index(cell.get("r", ""))] = text
+                if cells:
+                    rows.append([cells.get(i, "") for i in range(max(cells) + 1)])
+            table = markdown_table(rows)
+            if table:
+                blocks.append(f"### {sheet.get('name', 'Sheet')}\n\n{table}")
+    return "\n\n".join(blocks)
+
+
+def _extract_pdf(data: bytes) -> str:
+    # Optional dependency (`documents` extra); PDFs are sent as-is without it.
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+EXTRACTORS: dict[str, Callable[[bytes], str]] = {
+    ".txt": _extract_txt,
+    ".md": _extract_txt,
+    ".csv": _extract_csv,
+    ".tsv": _extract_tsv,
+    ".rtf": _extract_rtf,
+    ".docx": _extract_docx,
+    ".xlsx": _extract_xlsx,
+    ".pdf": _extract_pdf,
+}
+
+
+class ExtractionCache:
+    """On-disk cache of extracted text, keyed by content hash."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key: str) -> str | None:
+        """Returns the cached text of a file, if any."""
+        try:
+            with open(self._path(key), encoding="utf-8") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        """Stores the text of a file; failures only cost a re-extraction."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                file.write(text)
+            os.replace(temporary, self._path(key))
+        except OSError as e:
+            logging.warning(f"Caching extracted text failed: {e}")
+
+
+extraction_cache = ExtractionCache(
+    os.path.join(
+        os.getenv("MARES_CACHE_DIR", os.path.expanduser("~/.cache/mares")),
+        "extracted",
+    )
+)
+
+
+def extract_document(
+    data: bytes, file_name: str, cache: ExtractionCache | None = None
+) -> str | None:
+    """Extracts the normalized text of a document, using the cache.
+
+    Args:
+        data: The file content.
+        file_name: Name of the file; its extension selects the extractor.
+        cache: Extraction cache, the shared on-disk cache by default.
+
+    Returns:
+        The text, or None when the format is not supported or the document
+        could not be read.
+    """
+    extractor = EXTRACTORS.get(os.path.splitext(file_name)[1].lower())
+    if extractor is None:
+        return None
+    cache = cache or extraction_cache
+    key = content_hash(data)
+    text = cache.get(key)
+    if text is not None:
+        return text
+    try:
+        text = normalize_text(extractor(data))
+    except ImportError as e:
+        logging.info(f"Cannot extract {file_name} locally: {e}")
+        return None
+    except (zipfile.BadZipFile, ElementTree.ParseError, KeyError, ValueError) as e:
+        logging.warning(f"Extracting {file_name} failed: {e}")
+        return None
+    cache.put(key, text)
+    return text
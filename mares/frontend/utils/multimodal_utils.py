@@ -18,6 +18,8 @@ from urllib.parse import quote
 
 from google.cloud import storage
 
+from frontend.utils.document_ingestion import extract_document
+
 HELP_MESSAGE_MULTIMODALITY = (
     "For Gemini models to access the URIs you provide, store them in "
     "Google Cloud Storage buckets within the same project used by Gemini."
@@ -33,14 +35,22 @@ def format_content(content: str | list[dict[str, Any]]) -> str:
     """Formats content as a string, handling both text and multimedia inputs."""
     if isinstance(content, str):
         return content
-    if len(content) == 1 and content[0]["type"] == "text":
+    if (
+        len(content) == 1
+        and content[0]["type"] == "text"
+        and "file_name" not in content[0]
+    ):
         return content[0]["text"]
     markdown = """Media:
 """
     text = ""
     for part in content:
         if part["type"] == "text":
-            text = part["text"]
+            # Local documents, sent as their extracted text
+            if "file_name" in part:
+                markdown = markdown + f"- Local document: {part['file_name']}\n"
+            else:
+                text = part["text"]
         # Local Images:
         if part["type"] == "image_url":
             image_url = part["image_url"]["url"]
@@ -110,7 +120,11 @@ def get_gcs_blob_mime_type(gcs_uri: str) -> str | None:
 def get_parts_from_files(
     upload_gcs_checkbox: bool, uploaded_files: list[Any], gcs_uris: str
 ) -> list[dict[str, Any]]:
-    """Processes uploaded files and GCS URIs to create a list of content parts."""
+    """Processes uploaded files and GCS URIs to create a list of content parts.
+
+    Local documents in a supported format are sent as their extracted text
+    instead of base64 data, so only the normalized text reaches the brief.
+    """
     parts = []
     # read from local directly
     if not upload_gcs_checkbox:
@@ -125,6 +139,12 @@ def get_parts_from_files(
                     },
                     "file_name": uploaded_file.name,
                 }
+            elif (text := extract_document(im_bytes, uploaded_file.name)) is not None:
+                content = {
+                    "type": "text",
+                    "text": f"## Attachment: {uploaded_file.name}\n\n{text}",
+                    "file_name": uploaded_file.name,
+                }
             else:
                 content = {
                     "type": "media",
@@ -145,6 +165,41 @@ def get_parts_from_files(
     return parts
 
 
+def to_user_content(content: str | list[dict[str, Any]]) -> dict[str, Any]:
+    """Converts the content of a chat message into a Content dict for the agent.
+
+    Args:
+        content: The message content, as text or content parts.
+
+    Returns:
+        A dict representing a user `google.genai.types.Content`.
+    """
+    if isinstance(content, str):
+        return {"role": "user", "parts": [{"text": content}]}
+    parts = []
+    for part in content:
+        if part["type"] == "text":
+            parts.append({"text": part["text"]})
+        elif part["type"] == "image_url":
+            header, data = part["image_url"]["url"].split(",", 1)
+            mime_type = header.removeprefix("data:").split(";")[0]
+            parts.append({"inline_data": {"mime_type": mime_type, "data": data}})
+        elif "data" in part:
+            parts.append(
+                {"inline_data": {"mime_type": part["mime_type"], "data": part["data"]}}
+            )
+        elif "file_uri" in part:
+            parts.append(
+                {
+                    "file_data": {
+                        "file_uri": part["file_uri"],
+                        "mime_type": part["mime_type"],
+                    }
+                }
+            )
+    return {"role": "user", "parts": parts}
+
+
 def upload_bytes_to_gcs(
     bucket_name: str,
     blob_name: str,
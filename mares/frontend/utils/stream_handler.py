@@ -30,7 +30,7 @@ from google.auth.exceptions import DefaultCredentialsError
 from langchain_core.messages import AIMessage, ToolMessage
 from vertexai import agent_engines
 
-from frontend.utils.multimodal_utils import format_content
+from frontend.utils.multimodal_utils import format_content, to_user_content
 
 st.cache_resource.clear()
 
@@ -86,6 +86,7 @@ class Client:
         remote_agent_engine_id: str | None = None,
         url: str | None = None,
         authenticate_request: bool = False,
+        server_history: bool = False,
     ) -> None:
         """Initialize the Client with appropriate configuration.
 
@@ -94,7 +95,11 @@ class Client:
             remote_agent_engine_id: ID of remote Agent engine
             url: URL for remote service
             authenticate_request: Whether to authenticate requests to remote URL
+            server_history: Whether to send only the new message of each turn,
+                the conversation being kept by the agent's session service;
+                not available with a remote URL
         """
+        self.server_history = server_history and not url
         if url:
             remote_config = get_remote_url_config(url, authenticate_request)
             self.url = remote_config["url"]
@@ -171,6 +176,14 @@ class Client:
         elif self.agent is not None:
             yield from self.agent.stream_query(**data)
 
+    def stream_turn(
+        self, data: dict[str, Any]
+    ) -> Generator[dict[str, Any], None, None]:
+        """Stream the events of one turn of a conversation kept by the server."""
+        if self.agent is None:
+            raise ValueError("Server-side history needs a local or Agent Engine agent")
+        yield from self.agent.stream_turn(**data)
+
 
 class StreamHandler:
     """Handles streaming updates to a Streamlit interface."""
@@ -207,6 +220,63 @@ class EventProcessor:
         self.current_run_id: str | None = None
         self.additional_kwargs: dict[str, Any] = {}
 
+    def process_turn_events(self) -> None:
+        """Process the events of a turn when the server keeps the conversation.
+
+        Only the new message and the server's session ID are sent, so the
+        request size does not grow with the conversation.
+        """
+        chat = self.st.session_state.user_chats[self.st.session_state["session_id"]]
+        stream = self.client.stream_turn(
+            data={
+                "message": to_user_content(chat["messages"][-1]["content"]),
+                "user_id": self.st.session_state["user_id"],
+                "session_id": chat.get("server_session_id"),
+            }
+        )
+        partial = False
+        for event in stream:
+            if set(event) == {"session_id"}:
+                chat["server_session_id"] = event["session_id"]
+                continue
+            for part in (event.get("content") or {}).get("parts") or []:
+                if part.get("function_call"):
+                    tool_call = part["function_call"]
+                    ai_message = AIMessage(
+                        content="",
+                        tool_calls=[
+                            {
+                                "name": tool_call["name"],
+                                "args": tool_call.get("args") or {},
+                                "id": tool_call.get("id"),
+                            }
+                        ],
+                    )
+                    self.tool_calls.append(ai_message.model_dump())
+                    msg = f"\n\nCalling tool: `{tool_call['name']}` with args: `{tool_call.get('args')}`"
+                    self.stream_handler.new_status(msg)
+                elif part.get("function_response"):
+                    response = part["function_response"]
+                    tool_message = ToolMessage(
+                        content=json.dumps(response.get("response"), default=str),
+                        type="tool",
+                        tool_call_id=response.get("id") or "",
+                    ).model_dump()
+                    self.tool_calls.append(tool_message)
+                    msg = f"\n\nTool response: `{response.get('response')}`"
+                    self.stream_handler.new_status(msg)
+                elif part.get("text") and not part.get("thought"):
+                    if event.get("partial"):
+                        text = part["text"]
+                    elif partial:
+                        # A complete event repeats the text of its partial events
+                        text = "\n\n"
+                    else:
+                        text = f"{part['text']}\n\n"
+                    self.final_content += text
+                    self.stream_handler.new_token(text)
+            partial = bool(event.get("partial"))
+
     def process_events(self) -> None:
         """Process events from the stream, handling each event type appropriately."""
         messages = self.st.session_state.user_chats[
@@ -215,6 +285,10 @@ class EventProcessor:
         self.current_run_id = str(uuid.uuid4())
         # Set run_id in session state at start of processing
         self.st.session_state["run_id"] = self.current_run_id
+        if self.client.server_history:
+            self.process_turn_events()
+            self.finish_turn()
+            return
         stream = self.client.stream_messages(
             data={
                 "input": {"messages": messages},
@@ -266,8 +340,10 @@ class EventProcessor:
                     # This is used when receiving a full message rather than chunks
                     elif message.get("content") and message.get("type") == "ai":
                         self.final_content = message.get("content")
+        self.finish_turn()
 
-        # Handle end of stream
+    def finish_turn(self) -> None:
+        """Add the tool calls and final AI message to the chat history."""
         if self.final_content:
             final_message = AIMessage(
                 content=self.final_content,
@@ -13,12 +13,19 @@
 # limitations under the License.
 
 # mypy: disable-error-code="union-attr"
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from google.adk.agents import BaseAgent
 from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
 
-from app.agent import root_agent
+from app import agent
+from app.agent import InitializeBriefAgent, RefinementsValidationAgent, root_agent
+from app.stages import WARM_START_OFFER_KEY
 
 
 def test_agent_stream() -> None:
@@ -56,3 +63,163 @@ def test_agent_stream() -> None:
             has_text_content = True
             break
     assert has_text_content, "Expected at least one message with text content"
+
+
+@pytest.mark.asyncio
+async def test_prefetched_question_is_dropped_for_a_new_brief(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A question drafted on one brief is served for its next missing element,
+    and dropped once another brief with the same gaps is submitted."""
+
+    async def generate_text(model: str, instruction: str, *args: Any) -> str:
+        return " Which roles sign in? "
+
+    monkeypatch.setattr(agent, "generate_text", generate_text)
+    validator = RefinementsValidationAgent(name="Validator", prefetch=True)
+    state = {"submitted_brief": "# CRM", "project_brief": "# CRM\n\nSSO"}
+    session = SimpleNamespace(app_name="test", user_id="u", id="s", state=state)
+    ctx: Any = SimpleNamespace(session=session)
+    upcoming = ["Roles", "Data retention"]
+
+    validator._prefetch(ctx, upcoming)
+    assert await validator._take_draft(ctx, upcoming) == "Which roles sign in?"
+
+    validator._prefetch(ctx, upcoming)
+    state.update(submitted_brief="# Payroll", project_brief="# Payroll")
+    assert await validator._take_draft(ctx, upcoming) == ""
+
+
+@pytest.mark.asyncio
+async def test_warm_start_offer_is_only_applied_once_accepted() -> None:
+    """Accepting the offer carries its refinements over to the brief; any
+    other reply leaves the brief as submitted."""
+    offer = {"project_brief": "# CRM\n\n## SSO\nYes", "missing_elements": "NONE"}
+    for reply, brief in [("Yes", "# CRM\n\n## SSO\nYes"), ("No thanks", "# CRM")]:
+        state: dict[str, Any] = {
+            "submitted_brief": "# CRM",
+            "project_brief": "# CRM",
+            "brief_message": "# CRM",
+            WARM_START_OFFER_KEY: offer,
+        }
+        session = SimpleNamespace(app_name="test", user_id="u", id="s", state=state)
+        ctx: Any = SimpleNamespace(
+            session=session,
+            user_content=types.UserContent(reply),
+            invocation_id="i",
+            branch=None,
+        )
+
+        async for event in InitializeBriefAgent()._run_async_impl(ctx):
+            state.update(event.actions.state_delta)
+
+        assert state["project_brief"] == brief
+        assert state["submitted_brief"] == "# CRM"
+        assert state[WARM_START_OFFER_KEY] is None
+
+
+@pytest.mark.asyncio
+async def test_report_generator_lists_the_unestimated_stories() -> None:
+    """The stories whose estimation failed are listed in the report prompt."""
+    stories = [
+        {"id": f"US-00{i}", "role": "rep", "action": "log calls", "benefit": "b"}
+        for i in (1, 2)
+    ]
+    row = {"story_id": "US-001", "story_points": 3, "justification": "j"}
+    state = {
+        "validated_brief": "# CRM",
+        "stories_and_criteria": {"stories": stories},
+        "estimations": {"rows": [row]},
+        "unestimated": ["US-002"],
+    }
+    ctx: Any = SimpleNamespace(state=state)
+
+    prompt, _ = await agent.create_report_generator_agent().canonical_instruction(ctx)
+
+    assert "Stories Left Unestimated: US-002" in prompt
+
+
+def agent_tree(stage: BaseAgent) -> Any:
+    """The names of an agent and of its sub-agents, nested."""
+    if not stage.sub_agents:
+        return stage.name
+    return {stage.name: [agent_tree(sub_agent) for sub_agent in stage.sub_agents]}
+
+
+def callback_names(callbacks: Any) -> list[str]:
+    """The function names of the agent callbacks of a stage."""
+    if not isinstance(callbacks, list):
+        callbacks = [callbacks] if callbacks else []
+    return [callback.__name__ for callback in callbacks]
+
+
+def test_coordinator_wraps_the_stages_in_order(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """With every optimisation on, each wrapper stage wraps the stage it
+    reuses or repairs the output of, and the index and checkpoint callbacks
+    sit on the outermost stages."""
+    for flag in [
+        "map_reduce",
+        "brief_reuse",
+        "sharded_estimation",
+        "estimation_reuse",
+        "story_dedup",
+        "incremental",
+        "speculation",
+        "output_repair",
+        "checkpoints_enabled",
+    ]:
+        monkeypatch.setattr(agent.pipeline_config, flag, True)
+    monkeypatch.setattr(agent.pipeline_config, "streaming_estimation", False)
+
+    pipeline = agent.create_mares_coordinator().sub_agents[0]
+
+    assert [stage.name for stage in pipeline.sub_agents] == [
+        "BriefInitializer",
+        "BriefMatcher",
+        "MapReduceAnalyst",
+        "RefinementsValidationAgent",
+        "AnalystValidator",
+        "BriefCompactor",
+        "OutputRepair",
+        "ReportGenerator",
+        "GoogleDocsSaver",
+    ]
+    repair = pipeline.find_agent("OutputRepair")
+    assert repair is not None
+    assert agent_tree(repair) == {
+        "OutputRepair": [
+            {
+                "IncrementalDevelopment": [
+                    {"MapReduceProductOwner": ["ProductOwner"]},
+                    {
+                        "StoryDeduplicator": [
+                            {"EstimationReuse": [{"ShardedAgileCoach": ["AgileCoach"]}]}
+                        ]
+                    },
+                ]
+            }
+        ]
+    }
+    assert callback_names(repair.before_agent_callback) == ["require_analysis_complete"]
+    assert callback_names(repair.after_agent_callback) == [
+        "record_estimations",
+        "record_brief",
+    ]
+    for name in ["MapReduceAnalyst", "RefinementsValidationAgent", "AnalystValidator"]:
+        stage = pipeline.find_agent(name)
+        assert "await_warm_start_answer" in callback_names(stage.before_agent_callback)
+    for name in ["MapReduceAnalyst", "MapReduceProductOwner", "ShardedAgileCoach"]:
+        stage = pipeline.find_agent(name)
+        assert "after_agent_callback" in callback_names(stage.after_agent_callback)
+
+    monkeypatch.setattr(agent.pipeline_config, "streaming_estimation", True)
+    pipeline = agent.create_mares_coordinator().sub_agents[0]
+    repair = pipeline.find_agent("OutputRepair")
+    assert repair is not None
+    assert agent_tree(repair) == {
+        "OutputRepair": [
+            {"IncrementalDevelopment": [{"StreamingAgileCoach": ["ProductOwner"]}]}
+        ]
+    }
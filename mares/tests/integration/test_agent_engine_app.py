@@ -13,6 +13,8 @@
 # limitations under the License.
 
 import logging
+from collections.abc import Iterator
+from typing import Any
 
 import pytest
 from google.adk.events.event import Event
@@ -55,6 +57,51 @@ def test_agent_stream_query(agent_app: AgentEngineApp) -> None:
     assert has_text_content, "Expected at least one event with text content"
 
 
+class TurnApp(AgentEngineApp):
+    """AgentEngineApp with an in-memory stand-in for the session service."""
+
+    def __init__(self, sessions: set[str]) -> None:
+        super().__init__(agent=root_agent)
+        self.sessions = sessions
+        self.queries: list[dict[str, Any]] = []
+
+    def get_session(self, *, user_id: str, session_id: str, **kwargs: Any) -> dict:
+        if session_id not in self.sessions:
+            raise RuntimeError(f"Session not found: {session_id}")
+        return {"id": session_id, "user_id": user_id}
+
+    def create_session(self, *, user_id: str, **kwargs: Any) -> dict:
+        session_id = f"session-{len(self.sessions) + 1}"
+        self.sessions.add(session_id)
+        return {"id": session_id, "user_id": user_id}
+
+    def stream_query(self, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        self.queries.append(kwargs)
+        yield {"author": "root_agent", "content": {"parts": [{"text": "ok"}]}}
+
+
+def test_stream_turn_creates_and_reuses_sessions() -> None:
+    """The first turn announces the new session, later turns reuse it, and
+    an unknown session is replaced by a new one."""
+    app = TurnApp(sessions={"session-1"})
+
+    first = list(app.stream_turn(message="Build a CRM", user_id="u"))
+    assert first[0] == {"session_id": "session-2"}
+    assert first[1]["content"]["parts"][0]["text"] == "ok"
+
+    later = list(app.stream_turn(message="Yes", user_id="u", session_id="session-2"))
+    assert [event.get("session_id") for event in later] == [None]
+    assert app.queries[-1]["session_id"] == "session-2"
+
+    expired = list(app.stream_turn(message="Yes", user_id="u", session_id="gone"))
+    assert expired[0] == {"session_id": "session-3"}
+    assert app.queries[-1] == {
+        "message": "Yes",
+        "user_id": "u",
+        "session_id": "session-3",
+    }
+
+
 def test_agent_feedback(agent_app: AgentEngineApp) -> None:
     """
     Integration test for the agent feedback functionality.
@@ -0,0 +1,65 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+
+from app.utils.brief_index import BriefIndex, normalize_brief
+
+BRIEF = """# CRM
+A CRM for the sales team of a mid-sized distributor of office furniture.
+
+## Users
+Sales representatives log their calls and meetings with customers, and
+managers follow the pipeline of their team on a weekly dashboard.
+
+## Reports
+Managers export a monthly sales report per region as CSV for finance."""
+
+
+def test_normalize_brief_ignores_case_and_spacing() -> None:
+    """Briefs pasted with other line breaks or casing are the same brief."""
+    assert normalize_brief("# CRM\n\nA  CRM for Sales.\n") == "# crm a crm for sales."
+
+
+def test_index_matches_variants_of_a_validated_brief(tmp_path: Path) -> None:
+    """A variant of a stored brief matches it, an unrelated brief does not."""
+    path = str(tmp_path / "briefs.sqlite")
+    index = BriefIndex(path)
+    assert index.lookup(BRIEF, 0.8, "mares", "alice") is None
+
+    outputs = {"missing_elements": "NONE", "validated_brief": BRIEF}
+    index.add(BRIEF, outputs, "mares", "alice")
+
+    variant = BRIEF.replace("mid-sized", "large").upper()
+    match = BriefIndex(path).lookup(variant, 0.8, "mares", "alice")
+    assert match is not None and match.brief == BRIEF
+    assert 0.8 <= match.similarity < 1
+    assert match.outputs == outputs
+    other = "# Payroll\nA payroll system that pays the staff of a bakery every month."
+    assert index.lookup(other, 0.8, "mares", "alice") is None
+
+
+def test_index_only_matches_briefs_of_the_same_app_and_user(tmp_path: Path) -> None:
+    """The briefs of another user, or of another app, are never matched."""
+    index = BriefIndex(str(tmp_path / "briefs.sqlite"))
+    index.add(BRIEF, {"validated_brief": BRIEF}, "mares", "alice")
+
+    assert index.lookup(BRIEF, 0.8, "mares", "bob") is None
+    assert index.lookup(BRIEF, 0.8, "other-app", "alice") is None
+
+    index.add(BRIEF, {"validated_brief": "bob's"}, "mares", "bob")
+    match = index.lookup(BRIEF, 0.8, "mares", "bob")
+    assert match is not None and match.outputs == {"validated_brief": "bob's"}
+    match = index.lookup(BRIEF, 0.8, "mares", "alice")
+    assert match is not None and match.outputs == {"validated_brief": BRIEF}
@@ -0,0 +1,76 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+from types import SimpleNamespace
+
+from app.utils.checkpoints import (
+    SESSION_SCOPE_KEY,
+    CheckpointStore,
+    state_fingerprint,
+)
+
+
+def test_checkpoints_round_trip_per_scope(tmp_path: Path) -> None:
+    """Checkpoints are stored per session scope and stage, and replaced."""
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    store.save("app/u/s1", "AgileCoach", "abc", {"estimations": {"rows": []}})
+    store.save("app/u/s1", "AgileCoach", "def", {"estimations": {"rows": [1]}})
+
+    assert store.load("app/u/s1", "AgileCoach") == (
+        "def",
+        {"estimations": {"rows": [1]}},
+    )
+    assert store.load("app/u/s2", "AgileCoach") is None
+
+    store.clear("app/u/s1")
+    assert store.load("app/u/s1", "AgileCoach") is None
+
+
+def test_fingerprint_only_depends_on_the_stage_inputs() -> None:
+    """Changing an unrelated key keeps the fingerprint, an input changes it."""
+    state = {"validated_brief": "Brief", "final_report": "Report"}
+    fingerprint = state_fingerprint(state, ["validated_brief"])
+
+    assert (
+        state_fingerprint({**state, "final_report": "Other"}, ["validated_brief"])
+        == fingerprint
+    )
+    assert (
+        state_fingerprint({**state, "validated_brief": "New"}, ["validated_brief"])
+        != fingerprint
+    )
+
+
+def test_stage_callbacks_resume_a_stage_with_unchanged_inputs(tmp_path: Path) -> None:
+    """The outputs are restored in the same session scope while the inputs
+    are unchanged, and sessions without a scope are not checkpointed."""
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    before, after = store.stage_callbacks(["validated_brief"], ["estimations"])
+    state = {
+        SESSION_SCOPE_KEY: "app/u/s1",
+        "validated_brief": "Brief",
+        "estimations": {"rows": [1]},
+    }
+    after(SimpleNamespace(agent_name="AgileCoach", state=state))
+
+    resumed = {**state, "estimations": None}
+    content = before(SimpleNamespace(agent_name="AgileCoach", state=resumed))
+    assert content is not None and "resumed from checkpoint" in content.parts[0].text
+    assert resumed["estimations"] == {"rows": [1]}
+
+    changed = {**state, "validated_brief": "New", "estimations": None}
+    assert before(SimpleNamespace(agent_name="AgileCoach", state=changed)) is None
+    unscoped = {"validated_brief": "Brief", "estimations": None}
+    assert before(SimpleNamespace(agent_name="AgileCoach", state=unscoped)) is None
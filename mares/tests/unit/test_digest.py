@@ -0,0 +1,98 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from app.utils.digest import (
+    PromptBudgetError,
+    build_digest,
+    chunk_digest,
+    count_tokens,
+    fill_prompt,
+    render_digest,
+)
+from app.utils.refinement import apply_refinements
+
+BRIEF = """A portal where **customers** track their orders.
+
+## Goals
+
+- Reduce support calls about order status by 30%
+- Reduce support calls about order status by 30%
+- Yes
+- Yes
+
+## Scope
+
+Web only, no mobile app in the first release.
+"""
+
+
+def test_digest_sections_keep_their_ids_when_refined() -> None:
+    """Refinements add sections without renaming the existing ones."""
+    digest = build_digest(BRIEF)
+    refined = build_digest(
+        apply_refinements(BRIEF, [("Which users need access?", "Customers and agents")])
+    )
+
+    assert [s.id for s in digest.sections] == ["overview", "goals", "scope"]
+    assert [s.id for s in refined.sections] == [
+        "overview",
+        "goals",
+        "scope",
+        "which-users-need-access",
+    ]
+    assert digest.sections[0].text == "A portal where customers track their orders."
+    # Repeated sentences are dropped, short answers are kept
+    assert digest.sections[1].text == (
+        "- Reduce support calls about order status by 30%\n- Yes\n- Yes"
+    )
+
+
+def test_render_digest_rejects_digests_over_budget() -> None:
+    """Over budget, the digest is not shortened but rejected."""
+    digest = build_digest(BRIEF + "\n## Data\n\n" + "Orders are stored in SAP. " * 50)
+    full = render_digest(digest)
+
+    assert render_digest(digest, max_tokens=count_tokens(full)) == full
+    with pytest.raises(PromptBudgetError):
+        render_digest(digest, max_tokens=60)
+
+
+def test_fill_prompt_budgets_the_whole_prompt() -> None:
+    """The digest gets what is left of the budget after the template."""
+    digest = build_digest(BRIEF)
+    prompt = fill_prompt("Stories for {scope}:\n{brief}", digest, 100, scope="all")
+
+    assert prompt.startswith("Stories for all:\n[overview] Overview")
+    assert count_tokens(prompt) <= 100
+    with pytest.raises(PromptBudgetError):
+        fill_prompt("Stories for {scope}:\n{brief}", digest, 30, scope="all")
+
+
+def test_chunk_digest_packs_and_splits_sections() -> None:
+    """Chunks stay near the target size and keep the section IDs."""
+    data = "\n".join(
+        f"Table {i} is exported from the ERP every night." for i in range(40)
+    )
+    digest = build_digest(BRIEF + "\n## Data\n\n" + data)
+
+    chunks = chunk_digest(digest, 150)
+
+    assert len(chunks) > 2
+    assert chunks[0].sections[0].id == "overview"
+    assert all(count_tokens(render_digest(chunk)) <= 170 for chunk in chunks)
+    data_parts = [s for chunk in chunks for s in chunk.sections if s.id == "data"]
+    assert len(data_parts) > 1
+    assert data_parts[0].title.startswith("Data (part 1/")
@@ -0,0 +1,113 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import zipfile
+from pathlib import Path
+
+from frontend.utils.document_ingestion import (
+    ExtractionCache,
+    content_hash,
+    extract_document,
+)
+
+WORD = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+SHEET = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+RELATIONSHIPS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+
+def _zip(files: dict[str, str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_extracts_delimited_files_as_tables(tmp_path: Path) -> None:
+    """CSV and TSV files become Markdown tables."""
+    cache = ExtractionCache(str(tmp_path))
+    data = b"Role,Need\nAdmin,Manage users\n"
+
+    assert extract_document(data, "roles.csv", cache) == (
+        "| Role | Need |\n| --- | --- |\n| Admin | Manage users |"
+    )
+    tsv = extract_document(b"a\tb\n1\t2\n", "x.TSV", cache)
+    assert tsv is not None and tsv.startswith("| a | b |")
+    assert extract_document(b"\x89PNG", "logo.png", cache) is None
+
+
+def test_extracts_docx_paragraphs_and_tables(tmp_path: Path) -> None:
+    """Word headings, paragraphs and tables are kept in document order."""
+    document = f"""<w:document {WORD}><w:body>
+        <w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>Goals</w:t></w:r></w:p>
+        <w:p><w:r><w:t>Cut </w:t></w:r><w:r><w:t>costs.</w:t></w:r></w:p>
+        <w:tbl><w:tr><w:tc><w:p><w:r><w:t>KPI</w:t></w:r></w:p></w:tc></w:tr>
+        <w:tr><w:tc><w:p><w:r><w:t>-20%</w:t></w:r></w:p></w:tc></w:tr></w:tbl>
+        </w:body></w:document>"""
+    data = _zip({"word/document.xml": document})
+
+    text = extract_document(data, "brief.docx", ExtractionCache(str(tmp_path)))
+
+    assert text == "# Goals\n\nCut costs.\n\n| KPI |\n| --- |\n| -20% |"
+
+
+def test_extracts_xlsx_sheets(tmp_path: Path) -> None:
+    """Every worksheet becomes a titled table, with shared strings resolved."""
+    data = _zip(
+        {
+            "xl/workbook.xml": f'<workbook {SHEET} xmlns:r="{RELATIONSHIPS}">'
+            '<sheets><sheet name="Users" r:id="rId1"/></sheets></workbook>',
+            "xl/_rels/workbook.xml.rels": '<Relationships xmlns="http://schemas'
+            '.openxmlformats.org/package/2006/relationships"><Relationship '
+            'Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>',
+            "xl/sharedStrings.xml": f"<sst {SHEET}><si><t>Name</t></si>"
+            "<si><t>Seats</t></si></sst>",
+            "xl/worksheets/sheet1.xml": f"<worksheet {SHEET}><sheetData>"
+            '<row><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c></row>'
+            '<row><c r="A2" t="inlineStr"><is><t>Ops</t></is></c>'
+            '<c r="B2"><v>12</v></c></row></sheetData></worksheet>',
+        }
+    )
+
+    text = extract_document(data, "users.xlsx", ExtractionCache(str(tmp_path)))
+
+    assert text == "### Users\n\n| Name | Seats |\n| --- | --- |\n| Ops | 12 |"
+
+
+def test_extracts_rtf_text(tmp_path: Path) -> None:
+    """RTF control words and font tables are dropped."""
+    data = rb"{\rtf1\ansi{\fonttbl{\f0 Arial;}}\f0 Caf\'e9 brief\par Second line}"
+
+    text = extract_document(data, "brief.rtf", ExtractionCache(str(tmp_path)))
+
+    assert text == "Café brief\nSecond line"
+
+
+def test_extraction_is_cached_by_content(tmp_path: Path) -> None:
+    """The same content is extracted once, whatever the file name."""
+    cache = ExtractionCache(str(tmp_path))
+    data = b"  Some   brief \r\n\r\n\r\n\r\nwith text  "
+
+    assert extract_document(data, "a.txt", cache) == "Some brief\n\nwith text"
+    (tmp_path / f"{content_hash(data)}.txt").write_text("cached", encoding="utf-8")
+    assert extract_document(data, "b.md", cache) == "cached"
+
+
+def test_unreadable_documents_are_not_extracted(tmp_path: Path) -> None:
+    """Corrupt documents fall back to being sent as-is."""
+    cache = ExtractionCache(str(tmp_path))
+
+    assert extract_document(b"not a zip", "brief.docx", cache) is None
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,69 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+
+from app.utils.estimation_index import EstimationIndex, embed, is_reused
+from app.utils.typing import AcceptanceCriterion, EstimationRow, UserStory
+
+EXPORT = UserStory(
+    id="US-001",
+    role="admin",
+    action="to export the monthly sales report as CSV",
+    benefit="I can share it with finance",
+    acceptance_criteria=[
+        AcceptanceCriterion(
+            given="a monthly report", when="I export it", then="a CSV is downloaded"
+        )
+    ],
+)
+
+
+def test_similar_stories_have_similar_embeddings() -> None:
+    """Rewording a story barely moves it, another story is far away."""
+    reworded = "As an admin, I want to export the monthly sales report to CSV"
+    other = "As a rep, I want to log a call with a customer"
+    original = embed("As an admin, I want to export the monthly sales report as CSV")
+
+    assert float(original @ embed(reworded)) > 0.8
+    assert float(original @ embed(other)) < 0.3
+
+
+def test_index_reuses_estimates_above_the_threshold(tmp_path: Path) -> None:
+    """Past estimates are reused for near-identical stories only."""
+    path = str(tmp_path / "estimations.sqlite")
+    rows = [
+        EstimationRow(story_id="US-001", story_points=5, justification="CSV export")
+    ]
+    failed = UserStory(id="US-002", role="rep", action="to log calls", benefit="x")
+    index = EstimationIndex(path)
+    assert index.lookup([EXPORT], 0.9) == {}
+
+    stored = index.add(
+        [EXPORT, failed],
+        [*rows, EstimationRow(story_id="US-002", story_points=0, justification="")],
+    )
+
+    assert stored == 1
+    again = EXPORT.model_copy(
+        update={"id": "US-007", "benefit": "I can share it with Finance"}
+    )
+    reused = EstimationIndex(path).lookup([again, failed], 0.9)
+    assert list(reused) == ["US-007"]
+    assert reused["US-007"].story_points == 5
+    assert reused["US-007"].justification.endswith("similar): CSV export")
+    assert is_reused(reused["US-007"])
+
+    # Reused rows are not indexed again, only model estimates are
+    assert index.add([again], [reused["US-007"]]) == 0
@@ -0,0 +1,113 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+from typing import ClassVar
+
+import pytest
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+from app import llm
+from app.config import pipeline_config
+from app.utils.latency import LatencyTracker
+
+
+def test_quantile_needs_enough_samples() -> None:
+    """The p90 is only known once enough calls were observed."""
+    tracker = LatencyTracker(min_samples=5)
+    for seconds in (1, 2, 3, 4):
+        tracker.record("AgileCoach", "gemini-2.5-pro", seconds)
+    assert tracker.quantile("AgileCoach", "gemini-2.5-pro") is None
+
+    for seconds in range(5, 11):
+        tracker.record("AgileCoach", "gemini-2.5-pro", seconds)
+    assert tracker.quantile("AgileCoach", "gemini-2.5-pro") == 10
+    assert tracker.quantile("AgileCoach", "gemini-2.5-pro", q=0.5) == 6
+    assert tracker.quantile("ProductOwner", "gemini-2.5-pro") is None
+
+
+def test_select_model_falls_back_when_budget_is_low(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A stage close to its deadline switches to the fallback model."""
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record("AgileCoach", "gemini-2.5-pro", 20)
+    monkeypatch.setattr(llm, "latency_tracker", tracker)
+
+    assert llm.select_model("AgileCoach", "gemini-2.5-pro", None) == "gemini-2.5-pro"
+    assert (
+        llm.select_model("AgileCoach", "gemini-2.5-pro", time.time() + 60)
+        == "gemini-2.5-pro"
+    )
+    assert (
+        llm.select_model("AgileCoach", "gemini-2.5-pro", time.time() + 10)
+        == "gemini-2.5-flash"
+    )
+    # Without observed latencies the configured expectation is used
+    assert (
+        llm.select_model("ProductOwner", "gemini-2.5-pro", time.time() + 10)
+        == "gemini-2.5-flash"
+    )
+    assert (
+        llm.select_model("AgileCoach", "gemini-2.0-flash", time.time())
+        == "gemini-2.0-flash"
+    )
+
+
+class StragglerLlm(BaseLlm):
+    calls: ClassVar[int] = 0
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"straggler-.*"]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        StragglerLlm.calls += 1
+        call = StragglerLlm.calls
+        # The first call hangs, the hedged duplicate answers at once
+        await asyncio.sleep(10 if call == 1 else 0)
+        yield LlmResponse(content=types.ModelContent(f"call {call}"))
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_are_hedged(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A call slower than the stage p90 is duplicated and the first reply wins."""
+    LLMRegistry.register(StragglerLlm)
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record("AgileCoach", "straggler-model", 0.01)
+    monkeypatch.setattr(llm, "latency_tracker", tracker)
+    monkeypatch.setattr(pipeline_config, "hedging_enabled", True)
+    monkeypatch.setattr(pipeline_config, "hedge_min_delay", 0.05)
+    request = LlmRequest(
+        model="straggler-model",
+        config=types.GenerateContentConfig(labels={llm.AGENT_NAME_LABEL: "AgileCoach"}),
+    )
+
+    started = time.monotonic()
+    responses = [
+        r
+        async for r in llm.pipeline_model("straggler-model").generate_content_async(
+            request
+        )
+    ]
+
+    assert time.monotonic() - started < 5
+    assert [r.content for r in responses] == [types.ModelContent("call 2")]
+    assert StragglerLlm.calls == 2
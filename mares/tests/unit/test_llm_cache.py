@@ -0,0 +1,134 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from app.utils.llm_cache import LlmResponseCache, make_cache_key
+
+
+def _content(text: str) -> dict:
+    return {"role": "model", "parts": [{"text": text}]}
+
+
+def _callback_context(**fields: Any) -> Any:
+    """The part of a callback context the cache uses."""
+    return SimpleNamespace(**fields)
+
+
+def test_cache_key_ignores_labels_but_not_generation_config() -> None:
+    """Only semantically relevant request fields change the key."""
+    base = make_cache_key(
+        "ProductOwner",
+        "gemini-2.5-pro",
+        "brief",
+        types.GenerateContentConfig(temperature=0.2),
+    )
+    labelled = make_cache_key(
+        "ProductOwner",
+        "gemini-2.5-pro",
+        "brief",
+        types.GenerateContentConfig(temperature=0.2, labels={"run": "x"}),
+    )
+    hotter = make_cache_key(
+        "ProductOwner",
+        "gemini-2.5-pro",
+        "brief",
+        types.GenerateContentConfig(temperature=0.9),
+    )
+    assert base == labelled
+    assert base != hotter
+    assert base != make_cache_key("AgileCoach", "gemini-2.5-pro", "brief")
+
+
+def test_cache_key_depends_on_the_conversation_history() -> None:
+    """Calls with the same instruction but other earlier turns do not share
+    a response; a call without history keys like one with none."""
+
+    def key(*turns: str) -> str:
+        return make_cache_key(
+            "RefinementAgent",
+            "gemini-2.5-flash",
+            "Ask the next question",
+            contents=[types.UserContent(turn) for turn in turns],
+        )
+
+    assert key("Web only") != key("Mobile only")
+    assert key("Web only") == key("Web only")
+    assert key() == make_cache_key(
+        "RefinementAgent", "gemini-2.5-flash", "Ask the next question"
+    )
+
+
+def test_memory_lru_and_disk_tier(tmp_path: Path) -> None:
+    """Entries evicted from memory are still served from disk."""
+    cache = LlmResponseCache(cache_dir=str(tmp_path), max_memory_entries=1)
+    cache.put("a" * 64, _content("first"))
+    cache.put("b" * 64, _content("second"))
+
+    assert cache.get("a" * 64) == _content("first")
+    assert cache.get("c" * 64) is None
+
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["memory_entries"] == 1
+
+
+def test_disk_tier_is_size_bounded(tmp_path: Path) -> None:
+    """The least recently used disk entries are evicted over budget."""
+    cache = LlmResponseCache(
+        cache_dir=str(tmp_path), max_memory_entries=1, max_disk_bytes=120
+    )
+    for key in ("a", "b", "c"):
+        cache.put(key * 64, _content(key * 40))
+
+    stats = cache.stats()
+    assert stats["evictions"] >= 1
+    assert stats["disk_bytes"] <= 120
+    assert cache.get("c" * 64) == _content("c" * 40)
+
+
+def test_interleaved_misses_of_one_agent_store_their_own_response() -> None:
+    """Concurrent calls of the same agent in one invocation keep their keys
+    apart, in the state of their own model call."""
+    cache = LlmResponseCache()
+    calls = [
+        _callback_context(agent_name="AgileCoach", invocation_id="e-1", state={})
+        for _ in range(2)
+    ]
+    requests = [
+        LlmRequest(
+            model="gemini-2.5-flash",
+            config=types.GenerateContentConfig(system_instruction=f"story {i}"),
+        )
+        for i in range(2)
+    ]
+    for call, request in zip(calls, requests, strict=True):
+        assert cache.before_model_callback(call, request) is None
+    for i in (1, 0):
+        response = LlmResponse(content=types.Content.model_validate(_content(f"{i}")))
+        cache.after_model_callback(calls[i], response)
+
+    for i, request in enumerate(requests):
+        hit = cache.before_model_callback(
+            _callback_context(agent_name="AgileCoach"), request
+        )
+        assert hit is not None and hit.content == types.Content.model_validate(
+            _content(f"{i}")
+        )
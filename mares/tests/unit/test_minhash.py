@@ -0,0 +1,52 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from app.utils.minhash import (
+    LshIndex,
+    MinHasher,
+    cluster_near_duplicates,
+    shingles,
+    similarity,
+)
+
+EXPORT = "I want to export the monthly sales report as CSV so that I can share it with finance"
+
+
+def test_signatures_estimate_jaccard_similarity() -> None:
+    """Near-identical texts agree on most of their signature, others do not."""
+    hasher = MinHasher()
+    original = hasher.signature(shingles(EXPORT))
+    reworded = hasher.signature(shingles(EXPORT.replace("finance", "the finance team")))
+    other = hasher.signature(shingles("I want to log calls so that I remember them"))
+
+    assert similarity(original, hasher.signature(shingles(EXPORT))) == 1.0
+    assert similarity(original, reworded) > 0.6
+    assert similarity(original, other) < 0.2
+
+    index: LshIndex[str] = LshIndex(hasher.permutations, 0.5)
+    index.add("export", original)
+    assert index.candidates(reworded) == {"export"}
+    assert index.candidates(other) == set()
+
+
+def test_cluster_near_duplicates_groups_in_order() -> None:
+    """Near-duplicates are grouped transitively, the rest stay alone."""
+    texts = [
+        EXPORT,
+        "I want to log calls so that I remember them",
+        EXPORT.replace("CSV", "a CSV file"),
+        EXPORT.upper(),
+    ]
+
+    assert cluster_near_duplicates(texts, 0.6, shingle_size=2) == [[0, 2, 3], [1]]
@@ -0,0 +1,140 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import sqlite3
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import ClassVar, cast
+
+import pytest
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.base_llm_connection import BaseLlmConnection
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+from app import llm
+from app.utils.rate_limit import RateLimit, SharedRateLimiter, backoff_delay
+
+
+def test_buckets_are_shared_between_limiters(tmp_path: Path) -> None:
+    """Two limiters on the same database draw from the same quota."""
+    path = str(tmp_path / "rate_limits.sqlite")
+    limits = {
+        "gemini-2.5-pro": RateLimit(requests_per_minute=2, tokens_per_minute=1000)
+    }
+    first = SharedRateLimiter(path, limits)
+    second = SharedRateLimiter(path, limits)
+
+    assert first._update("gemini-2.5-pro", 100, take=True) == 0
+    assert second._update("gemini-2.5-pro", 100, take=True) == 0
+    assert 25 < first._update("gemini-2.5-pro", 100, take=True) <= 30
+    assert second._update("gemini-2.5-flash", 10**9, take=True) == 0
+
+    asyncio.run(second.penalize("gemini-2.5-pro", 5))
+    assert second.stats()["gemini-2.5-pro"]["rate_limited"] == 1
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_the_database_off_the_event_loop(
+    tmp_path: Path,
+) -> None:
+    """While another process holds the buckets, the event loop keeps running."""
+    path = str(tmp_path / "rate_limits.sqlite")
+    limits = {
+        "gemini-2.5-pro": RateLimit(requests_per_minute=2, tokens_per_minute=1000)
+    }
+    limiter = SharedRateLimiter(path, limits)
+    limiter._connect()
+    other_process = sqlite3.connect(path, isolation_level=None)
+    other_process.execute("BEGIN IMMEDIATE")
+
+    acquire = asyncio.create_task(limiter.acquire("gemini-2.5-pro", 100))
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+    assert not acquire.done()
+
+    other_process.execute("COMMIT")
+    assert await acquire == 0
+    assert limiter.stats()["gemini-2.5-pro"]["requests"] == 1
+
+
+def test_backoff_is_jittered_and_capped() -> None:
+    """Delays grow exponentially, stay below the cap and are randomised."""
+    delays = {backoff_delay(3) for _ in range(20)}
+
+    assert all(0 <= delay <= 8 for delay in delays)
+    assert len(delays) > 1
+    assert backoff_delay(20, cap=60) <= 60
+
+
+class QuotaError(Exception):
+    code = 429
+
+
+class FlakyLlm(BaseLlm):
+    failures: ClassVar[int] = 2
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"flaky-.*"]
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if FlakyLlm.failures:
+            FlakyLlm.failures -= 1
+            raise QuotaError("429 RESOURCE_EXHAUSTED")
+        yield LlmResponse(content=types.ModelContent("ok"))
+
+
+@pytest.mark.asyncio
+async def test_pipeline_llm_retries_rate_limited_calls(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A 429 before any response is retried until the call succeeds."""
+    LLMRegistry.register(FlakyLlm)
+    monkeypatch.setattr(llm.pipeline_config, "rate_limit_enabled", True)
+    monkeypatch.setattr(llm, "backoff_delay", lambda attempt: 0)
+    model = llm.pipeline_model("flaky-model")
+
+    responses = [
+        r async for r in model.generate_content_async(LlmRequest(model="flaky-model"))
+    ]
+    assert responses[0].content == types.ModelContent("ok")
+    assert responses[0].content.parts[0].text == "ok"
+    assert llm.rate_limiter.stats()["flaky-model"]["rate_limited"] == 2
+
+
+class LiveLlm(FlakyLlm):
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"live-.*"]
+
+    @asynccontextmanager
+    async def connect(  # type: ignore[override]
+        self, llm_request: LlmRequest
+    ) -> AsyncGenerator[BaseLlmConnection, None]:
+        yield cast(BaseLlmConnection, f"connection to {llm_request.model}")
+
+
+@pytest.mark.asyncio
+async def test_pipeline_llm_connects_as_a_context_manager() -> None:
+    """Live connections are opened on the resolved model."""
+    LLMRegistry.register(LiveLlm)
+    model = llm.PipelineLlm(model="live-model")
+
+    async with model.connect(LlmRequest(model="live-model")) as connection:
+        assert connection == "connection to live-model"
@@ -0,0 +1,118 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from app.utils.readiness import (
+    DOR_DIMENSIONS,
+    assess_readiness,
+    reduce_chunk_analyses,
+    render_checklist,
+    weak_dimensions,
+)
+from app.utils.typing import AreaFinding, ChunkAnalysis
+
+READY_BRIEF = """# Order tracking portal
+## Goals and success metrics
+Reduce support calls about order status by 30% within six months (KPI: weekly calls).
+## Users and roles
+- Customers track their orders
+- Support agents look up orders; admins manage agent accounts
+## Scope
+In scope: web portal and order history. Out of scope: mobile app, returns.
+## Functional requirements
+- Customers must be able to search orders by number
+- The system shall send email notifications on status changes
+## Data requirements
+Orders are imported nightly from SAP as JSON and stored in PostgreSQL for 2 years.
+## Non-functional requirements
+- Security: SSO authentication, role-based authorization, encryption at rest
+- Performance: 200 ms response time for 1000 concurrent users
+- Usability: WCAG 2.1 AA accessibility
+- Compliance: GDPR, audit log of data access
+"""
+
+
+def test_complete_brief_passes_every_area() -> None:
+    """A brief with a detailed section per area needs no model check."""
+    scores = assess_readiness(READY_BRIEF)
+
+    assert set(scores) == {dimension.id for dimension in DOR_DIMENSIONS}
+    assert weak_dimensions(scores, 0.85) == []
+
+
+def test_sparse_brief_only_sends_weak_areas() -> None:
+    """Areas without evidence are left for the BusinessAnalyst."""
+    brief = READY_BRIEF.split("## Data requirements")[0]
+    weak = weak_dimensions(assess_readiness(brief), 0.85)
+
+    assert [dimension.id for dimension in weak] == ["data", "nfr"]
+    checklist = render_checklist(weak)
+    assert checklist.startswith("    1. Data Requirements")
+    assert "2. Non-Functional Requirements" in checklist
+    assert "Goal & Metrics" not in checklist
+
+
+# Hand-labelled briefs and the areas a reviewer found not ready in them.
+LABELLED_BRIEFS = [
+    (READY_BRIEF, []),
+    (
+        READY_BRIEF.split("## Non-functional requirements")[0]
+        + "## Non-functional requirements\n"
+        "Security is key: secure login, secure storage, secure APIs, security "
+        "reviews and a secure, performant system.\n",
+        ["nfr"],
+    ),
+    (
+        READY_BRIEF.replace(
+            "In scope: web portal and order history. Out of scope: mobile app, "
+            "returns.",
+            "The first release includes the web portal and order history.",
+        ),
+        ["scope"],
+    ),
+    (
+        "# Bakery shop\nA website for a bakery. Customers must be able to order "
+        "cakes online and pick them up in the shop.",
+        ["goals", "actors", "scope", "functional", "data", "nfr"],
+    ),
+]
+
+
+def test_labelled_briefs() -> None:
+    """The local scores agree with the labels at the default threshold."""
+    for brief, weak in LABELLED_BRIEFS:
+        scores = assess_readiness(brief)
+        assert [dimension.id for dimension in weak_dimensions(scores, 0.85)] == weak
+
+
+def test_chunk_findings_only_keep_gaps_of_covering_chunks() -> None:
+    """Chunks silent about an area do not make it missing."""
+    goals, data = DOR_DIMENSIONS[0], DOR_DIMENSIONS[4]
+    analyses = [
+        ChunkAnalysis(
+            areas=[
+                AreaFinding(area="goals", covered=True, missing=["No target date"]),
+                AreaFinding(area="data", covered=False, missing=["No data sources"]),
+            ]
+        ),
+        ChunkAnalysis(
+            areas=[AreaFinding(area="goals", covered=False, missing=["No KPI"])]
+        ),
+    ]
+
+    assert reduce_chunk_analyses(analyses, [goals, data]) == (
+        "- No target date\n- No data sources"
+    )
+    assert reduce_chunk_analyses([], [data]) == (
+        "- Data Requirements: Data sources, formats, and storage needs"
+    )
@@ -0,0 +1,88 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from app.utils.refinement import (
+    NOTHING_MISSING,
+    apply_refinements,
+    elements_key,
+    merge_findings,
+    parse_form_answers,
+    pending_elements,
+)
+
+
+def test_pending_elements_reads_the_analyst_list() -> None:
+    """Bullet and numbered items are pending, NONE means the brief is ready."""
+    analysis = "Missing:\n- Security requirements\n2. Performance targets\n"
+
+    assert pending_elements(analysis) == [
+        "Security requirements",
+        "Performance targets",
+    ]
+    assert pending_elements("NONE") == []
+    assert pending_elements("**NONE**") == []
+    assert pending_elements(None) == []
+    assert pending_elements("Scope is unclear") == ["Scope is unclear"]
+    assert pending_elements(["Scope", " "]) == ["Scope"]
+
+
+def test_apply_refinements_appends_the_answers() -> None:
+    """Answers are added below the original brief, labelled by their question."""
+    brief = apply_refinements(
+        "Build a CRM\n", [("Security requirements", " SSO "), ("Data", "")]
+    )
+
+    assert brief == "Build a CRM\n\n**Security requirements**\nSSO"
+
+
+def test_form_answers_are_applied_in_one_pass() -> None:
+    """Numbered answers are matched to their question, others are skipped."""
+    questions = ["Security requirements", "Performance targets", "Data sources"]
+    reply = "1. SSO via Okta\nand MFA for admins\n3) The ERP export\n7. ignored"
+
+    answers = parse_form_answers(reply, questions)
+
+    assert answers == [
+        ("Security requirements", "SSO via Okta\nand MFA for admins"),
+        ("Data sources", "The ERP export\n7. ignored"),
+    ]
+    brief = apply_refinements("Build a CRM", answers)
+    assert brief.count("**") == 4
+    assert parse_form_answers("Use SSO", questions[:2]) == [
+        ("Security requirements; Performance targets", "Use SSO")
+    ]
+
+
+def test_merge_findings_deduplicates_in_checklist_order() -> None:
+    """Per-area findings are merged into one bullet list."""
+    findings = [
+        "NONE",
+        "- Security requirements\n- Data sources",
+        None,
+        "- security requirements.",
+    ]
+
+    assert merge_findings(findings) == "- Security requirements\n- Data sources"
+    assert merge_findings(["NONE", "", None]) == NOTHING_MISSING
+
+
+def test_elements_key_ignores_wording_noise() -> None:
+    """Case and trailing periods do not change the list, order and items do."""
+    pending = ["Security requirements.", "Performance targets"]
+
+    assert elements_key(pending) == elements_key(
+        ["security requirements", "Performance targets."]
+    )
+    assert elements_key(pending) != elements_key(pending[::-1])
+    assert elements_key(pending) != elements_key(pending[1:])
@@ -0,0 +1,107 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from app.utils.report import assemble_report, estimation_metrics
+from app.utils.stories import load_estimations
+from app.utils.typing import (
+    AcceptanceCriterion,
+    EstimationRow,
+    Estimations,
+    StoryArtifacts,
+    UserStory,
+)
+
+ESTIMATIONS = Estimations(
+    rows=[
+        EstimationRow(story_id="US-001", story_points=5, justification="External API"),
+        EstimationRow(story_id="US-002", story_points=3, justification="Standard auth"),
+        EstimationRow(
+            story_id="US-003", story_points=21, justification="Should be decomposed"
+        ),
+    ]
+)
+
+STORY = UserStory(
+    id="US-001",
+    role="admin",
+    action="to export data",
+    benefit="I can report",
+    acceptance_criteria=[
+        AcceptanceCriterion(given="data", when="I export", then="I get a CSV")
+    ],
+)
+STORIES = StoryArtifacts(actors=["Admin"], stories=[STORY])
+
+
+def test_metrics_only_count_fibonacci_estimates() -> None:
+    """Totals are computed locally and invalid estimates are flagged."""
+    metrics = estimation_metrics(ESTIMATIONS)
+
+    assert metrics["stories"] == 3
+    assert metrics["total_points"] == 8
+    assert metrics["distribution"] == {3: 1, 5: 1}
+    assert metrics["unestimated"] == ["US-003"]
+
+
+def test_markdown_estimations_are_not_read() -> None:
+    """A Markdown table is not parsed into rows, so that no points are
+    guessed from free text."""
+    table = "| User Story | Story Points | Justification |\n| US-001 | five | API |"
+
+    assert load_estimations(table) == Estimations()
+    assert load_estimations(ESTIMATIONS.model_dump_json()) == ESTIMATIONS
+
+
+def test_metrics_flag_stories_without_a_row() -> None:
+    """Stories the AgileCoach left out are counted and flagged."""
+    artifacts = StoryArtifacts(stories=[STORY.model_copy(update={"id": "US-004"})])
+    metrics = estimation_metrics(ESTIMATIONS, artifacts)
+
+    assert metrics["stories"] == 4
+    assert metrics["unestimated"] == ["US-003", "US-004"]
+
+
+def test_metrics_flag_stories_whose_estimation_failed() -> None:
+    """The `unestimated` ids of the estimation stages are flagged unless a
+    row was written for them since."""
+    metrics = estimation_metrics(ESTIMATIONS, unestimated=["US-004", "US-001"])
+
+    assert metrics["stories"] == 4
+    assert metrics["unestimated"] == ["US-003", "US-004"]
+
+
+def test_assemble_report_follows_the_template() -> None:
+    """Sections 1-3 come from state, the narrative is slotted in."""
+    report = assemble_report(
+        validated_brief="# Brief\nGoals",
+        artifacts=STORIES,
+        estimations=ESTIMATIONS,
+        executive_summary="Summary.",
+        recommendations="Recommendations.",
+        unestimated=["US-004"],
+    )
+
+    headings = [line for line in report.splitlines() if line.startswith("## ")]
+    assert headings == [
+        "## Executive Summary",
+        "## 1. Validated Project Requirements",
+        "## 2. Development Artifacts",
+        "## 3. Complexity Estimation",
+        "## 4. Implementation Recommendations",
+    ]
+    assert "### Brief" in report
+    assert "#### US-001" in report
+    assert "| US-001: to export data | 5 | External API |" in report
+    assert "**Total estimated effort:** 8 story points" in report
+    assert "estimate:** US-003, US-004" in report
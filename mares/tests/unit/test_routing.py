@@ -0,0 +1,70 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from app import llm
+from app.config import pipeline_config
+from app.utils.routing import (
+    ComplexityScale,
+    ComplexitySignals,
+    call_cost,
+    choose_tier,
+    complexity_score,
+)
+
+
+def test_complexity_score_adds_up_signals() -> None:
+    """Each signal contributes its share of the size of a complex call."""
+    scale = ComplexityScale(input_tokens=1000, stories=10, gaps=4)
+
+    assert complexity_score(ComplexitySignals(input_tokens=500), scale) == 0.5
+    assert complexity_score(
+        ComplexitySignals(input_tokens=500, stories=5, gaps=2), scale
+    ) == pytest.approx(1.5)
+
+
+def test_choose_tier_respects_budgets() -> None:
+    """Complex calls use the strong tier unless it exceeds the budget."""
+    pro, flash = "gemini-2.5-pro", "gemini-2.5-flash"
+
+    assert choose_tier(0.4, pro, flash).model == flash
+    assert choose_tier(1.2, pro, flash).model == pro
+    assert (
+        choose_tier(1.2, pro, flash, strong_latency=40, latency_budget=20).model
+        == flash
+    )
+    assert choose_tier(1.2, pro, flash, strong_cost=0.5, cost_budget=0.1).model == flash
+    assert call_cost((1.0, 10.0), 1_000_000, 100_000) == 2.0
+
+
+def test_route_model_only_routes_tier_models(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Small inputs go to the worker model, large ones to the critic model."""
+    monkeypatch.setattr(pipeline_config, "model_routing", True)
+    small = ComplexitySignals(input_tokens=800, stories=3)
+    large = ComplexitySignals(input_tokens=4000, stories=25, gaps=2)
+
+    assert (
+        llm.route_model("ProductOwner", "gemini-2.5-pro", small) == "gemini-2.5-flash"
+    )
+    assert llm.route_model("AgileCoach", "gemini-2.5-flash", large) == "gemini-2.5-pro"
+    assert (
+        llm.route_model("GoogleDocsSaver", "gemini-2.0-flash", large)
+        == "gemini-2.0-flash"
+    )
+
+    monkeypatch.setattr(pipeline_config, "model_routing", False)
+    assert llm.route_model("ProductOwner", "gemini-2.5-pro", small) == "gemini-2.5-pro"
@@ -0,0 +1,147 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+
+from app.utils.digest import build_digest
+from app.utils.refinement import apply_refinements
+from app.utils.speculation import Speculator, diff_digests, plan_regeneration
+from app.utils.stories import revise_story_artifacts
+from app.utils.typing import StoryArtifacts, UseCase, UserStory
+
+BRIEF = """# CRM
+A CRM for the sales team.
+
+## Users
+Sales representatives and managers."""
+
+
+def _story(story_id: str, action: str, sections: list[str] | None = None) -> UserStory:
+    return UserStory(
+        id=story_id,
+        role="rep",
+        action=action,
+        benefit="sell more",
+        sections=sections or [],
+    )
+
+
+def test_diff_digests_finds_refined_sections() -> None:
+    """A refinement answer is a new section; edits change existing ones."""
+    refined = apply_refinements(BRIEF, [("Security requirements", "SSO only")])
+    edited = BRIEF.replace("and managers", "only")
+
+    diff = diff_digests(build_digest(BRIEF), build_digest(refined))
+    assert diff.added == ["security-requirements"]
+    assert not diff.changed and not diff.removed
+    assert diff_digests(build_digest(BRIEF), build_digest(edited)).affected == ["users"]
+    assert diff_digests(build_digest(BRIEF), build_digest(BRIEF)).unchanged
+
+
+def test_plan_regeneration_follows_story_sections() -> None:
+    """Only the stories of changed sections are stale; their other sections
+    are written again with the changed and added ones."""
+    brief = BRIEF + "\n\n## Reports\nWeekly sales reports."
+    edited = brief.replace("and managers", "only") + "\n\n## Security\nSSO."
+    old, new = build_digest(brief), build_digest(edited)
+    stories = [
+        _story("US-001", "log calls", ["crm"]),
+        _story("US-002", "see my team", ["users", "reports"]),
+        _story("US-003", "export reports", ["reports"]),
+    ]
+
+    plan = plan_regeneration(diff_digests(old, new), new, stories)
+
+    assert plan is not None
+    assert plan.stale == ["US-002"]
+    assert plan.sections == ["users", "reports", "security"]
+    unchanged = plan_regeneration(diff_digests(old, old), old, stories)
+    assert unchanged is not None and unchanged.sections == []
+    untracked = [*stories, _story("US-004", "sign in")]
+    assert plan_regeneration(diff_digests(old, new), new, untracked) is None
+    added = plan_regeneration(
+        diff_digests(old, build_digest(brief + "\n\n## SSO\nYes")), new, untracked
+    )
+    assert added is not None and added.stale == []
+
+
+def test_revise_story_artifacts_replaces_and_appends() -> None:
+    """Revised stories keep their id, new ones are numbered after the rest."""
+    artifacts = StoryArtifacts(
+        actors=["Rep"],
+        use_cases=[UseCase(actor="Rep", goals=["Log calls"])],
+        stories=[_story("US-001", "log calls"), _story("US-002", "see deals")],
+    )
+    revision = StoryArtifacts(
+        actors=["rep", "Admin"],
+        use_cases=[UseCase(actor="Rep", goals=["Sign in"])],
+        stories=[_story("US-002", "see my deals"), _story("US-001b", "sign in")],
+    )
+
+    revised, touched = revise_story_artifacts(artifacts, revision)
+
+    assert touched == ["US-002", "US-003"]
+    assert [story.action for story in revised.stories] == [
+        "log calls",
+        "see my deals",
+        "sign in",
+    ]
+    assert revised.actors == ["Rep", "Admin"]
+    assert revised.use_cases[0].goals == ["Log calls", "Sign in"]
+    assert artifacts.use_cases[0].goals == ["Log calls"]
+
+
+@pytest.mark.asyncio
+async def test_speculator_replaces_the_run_of_an_outdated_input() -> None:
+    """A run on the same input is kept; a new input cancels and replaces it,
+    and take() returns the result of the replacement."""
+    speculator = Speculator()
+    started, cancelled = [], []
+
+    async def work(brief: str) -> str:
+        started.append(brief)
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            cancelled.append(brief)
+            raise
+        return brief.upper()
+
+    assert speculator.start("s", "a", lambda: work("a"))
+    assert not speculator.start("s", "a", lambda: work("a"))
+    await asyncio.sleep(0)
+    assert speculator.start("s", "b", lambda: work("b"))
+
+    speculation = speculator.take("s")
+    assert speculation is not None and speculation.key == "b"
+    assert await speculation.task == "B"
+    assert started == ["a", "b"]
+    assert cancelled == ["a"]
+    assert speculator.take("s") is None
+
+
+def test_speculator_drops_runs_of_another_event_loop() -> None:
+    """A run cancelled with the event loop of its invocation is not taken."""
+    speculator = Speculator()
+
+    async def start() -> None:
+        speculator.start("s", "a", lambda: asyncio.sleep(1, "A"))
+
+    async def take() -> object:
+        return speculator.take("s")
+
+    asyncio.run(start())
+    assert asyncio.run(take()) is None
@@ -0,0 +1,1036 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import re
+from collections.abc import AsyncGenerator, Callable
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from google.adk.agents import BaseAgent, LlmAgent, SequentialAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+from pydantic import Field
+
+from app import llm, stages
+from app.utils.brief_index import BriefIndex
+from app.utils.checkpoints import SESSION_SCOPE_KEY, CheckpointStore
+from app.utils.digest import PromptBudgetError, build_digest, fill_prompt
+from app.utils.estimation_index import EstimationIndex, is_reused
+from app.utils.latency import LatencyTracker
+from app.utils.typing import EstimationRow, UserStory
+
+STORY = UserStory(id="US-001", role="rep", action="to log calls", benefit="I remember")
+
+
+def stub_generate_text(
+    monkeypatch: pytest.MonkeyPatch, reply: Callable[[str, str], str]
+) -> list[str]:
+    """Replaces the worker calls of the stages with ``reply(agent_name,
+    instruction)`` and returns the names of the agents called."""
+    calls: list[str] = []
+
+    async def generate_text(
+        model: str, instruction: str, agent_name: str, **kwargs: object
+    ) -> str:
+        calls.append(agent_name)
+        return reply(agent_name, instruction)
+
+    monkeypatch.setattr(stages, "generate_text", generate_text)
+    return calls
+
+
+class ScriptedLlm(BaseLlm):
+    """Replies with canned chunks, streamed one by one when asked to, and
+    logs the model of every request."""
+
+    model: str = "scripted"
+    chunks: list[str]
+    log: list[str] = Field(default_factory=list)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        self.log.append(llm_request.model or "")
+        if stream:
+            for i, chunk in enumerate(self.chunks):
+                self.log.append(f"chunk {i}")
+                yield LlmResponse(content=types.ModelContent(chunk), partial=True)
+                await asyncio.sleep(0.01)
+        yield LlmResponse(content=types.ModelContent("".join(self.chunks)))
+
+
+def scripted_agent(
+    name: str, output_key: str, *chunks: str, model: str = "scripted", **fields: Any
+) -> LlmAgent:
+    """A model stage that replies with ``chunks``."""
+    return LlmAgent(
+        name=name,
+        model=ScriptedLlm(model=model, chunks=list(chunks)),
+        instruction="Reply.",
+        output_key=output_key,
+        **fields,
+    )
+
+
+def model_log(stage: BaseAgent) -> list[str]:
+    """The models requested from the scripted model of ``stage``."""
+    assert isinstance(stage, LlmAgent) and isinstance(stage.model, ScriptedLlm)
+    return stage.model.log
+
+
+def event_text(event: Event) -> str:
+    """The text of the first part of an event."""
+    assert event.content is not None and event.content.parts
+    return event.content.parts[0].text or ""
+
+
+async def run_in_session(
+    stage: BaseAgent, state: dict[str, Any], streaming: bool = False
+) -> tuple[list[Event], dict[str, Any]]:
+    """Runs a stage with its callbacks as the root agent of a new session.
+
+    Returns:
+        The events of the stage and the final session state.
+    """
+    runner = InMemoryRunner(agent=stage, app_name="mares")
+    session = await runner.session_service.create_session(
+        app_name="mares", user_id="alice", state=state, session_id="s"
+    )
+    run_config = RunConfig(
+        streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE
+    )
+    events = [
+        event
+        async for event in runner.run_async(
+            user_id="alice",
+            session_id=session.id,
+            new_message=types.UserContent("go"),
+            run_config=run_config,
+        )
+    ]
+    stored = await runner.session_service.get_session(
+        app_name="mares", user_id="alice", session_id=session.id
+    )
+    assert stored is not None
+    return events, stored.state
+
+
+def stage_context(state: dict[str, Any], user_id: str = "alice") -> Any:
+    """The part of an invocation context the custom stages use."""
+    session = SimpleNamespace(app_name="mares", user_id=user_id, id="s", state=state)
+    return SimpleNamespace(session=session, invocation_id="i", branch=None)
+
+
+async def run_stage(stage: Any, ctx: Any) -> list[Event]:
+    """Runs a custom stage, without its callbacks, and applies its deltas."""
+    events = []
+    async for event in stage._run_async_impl(ctx):
+        ctx.session.state.update(event.actions.state_delta)
+        events.append(event)
+    return events
+
+
+def _estimate(monkeypatch: pytest.MonkeyPatch) -> EstimationRow | None:
+    monkeypatch.setattr(stages.pipeline_config, "estimation_reuse", False)
+    return asyncio.run(
+        stages.estimate_story(
+            "gemini-2.5-flash", "{story}", "Coach", STORY, asyncio.Semaphore(1)
+        )
+    )
+
+
+def test_estimate_story_retries_a_failed_call(monkeypatch: pytest.MonkeyPatch) -> None:
+    """A failed call is asked again, and the row takes the story id."""
+    replies = iter(
+        [
+            "not json",
+            '{"story_id": "x", "story_points": 3, "justification": "Simple form"}',
+        ]
+    )
+    calls = stub_generate_text(monkeypatch, lambda agent, _: next(replies))
+
+    row = _estimate(monkeypatch)
+
+    assert calls == ["Coach", "Coach"]
+    assert row is not None
+    assert row.story_id == "US-001" and row.story_points == 3
+
+
+def test_estimate_story_leaves_the_story_unestimated(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """When the retry fails as well no placeholder row is made up."""
+
+    def fail(agent: str, instruction: str) -> str:
+        raise RuntimeError("503")
+
+    calls = stub_generate_text(monkeypatch, fail)
+
+    assert _estimate(monkeypatch) is None
+    assert len(calls) == 2
+
+
+BRIEF = """# CRM
+A CRM for the sales team of a mid-sized distributor of office furniture.
+
+## Users
+Sales representatives log their calls and meetings with customers, and
+managers follow the pipeline of their team on a weekly dashboard."""
+
+
+@pytest.mark.asyncio
+async def test_brief_reuse_offers_the_warm_start_of_the_same_user(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """Another user's similar brief is not offered; the user's own is offered
+    with its refinements, and the analysis waits until it is answered."""
+    index = BriefIndex(str(tmp_path / "briefs.sqlite"))
+    validated = f"{BRIEF}\n\n## Security requirements\nSSO only"
+    outputs = {"validated_brief": validated, "missing_elements": "NONE"}
+    index.add(BRIEF, outputs, "mares", "bob")
+    monkeypatch.setattr(stages, "brief_index", index)
+    matcher = stages.BriefReuseAgent(name="BriefMatcher", threshold=0.7)
+    brief = BRIEF.replace("mid-sized", "large")
+
+    def submitted(user_id: str) -> Any:
+        state = {"project_brief": brief, "submitted_brief": brief}
+        return stage_context({**state, "brief_message": brief}, user_id)
+
+    alice = submitted("alice")
+    await run_stage(matcher, alice)
+    assert alice.session.state[stages.BRIEF_SCOPE_KEY] == {
+        "app_name": "mares",
+        "user_id": "alice",
+    }
+    assert not alice.session.state.get(stages.WARM_START_OFFER_KEY)
+
+    bob = submitted("bob")
+    [event] = await run_stage(matcher, bob)
+    offer = bob.session.state[stages.WARM_START_OFFER_KEY]
+    assert offer["project_brief"] == f"{brief}\n\n## Security requirements\nSSO only"
+    assert offer["missing_elements"] == "NONE"
+    assert bob.session.state["project_brief"] == brief
+    assert "SSO only" in event_text(event)
+    callback_context: Any = SimpleNamespace(state=bob.session.state)
+    assert stages.await_warm_start_answer(callback_context) is not None
+
+    # The answer to the offer is not a new brief to look up
+    bob.session.state.update(brief_message="yes", **{stages.WARM_START_OFFER_KEY: None})
+    assert await run_stage(matcher, bob) == []
+    assert stages.await_warm_start_answer(callback_context) is None
+
+
+def test_accepts_warm_start() -> None:
+    """Only a short agreement accepts the offer."""
+    assert stages.accepts_warm_start(" Yes! ")
+    assert stages.accepts_warm_start("ok")
+    assert not stages.accepts_warm_start("no")
+    assert not stages.accepts_warm_start("yes, but the users changed")
+
+
+def story_json(story_id: str, action: str, **fields: Any) -> str:
+    """A ProductOwner story object."""
+    story = {"id": story_id, "role": "rep", "action": action, "benefit": "b"}
+    return json.dumps({**story, **fields})
+
+
+def estimate_reply(points: dict[str, int]) -> Callable[[str, str], str]:
+    """Estimates each story with its points; fails for the stories without."""
+
+    def reply(agent: str, instruction: str) -> str:
+        story_id = next(key for key in points if key in instruction)
+        return json.dumps(
+            {
+                "story_id": story_id,
+                "story_points": points[story_id],
+                "justification": "j",
+            }
+        )
+
+    return reply
+
+
+@pytest.mark.asyncio
+async def test_streaming_estimation_estimates_stories_while_they_are_written(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A story is estimated as soon as it is complete in the stream, the
+    chunks are not sent to a client that does not stream, and a story whose
+    estimate fails twice is listed in `unestimated`."""
+    monkeypatch.setattr(stages.pipeline_config, "estimation_reuse", False)
+    product_owner = scripted_agent(
+        "ProductOwner",
+        "stories_and_criteria",
+        f'{{"actors": ["rep"], "stories": [{story_json("US-001", "log calls")}',
+        f", {story_json('US-002', 'export reports')}",
+        "]}",
+    )
+    log = model_log(product_owner)
+    reply = estimate_reply({"US-001": 3})
+
+    def estimate(agent: str, instruction: str) -> str:
+        log.append(f"estimate {agent}")
+        return reply(agent, instruction)
+
+    stub_generate_text(monkeypatch, estimate)
+    stage = stages.StreamingEstimationAgent(
+        name="StreamingEstimation",
+        product_owner=product_owner,
+        estimator_model="gemini-2.5-flash",
+        estimator_instruction="{story}",
+    )
+
+    events, state = await run_in_session(stage, {})
+
+    assert log.index("estimate StreamingEstimationWorker") < log.index("chunk 2")
+    assert log.count("estimate StreamingEstimationWorker") == 1 + 2
+    assert not any(event.partial for event in events)
+    assert [row["story_id"] for row in state["estimations"]["rows"]] == ["US-001"]
+    assert state["unestimated"] == ["US-002"]
+
+
+def report_state() -> dict[str, Any]:
+    """State of a validated brief with two stories, one of them estimated."""
+    stories = [story_json("US-001", "log calls"), story_json("US-002", "export")]
+    row = {"story_id": "US-001", "story_points": 5, "justification": "Form"}
+    return {
+        "validated_brief": "# CRM\nA CRM for the sales team.",
+        "stories_and_criteria": f'{{"stories": [{", ".join(stories)}]}}',
+        "estimations": {"rows": [row]},
+    }
+
+
+def _assembler() -> stages.ReportAssemblerAgent:
+    return stages.ReportAssemblerAgent(
+        name="ReportGenerator",
+        summary_model="gemini-2.5-flash",
+        summary_instruction="{brief}\n{stories}\n{metrics}",
+    )
+
+
+@pytest.mark.asyncio
+async def test_report_assembler_only_has_the_narrative_written(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The model writes the summary and recommendations; the stories, table
+    and totals are filled in locally."""
+    prompts = []
+
+    def narrative(agent: str, instruction: str) -> str:
+        prompts.append(instruction)
+        return json.dumps(
+            {"executive_summary": "A small CRM.", "recommendations": "Start small."}
+        )
+
+    calls = stub_generate_text(monkeypatch, narrative)
+    ctx = stage_context(report_state())
+
+    await run_stage(_assembler(), ctx)
+
+    report = ctx.session.state["final_report"]
+    assert calls == ["ReportGenerator"]
+    assert "Total estimated effort:** 5 story points across 2" in prompts[0]
+    assert "A small CRM." in report and "Start small." in report
+    assert "**US-002**: **As a** rep, **I want** export" in report
+    assert "Stories without a valid Fibonacci estimate:** US-002" in report
+
+
+@pytest.mark.asyncio
+async def test_report_assembler_falls_back_to_the_metrics(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """When the narrative call fails the report is still assembled, with the
+    totals as its summary."""
+
+    def fail(agent: str, instruction: str) -> str:
+        raise RuntimeError("503")
+
+    stub_generate_text(monkeypatch, fail)
+    ctx = stage_context(report_state())
+
+    await run_stage(_assembler(), ctx)
+
+    report = ctx.session.state["final_report"]
+    assert "Total estimated effort:** 5 story points" in report
+    assert "Recommendations could not be generated" in report
+    assert "| US-001: log calls | 5 | Form |" in report
+
+
+@pytest.mark.asyncio
+async def test_checkpointed_stage_is_resumed_until_its_inputs_change(
+    tmp_path: Path,
+) -> None:
+    """A stage run again on the same inputs is not called again; a changed
+    input, or an unreadable checkpoint store, runs it."""
+    coach = scripted_agent("AgileCoach", "estimations", '{"rows": []}')
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite"))
+    before, after = store.stage_callbacks(["validated_brief"], ["estimations"])
+    stages.add_agent_callbacks(coach, before=before, after=after)
+    state = {SESSION_SCOPE_KEY: "mares/alice/s", "validated_brief": "# CRM"}
+
+    await run_in_session(coach, state)
+    events, resumed = await run_in_session(coach, state)
+    assert len(model_log(coach)) == 1
+    assert "resumed from checkpoint" in event_text(events[0])
+    assert resumed["estimations"] == '{"rows": []}'
+
+    await run_in_session(coach, {**state, "validated_brief": "# Payroll"})
+    assert len(model_log(coach)) == 2
+
+    broken = CheckpointStore(str(tmp_path))
+    before, after = broken.stage_callbacks(["validated_brief"], ["estimations"])
+    coach.before_agent_callback = before
+    coach.after_agent_callback = after
+    await run_in_session(coach, state)
+    assert len(model_log(coach)) == 3
+
+
+def _budgeted_pipeline() -> SequentialAgent:
+    """ProductOwner and AgileCoach stages with the deadline callbacks."""
+    stage_fields: dict[str, Any] = {
+        "model": "gemini-2.5-pro",
+        "before_model_callback": llm.deadline_model_callback,
+    }
+    product_owner = scripted_agent("ProductOwner", "stories", "{}", **stage_fields)
+    coach = scripted_agent("AgileCoach", "estimations", "{}", **stage_fields)
+    pipeline = SequentialAgent(name="MARESPipeline", sub_agents=[product_owner, coach])
+    stages.add_agent_callbacks(pipeline, before=stages.start_pipeline_deadline)
+    for stage in pipeline.sub_agents:
+        stages.add_agent_callbacks(stage, before=stages.start_stage_deadline)
+    return pipeline
+
+
+@pytest.mark.asyncio
+async def test_stage_out_of_budget_falls_back_to_a_faster_model(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Only the stage whose budget is below the expected latency falls back;
+    without budgets every stage keeps its model, and the deadlines are not
+    kept in the session."""
+    monkeypatch.setattr(llm, "latency_tracker", LatencyTracker())
+    monkeypatch.setattr(stages.pipeline_config, "expected_latency", 30.0)
+    monkeypatch.setattr(stages.pipeline_config, "pipeline_deadline", 600.0)
+    monkeypatch.setattr(stages.pipeline_config, "stage_deadlines", {"AgileCoach": 5})
+    pipeline = _budgeted_pipeline()
+
+    _, state = await run_in_session(pipeline, {})
+
+    assert [model_log(stage) for stage in pipeline.sub_agents] == [
+        ["gemini-2.5-pro"],
+        ["gemini-2.5-flash"],
+    ]
+    assert llm.PIPELINE_DEADLINE_KEY not in state
+    assert llm.STAGE_DEADLINE_KEY not in state
+
+    monkeypatch.setattr(stages.pipeline_config, "pipeline_deadline", 0.0)
+    monkeypatch.setattr(stages.pipeline_config, "stage_deadlines", {})
+    pipeline = _budgeted_pipeline()
+    await run_in_session(pipeline, {})
+    assert [model_log(stage) for stage in pipeline.sub_agents] == [
+        ["gemini-2.5-pro"],
+        ["gemini-2.5-pro"],
+    ]
+
+
+LARGE_BRIEF = "\n\n".join(
+    f"## {area}\n{area} of the CRM for the sales team, described in a few words."
+    for area in ["Users", "Reports", "Security"]
+)
+
+
+def _decomposer(threshold: int) -> stages.MapReduceDecompositionAgent:
+    product_owner = scripted_agent(
+        "ProductOwner",
+        "stories_and_criteria",
+        f'{{"stories": [{story_json("US-001", "do everything")}]}}',
+    )
+    return stages.MapReduceDecompositionAgent(
+        name="MapReduceProductOwner",
+        stage=product_owner,
+        model="gemini-2.5-pro",
+        instruction="{brief}",
+        min_tokens=threshold,
+        chunk_tokens=30,
+    )
+
+
+def _chunk_stories(agent: str, instruction: str) -> str:
+    """One story per chunk, named after its section."""
+    section = instruction.removeprefix("[").split("]")[0]
+    return f'{{"stories": [{story_json("US-001", f"use {section}")}]}}'
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_decomposes_large_briefs_per_chunk(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A large brief is decomposed with one call per chunk and the stories
+    are merged and renumbered; a small brief goes to the single-pass stage."""
+    calls = stub_generate_text(monkeypatch, _chunk_stories)
+    stage = _decomposer(threshold=20)
+
+    _, state = await run_in_session(stage, {"validated_brief": LARGE_BRIEF})
+
+    stories = state["stories_and_criteria"]["stories"]
+    assert calls == ["MapReduceProductOwnerWorker"] * 3
+    assert [(story["id"], story["action"]) for story in stories] == [
+        ("US-001", "use users"),
+        ("US-002", "use reports"),
+        ("US-003", "use security"),
+    ]
+    assert model_log(stage.stage) == []
+
+    stage = _decomposer(threshold=10_000)
+    _, state = await run_in_session(stage, {"validated_brief": LARGE_BRIEF})
+    assert len(calls) == 3
+    assert len(model_log(stage.stage)) == 1
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_falls_back_to_a_single_pass(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """When a chunk call fails the brief is decomposed as a whole."""
+
+    def reply(agent: str, instruction: str) -> str:
+        if instruction.startswith("[reports]"):
+            raise RuntimeError("503")
+        return _chunk_stories(agent, instruction)
+
+    stub_generate_text(monkeypatch, reply)
+    stage = _decomposer(threshold=20)
+
+    _, state = await run_in_session(stage, {"validated_brief": LARGE_BRIEF})
+
+    assert len(model_log(stage.stage)) == 1
+    assert "do everything" in state["stories_and_criteria"]
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_maps_briefs_over_the_prompt_budget(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A brief whose digest does not fit the budget of the single-pass stage
+    is decomposed per chunk, whatever its size; without map-reduce, the
+    stage fails instead of working from part of the brief."""
+    calls = stub_generate_text(monkeypatch, _chunk_stories)
+
+    def product_owner() -> LlmAgent:
+        return LlmAgent(
+            name="ProductOwner",
+            model=ScriptedLlm(chunks=['{"stories": []}']),
+            instruction=lambda context: fill_prompt(
+                "Stories:\n{brief}", stages.validated_digest(context.state), 20
+            ),
+            output_key="stories_and_criteria",
+        )
+
+    stage = stages.MapReduceDecompositionAgent(
+        name="MapReduceProductOwner",
+        stage=product_owner(),
+        model="gemini-2.5-pro",
+        instruction="{brief}",
+        min_tokens=10_000,
+        chunk_tokens=30,
+    )
+    _, state = await run_in_session(stage, {"validated_brief": LARGE_BRIEF})
+
+    assert calls == ["MapReduceProductOwnerWorker"] * 3
+    assert len(state["stories_and_criteria"]["stories"]) == 3
+    with pytest.raises(PromptBudgetError):
+        await run_in_session(product_owner(), {"validated_brief": LARGE_BRIEF})
+
+
+CRM_BRIEF = """# CRM
+A CRM for the sales team.
+
+## Users
+Sales representatives log their calls.
+
+## Reports
+Managers export a monthly sales report."""
+
+
+def development_stages() -> list[BaseAgent]:
+    """Single-pass ProductOwner and AgileCoach stages."""
+    stories = f'{{"stories": [{story_json("US-001", "do everything")}]}}'
+    rows = '{"rows": [{"story_id": "US-001", "story_points": 8, "justification": "j"}]}'
+    return [
+        scripted_agent("ProductOwner", "stories_and_criteria", stories),
+        scripted_agent("AgileCoach", "estimations", rows),
+    ]
+
+
+def development_reply(agent: str, instruction: str) -> str:
+    """Writes one story per section of the prompt, and estimates stories with
+    3 points. Revisions write in place of the outdated stories first, and
+    number the others from US-101."""
+    if agent.endswith("ProductOwner"):
+        sections = re.findall(r"^\[([a-z-]+)\]", instruction, re.M)
+        outdated = re.findall(r"US-\d{3}", instruction)
+        first = 101 if instruction.startswith("Revise") else 1
+        return json.dumps(
+            {
+                "stories": [
+                    {
+                        "id": outdated[i]
+                        if i < len(outdated)
+                        else f"US-{first + i:03d}",
+                        "role": "rep",
+                        "action": f"use {section}",
+                        "benefit": "b",
+                        "sections": [section],
+                    }
+                    for i, section in enumerate(sections)
+                ]
+            }
+        )
+    return json.dumps({"story_id": "x", "story_points": 3, "justification": "j"})
+
+
+def _incremental() -> stages.IncrementalDevelopmentAgent:
+    return stages.IncrementalDevelopmentAgent(
+        name="IncrementalDevelopment",
+        stages=development_stages(),
+        product_owner_model="gemini-2.5-pro",
+        revision_instruction="Revise {outdated}\n{brief}",
+        estimator_model="gemini-2.5-flash",
+        estimator_instruction="{story}",
+    )
+
+
+def developed_state(brief: str) -> dict[str, Any]:
+    """State of a brief whose stories were written and estimated before."""
+    stories: list[dict[str, Any]] = [
+        {"id": "US-001", "role": "rep", "action": "log calls", "benefit": "b"},
+        {"id": "US-002", "role": "mgr", "action": "export", "benefit": "b"},
+    ]
+    stories[0]["sections"], stories[1]["sections"] = ["users"], ["reports"]
+    rows = [
+        {"story_id": story["id"], "story_points": 5, "justification": "old"}
+        for story in stories
+    ]
+    return {
+        "validated_brief": brief,
+        "stories_digest": build_digest(CRM_BRIEF).model_dump(),
+        "stories_and_criteria": {"stories": stories},
+        "estimations": {"rows": rows},
+    }
+
+
+@pytest.mark.asyncio
+async def test_incremental_development_only_rewrites_changed_sections(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Only the story of the changed section is written and estimated again;
+    an unchanged brief reuses everything without a model call."""
+    monkeypatch.setattr(stages.pipeline_config, "estimation_reuse", False)
+    calls = stub_generate_text(monkeypatch, development_reply)
+    brief = CRM_BRIEF.replace("monthly", "weekly")
+    stage = _incremental()
+
+    _, state = await run_in_session(stage, developed_state(brief))
+
+    assert calls == [
+        "IncrementalDevelopmentProductOwner",
+        "IncrementalDevelopmentAgileCoach",
+    ]
+    assert [
+        (story["id"], story["action"])
+        for story in state["stories_and_criteria"]["stories"]
+    ] == [("US-001", "log calls"), ("US-002", "use reports")]
+    assert [row["story_points"] for row in state["estimations"]["rows"]] == [5, 3]
+    assert state["stories_digest"] == build_digest(brief).model_dump()
+
+    calls.clear()
+    events, state = await run_in_session(stage, developed_state(CRM_BRIEF))
+    assert calls == []
+    assert "Brief unchanged" in event_text(events[-1])
+    assert [model_log(sub) for sub in stage.stages] == [[], []]
+
+
+@pytest.mark.asyncio
+async def test_incremental_development_falls_back_to_the_stages(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """When the revision call fails the stages write all stories again."""
+
+    def fail(agent: str, instruction: str) -> str:
+        raise RuntimeError("503")
+
+    stub_generate_text(monkeypatch, fail)
+    brief = CRM_BRIEF.replace("monthly", "weekly")
+    stage = _incremental()
+
+    _, state = await run_in_session(stage, developed_state(brief))
+
+    assert [len(model_log(sub)) for sub in stage.stages] == [1, 1]
+    assert "do everything" in state["stories_and_criteria"]
+    assert state["stories_digest"] == build_digest(brief).model_dump()
+
+
+def _speculative() -> stages.SpeculativeDevelopmentAgent:
+    return stages.SpeculativeDevelopmentAgent(
+        name="SpeculativeDevelopment",
+        stages=development_stages(),
+        product_owner_model="gemini-2.5-pro",
+        product_owner_instruction="{brief}",
+        revision_instruction="Revise {outdated}\n{brief}",
+        estimator_model="gemini-2.5-flash",
+        estimator_instruction="{story}",
+        incremental=False,
+    )
+
+
+@pytest.mark.asyncio
+async def test_speculative_development_reuses_the_stories_of_the_last_answer(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Stories written while the user answers the last question are reused;
+    only the stories of the answer are written once the brief is validated."""
+    monkeypatch.setattr(stages.pipeline_config, "estimation_reuse", False)
+    calls = stub_generate_text(monkeypatch, development_reply)
+    stage = _speculative()
+    validated = f"{CRM_BRIEF}\n\n## Security requirements\nSSO only."
+
+    stage.speculate(stage_context({"project_brief": CRM_BRIEF}))
+    _, state = await run_in_session(stage, {"validated_brief": validated})
+
+    assert calls == [
+        "SpeculativeDevelopmentProductOwner",
+        *["SpeculativeDevelopmentAgileCoach"] * 3,
+        "SpeculativeDevelopmentProductOwner",
+        "SpeculativeDevelopmentAgileCoach",
+    ]
+    assert [story["action"] for story in state["stories_and_criteria"]["stories"]] == [
+        "use crm",
+        "use users",
+        "use reports",
+        "use security-requirements",
+    ]
+    assert len(state["estimations"]["rows"]) == 4
+    assert [model_log(sub) for sub in stage.stages] == [[], []]
+
+
+@pytest.mark.asyncio
+async def test_failed_speculation_runs_the_stages(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """When the speculative run fails the stages write the stories."""
+
+    def fail(agent: str, instruction: str) -> str:
+        raise RuntimeError("503")
+
+    stub_generate_text(monkeypatch, fail)
+    stage = _speculative()
+
+    stage.speculate(stage_context({"project_brief": CRM_BRIEF}))
+    _, state = await run_in_session(stage, {"validated_brief": CRM_BRIEF})
+
+    assert [len(model_log(sub)) for sub in stage.stages] == [1, 1]
+    assert "do everything" in state["stories_and_criteria"]
+    assert stages.speculator.take("mares/alice/s") is None
+
+
+def stories_state(count: int) -> dict[str, Any]:
+    """State with ``count`` user stories of growing size."""
+    stories = [
+        story_json(f"US-{i:03d}", "log calls" + " and notes" * i)
+        for i in range(1, count + 1)
+    ]
+    return {"stories_and_criteria": f'{{"stories": [{", ".join(stories)}]}}'}
+
+
+def _sharded() -> stages.ShardedEstimationAgent:
+    coach = scripted_agent("AgileCoach", "estimations", '{"rows": []}')
+    return stages.ShardedEstimationAgent(
+        name="ShardedAgileCoach",
+        stage=coach,
+        model="gemini-2.5-flash",
+        instruction="Anchors: {anchors}\nStories:\n{stories}",
+        story_instruction="Story: {story}",
+        shard_size=2,
+        anchor_count=2,
+    )
+
+
+@pytest.mark.asyncio
+async def test_sharded_estimation_estimates_shards_against_anchors(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Shards are sized against the estimated anchors; the stories of a failed
+    shard, and those a shard left out, are estimated one by one."""
+    monkeypatch.setattr(stages.pipeline_config, "estimation_reuse", False)
+    shard_prompts = []
+
+    def reply(agent: str, instruction: str) -> str:
+        if instruction.startswith("Story: "):
+            return json.dumps(
+                {"story_id": "x", "story_points": 8, "justification": "alone"}
+            )
+        shard_prompts.append(instruction)
+        ids = re.findall(r"US-\d{3}", instruction.split("\nStories:\n")[1])
+        if "US-004" in ids:
+            raise RuntimeError("503")
+        rows = [
+            {"story_id": story_id, "story_points": 3, "justification": "shard"}
+            for story_id in ids
+            if story_id != "US-007"
+        ]
+        return json.dumps({"rows": rows})
+
+    stub_generate_text(monkeypatch, reply)
+    stage = _sharded()
+
+    _, state = await run_in_session(stage, stories_state(7))
+
+    rows = state["estimations"]["rows"]
+    assert [row["story_id"] for row in rows] == [f"US-00{i}" for i in range(1, 8)]
+    anchors, *shards = shard_prompts
+    assert "None, these stories are the reference" in anchors
+    assert all("-> 3 points" in shard for shard in shards)
+    # US-004 and US-005 share the failed shard; US-007 is always left out
+    alone = {row["story_id"] for row in rows if row["justification"] == "alone"}
+    assert alone == {"US-004", "US-005", "US-007"}
+    assert state["unestimated"] == []
+    assert model_log(stage.stage) == []
+
+
+@pytest.mark.asyncio
+async def test_sharded_estimation_runs_few_stories_in_a_single_pass(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Up to a shard of stories is estimated by the wrapped stage."""
+    calls = stub_generate_text(monkeypatch, lambda agent, instruction: "{}")
+    stage = _sharded()
+
+    await run_in_session(stage, stories_state(2))
+
+    assert calls == []
+    assert len(model_log(stage.stage)) == 1
+
+
+def scope_recorder(scopes: list[Any]) -> Callable[..., None]:
+    """``before_agent_callback`` recording the `estimation_scope` and the
+    stories to estimate that a stage sees."""
+
+    def callback(callback_context: Any) -> None:
+        state = callback_context.state
+        ids = [story.id for story in stages.stories_to_estimate(state).stories]
+        scopes.append((state.get("estimation_scope"), ids))
+
+    return callback
+
+
+EXPORT_STORY = story_json(
+    "US-001", "to export the monthly sales report of every region as CSV"
+)
+
+
+def _reuse_stage(rows: str, scopes: list[Any]) -> stages.EstimationReuseAgent:
+    coach = scripted_agent("AgileCoach", "estimations", rows)
+    stages.add_agent_callbacks(coach, before=scope_recorder(scopes))
+    return stages.EstimationReuseAgent(
+        name="EstimationReuse", stage=coach, threshold=0.9
+    )
+
+
+@pytest.mark.asyncio
+async def test_estimation_reuse_only_has_novel_stories_estimated(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    """A story estimated before takes the past estimate and the stage only
+    estimates the others; an unreadable index leaves all to the stage."""
+    index = EstimationIndex(str(tmp_path / "estimations.sqlite"))
+    row = EstimationRow(story_id="US-001", story_points=5, justification="CSV")
+    index.add([UserStory.model_validate_json(EXPORT_STORY)], [row])
+    monkeypatch.setattr(stages, "estimation_index", index)
+    state = {
+        "stories_and_criteria": (
+            f'{{"stories": [{EXPORT_STORY}, {story_json("US-002", "log calls")}]}}'
+        )
+    }
+    coach_rows = json.dumps(
+        {"rows": [{"story_id": "US-002", "story_points": 3, "justification": "j"}]}
+    )
+    scopes: list[Any] = []
+
+    _, reused = await run_in_session(_reuse_stage(coach_rows, scopes), state)
+
+    assert scopes == [(["US-002"], ["US-002"])]
+    assert reused["estimation_scope"] is None
+    rows = reused["estimations"]["rows"]
+    assert [(row["story_id"], row["story_points"]) for row in rows] == [
+        ("US-001", 5),
+        ("US-002", 3),
+    ]
+    assert is_reused(EstimationRow.model_validate(rows[0]))
+
+    monkeypatch.setattr(stages, "estimation_index", EstimationIndex(str(tmp_path)))
+    scopes.clear()
+    _, estimated = await run_in_session(_reuse_stage(coach_rows, scopes), state)
+    assert scopes == [(None, ["US-001", "US-002"])]
+    assert estimated["estimations"] == coach_rows
+
+
+DUPLICATE_STORIES = {
+    "stories_and_criteria": json.dumps(
+        {
+            "stories": [
+                json.loads(EXPORT_STORY),
+                {
+                    **json.loads(EXPORT_STORY),
+                    "id": "US-002",
+                    "action": "to export the monthly sales report of every region",
+                },
+                json.loads(story_json("US-003", "to log my calls with customers")),
+            ]
+        }
+    )
+}
+
+
+def _collapse_stage(rows: str, scopes: list[Any]) -> stages.DuplicateCollapseAgent:
+    coach = scripted_agent("AgileCoach", "estimations", rows)
+    stages.add_agent_callbacks(coach, before=scope_recorder(scopes))
+    return stages.DuplicateCollapseAgent(
+        name="StoryDeduplicator", stage=coach, threshold=0.6
+    )
+
+
+@pytest.mark.asyncio
+async def test_duplicate_collapse_estimates_a_cluster_once() -> None:
+    """The stage only estimates the first story of a cluster, and its row is
+    copied to the near-duplicate."""
+    rows = [
+        {"story_id": story_id, "story_points": points, "justification": "j"}
+        for story_id, points in [("US-001", 5), ("US-003", 2)]
+    ]
+    scopes: list[Any] = []
+    stage = _collapse_stage(json.dumps({"rows": rows}), scopes)
+
+    _, state = await run_in_session(stage, DUPLICATE_STORIES)
+
+    assert state["story_clusters"] == {"US-001": ["US-002"]}
+    assert scopes == [(None, ["US-001", "US-003"])]
+    assert state["estimations"]["rows"] == [
+        rows[0],
+        {"story_id": "US-002", "story_points": 5, "justification": "Same as US-001: j"},
+        rows[1],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_collapse_leaves_duplicates_of_unestimated_stories() -> None:
+    """When the stage leaves the first story of a cluster unestimated, its
+    near-duplicate is left unestimated too."""
+    rows = [{"story_id": "US-003", "story_points": 2, "justification": "j"}]
+    stage = _collapse_stage(json.dumps({"rows": rows}), [])
+
+    _, state = await run_in_session(stage, DUPLICATE_STORIES)
+
+    assert state["estimations"]["rows"] == rows
+
+
+CRITERION = {"given": "a customer", "when": "I log a call", "then": "it is saved"}
+
+
+def _repair_stage(points: list[int], broken: bool = True) -> stages.OutputRepairAgent:
+    """Development stages writing three stories estimated with ``points``,
+    the second one without criteria when ``broken``."""
+    criteria = [[CRITERION], [] if broken else [CRITERION], [CRITERION]]
+    stories = [
+        story_json(f"US-00{i}", "log calls", acceptance_criteria=story_criteria)
+        for i, story_criteria in enumerate(criteria, start=1)
+    ]
+    rows = [
+        {"story_id": f"US-00{i}", "story_points": p, "justification": "j"}
+        for i, p in enumerate(points, start=1)
+    ]
+    return stages.OutputRepairAgent(
+        name="OutputRepair",
+        stages=[
+            scripted_agent(
+                "ProductOwner",
+                "stories_and_criteria",
+                f'{{"stories": [{", ".join(stories)}]}}',
+            ),
+            scripted_agent("AgileCoach", "estimations", json.dumps({"rows": rows})),
+        ],
+        product_owner_model="gemini-2.5-pro",
+        repair_instruction="{problems}\n{story}\n{brief}",
+        estimator_model="gemini-2.5-flash",
+        estimator_instruction="{story}",
+    )
+
+
+def repair_reply(agent: str, instruction: str) -> str:
+    """Rewrites a story with criteria, and estimates stories with 8 points."""
+    if agent.endswith("ProductOwner"):
+        return story_json("US-009", "log calls", acceptance_criteria=[CRITERION])
+    return json.dumps({"story_id": "x", "story_points": 8, "justification": "new"})
+
+
+@pytest.mark.asyncio
+async def test_output_repair_re_asks_only_the_failing_outputs(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """The story without criteria is rewritten and estimated again, the row
+    with non-Fibonacci points is estimated again, the rest is kept; valid
+    outputs make no model call."""
+    monkeypatch.setattr(stages.pipeline_config, "estimation_reuse", False)
+    calls = stub_generate_text(monkeypatch, repair_reply)
+
+    _, state = await run_in_session(_repair_stage([3, 5, 4]), {})
+
+    assert sorted(calls) == [
+        "OutputRepairAgileCoach",
+        "OutputRepairAgileCoach",
+        "OutputRepairProductOwner",
+    ]
+    stories = state["stories_and_criteria"]["stories"]
+    assert [story["id"] for story in stories] == ["US-001", "US-002", "US-003"]
+    assert [c["then"] for c in stories[1]["acceptance_criteria"]] == ["it is saved"]
+    rows = state["estimations"]["rows"]
+    assert [row["story_points"] for row in rows] == [3, 8, 8]
+
+    calls.clear()
+    await run_in_session(_repair_stage([3, 5, 2], broken=False), {})
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_output_repair_keeps_the_outputs_when_re_asking_fails(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A failed rewrite or estimate leaves the story and row as written."""
+
+    def fail(agent: str, instruction: str) -> str:
+        raise RuntimeError("503")
+
+    monkeypatch.setattr(stages.pipeline_config, "estimation_reuse", False)
+    stub_generate_text(monkeypatch, fail)
+
+    _, state = await run_in_session(_repair_stage([3, 5, 4]), {})
+
+    assert state["stories_and_criteria"]["stories"][1]["acceptance_criteria"] == []
+    rows = state["estimations"]["rows"]
+    assert [row["story_points"] for row in rows] == [3, 5, 4]
@@ -0,0 +1,147 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from app.utils.stories import (
+    balance_slices,
+    collapse_duplicates,
+    complete_story_objects,
+    load_story_artifacts,
+    merge_story_artifacts,
+    render_duplicates,
+    render_story_artifacts,
+    select_anchors,
+    story_clusters,
+)
+from app.utils.typing import StoryArtifacts, UserStory
+
+WORKER_OUTPUT = {
+    "actors": ["Admin"],
+    "use_cases": [{"actor": "Admin", "goals": ["Manage users"]}],
+    "stories": [
+        {
+            "id": "US-001",
+            "role": "admin",
+            "action": "to add users",
+            "benefit": "they can log in",
+            "acceptance_criteria": [{"given": "a", "when": "b", "then": "c"}],
+        },
+        {
+            "id": "US-002",
+            "role": "admin",
+            "action": "to remove users",
+            "benefit": "they cannot log in",
+        },
+    ],
+}
+
+MARKDOWN_OUTPUT = """## Actors
+- Admin
+
+## User Stories
+**US-001**: **As an** admin, **I want** to add users, **so that** they can log in
+
+## Acceptance Criteria
+### US-001
+**GIVEN** a **WHEN** b **THEN** c
+**GIVEN** d **WHEN** e **THEN** f
+"""
+
+
+def test_merge_renumbers_stories_and_dedupes_actors() -> None:
+    """Stories are renumbered globally, actors and use cases are merged."""
+    document = load_story_artifacts(WORKER_OUTPUT)
+    merged = merge_story_artifacts([document, StoryArtifacts(), document])
+
+    assert [s.id for s in merged.stories] == ["US-001", "US-002", "US-003", "US-004"]
+    assert merged.actors == ["Admin"]
+    assert merged.use_cases[0].goals == ["Manage users"]
+    markdown = render_story_artifacts(merged)
+    assert markdown.index("## User Stories") < markdown.index("## Acceptance Criteria")
+    assert "### US-003" in markdown
+
+
+def test_load_story_artifacts_only_reads_the_typed_output() -> None:
+    """Stored ProductOwner output is read from JSON; Markdown is not parsed
+    and reads as no artifacts."""
+    assert load_story_artifacts(json.dumps(WORKER_OUTPUT)).stories[1].id == "US-002"
+    assert load_story_artifacts(MARKDOWN_OUTPUT) == StoryArtifacts()
+
+
+def test_balance_slices_is_bounded_and_keeps_order() -> None:
+    """Items are spread over at most the requested number of slices."""
+    items = ["a" * 50, "b" * 10, "c" * 40, "d" * 10]
+    slices = balance_slices(items, 2)
+
+    assert len(slices) == 2
+    assert sorted(item for s in slices for item in s) == sorted(items)
+    assert balance_slices(items[:1], 4) == [items[:1]]
+    assert balance_slices([], 4) == []
+
+
+def test_complete_story_objects_waits_for_the_closing_brace() -> None:
+    """A streamed story is only complete once its object is closed."""
+    document = json.dumps(WORKER_OUTPUT)
+    second = document.index('{"id": "US-002"')
+
+    partial = document[: second + 20]
+    assert [s["id"] for s in complete_story_objects(partial)] == ["US-001"]
+    assert [s["id"] for s in complete_story_objects(document)] == ["US-001", "US-002"]
+    assert complete_story_objects(document[:10]) == []
+
+
+def test_select_anchors_spans_story_sizes() -> None:
+    """The smallest, a middle and the largest story are the anchors."""
+    stories = [
+        UserStory(id=f"US-00{i}", role="user", action="x" * size, benefit="y")
+        for i, size in enumerate([40, 5, 80, 20, 60], 1)
+    ]
+
+    anchors = select_anchors(stories, 3)
+
+    assert [story.id for story in anchors] == ["US-001", "US-002", "US-003"]
+    assert select_anchors(stories, 1)[0].id == "US-001"
+    assert len(select_anchors(stories[:2], 3)) == 2
+    assert select_anchors(stories, 0) == []
+
+
+def test_story_clusters_collapse_per_role_repeats() -> None:
+    """The same story for several roles is one cluster, led by the first."""
+    export = UserStory(
+        id="US-001",
+        role="admin",
+        action="to export the monthly sales report",
+        benefit="I can share it",
+    )
+    stories = [
+        export,
+        UserStory(
+            id="US-002", role="rep", action="to log calls", benefit="I remember them"
+        ),
+        export.model_copy(update={"id": "US-003", "role": "manager"}),
+    ]
+    artifacts = StoryArtifacts(stories=stories)
+
+    clusters = story_clusters(stories, 0.8)
+
+    assert clusters == {"US-001": ["US-003"]}
+    assert [s.id for s in collapse_duplicates(artifacts, clusters).stories] == [
+        "US-001",
+        "US-002",
+    ]
+    assert (
+        render_duplicates(artifacts, clusters)
+        == "US-003 (as a manager): same as US-001"
+    )
@@ -0,0 +1,65 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from app.utils.typing import AcceptanceCriterion, EstimationRow, Estimations, UserStory
+from app.utils.validation import estimation_problems, story_problems
+
+
+def _story(story_id: str, criteria: list[AcceptanceCriterion]) -> UserStory:
+    return UserStory(
+        id=story_id,
+        role="rep",
+        action="to log calls",
+        benefit="I remember them",
+        acceptance_criteria=criteria,
+    )
+
+
+def test_story_problems_require_complete_gherkin() -> None:
+    """Every story needs criteria, and every criterion all three steps."""
+    complete = AcceptanceCriterion(
+        given="a customer", when="I log a call", then="it is saved"
+    )
+    no_then = AcceptanceCriterion(given="a customer", when="I log a call", then=" ")
+
+    assert story_problems(_story("US-001", [complete])) == []
+    assert story_problems(_story("US-002", [])) == [
+        "there are no acceptance criteria in GIVEN/WHEN/THEN form"
+    ]
+    assert story_problems(_story("US-003", [complete, no_then])) == [
+        "acceptance criterion 2 has no THEN step"
+    ]
+    assert story_problems(UserStory(id="US-004", role="", action="x", benefit="y")) == [
+        "the role is empty",
+        "there are no acceptance criteria in GIVEN/WHEN/THEN form",
+    ]
+
+
+def test_estimation_problems_flag_missing_and_malformed_rows() -> None:
+    """Rows must be unique, Fibonacci and justified."""
+    stories = [_story(f"US-00{i}", []) for i in range(1, 5)]
+    estimations = Estimations(
+        rows=[
+            EstimationRow(story_id="US-001", story_points=3, justification="Form"),
+            EstimationRow(story_id="US-002", story_points=4, justification="Between"),
+            EstimationRow(story_id="US-004", story_points=2, justification="a"),
+            EstimationRow(story_id="US-004", story_points=3, justification="b"),
+        ]
+    )
+
+    assert estimation_problems(stories, estimations) == {
+        "US-002": ["4 story points is not one of 1, 2, 3, 5, 8, 13"],
+        "US-003": ["there is no estimation row"],
+        "US-004": ["there are 2 estimation rows"],
+    }